@@ -0,0 +1,100 @@
+"""
+End-of-term grade load: one set_student_grade call per grade vs one bulk_grade.
+
+For each size a temporary data directory is generated in the text format of
+data/ with every enrollment ungraded, and then every enrollment gets a grade:
+
+  rewrite  - the original flow: set_student_grade followed by a full
+             save_enrollments() per grade (timed on the first REWRITE_SAMPLE
+             grades and extrapolated)
+  per-call - set_student_grade per grade, journaled by the writer thread
+  bulk     - a single bulk_grade over all rows (validated, one write)
+
+Export streams every enrollment to CSV through export_enrollments.
+
+Usage:  python bench_bulk_grades.py
+"""
+
+import io, os, sys, time, random, pathlib, tempfile
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent / "main frame"))
+from course_manager import CourseManager
+from storage import TextFileStorage
+
+# ---------- CONFIG ----------
+STUDENT_COUNTS      = [1_000, 10_000]
+COURSES_PER_STUDENT = 10
+CATALOG_SIZE        = 300
+REWRITE_SAMPLE      = 50
+GRADES              = ["A", "A-", "B+", "B", "B-", "C+", "C", "D", "F"]
+# ----------------------------
+
+
+def write_data(directory, students):
+    rng = random.Random(0)
+    catalog = [f"DEPT {1000 + i}: Course Title Number {i}" for i in range(CATALOG_SIZE)]
+    rows = []
+    with open(os.path.join(directory, "course_list.txt"), "w", encoding="utf-8") as f:
+        f.write("\n".join(catalog) + "\n")
+    with open(os.path.join(directory, "account.txt"), "w", encoding="utf-8") as f:
+        for s in range(students):
+            f.write(f"student{s}@smartcourse.com,pw{s},student,cps\n")
+    with open(os.path.join(directory, "enrolled_courses.txt"), "w", encoding="utf-8") as f:
+        for s in range(students):
+            for course in rng.sample(catalog, COURSES_PER_STUDENT):
+                f.write(f"student{s}@smartcourse.com,{course}\n")
+                rows.append((f"student{s}@smartcourse.com", course, rng.choice(GRADES)))
+    return rows
+
+
+def timed(directory, grade_all):
+    manager = CourseManager(TextFileStorage(directory))
+    start = time.perf_counter()
+    grade_all(manager)
+    manager.flush()
+    elapsed = time.perf_counter() - start
+    manager.close()
+    return elapsed
+
+
+def rewrite_per_grade(rows):
+    def run(manager):
+        for username, course, grade in rows[:REWRITE_SAMPLE]:
+            manager.set_student_grade(username, course, grade)
+            manager.save_enrollments()
+    return run
+
+
+def per_call(rows):
+    def run(manager):
+        for username, course, grade in rows:
+            manager.set_student_grade(username, course, grade)
+    return run
+
+
+def bulk(rows):
+    def run(manager):
+        applied, errors = manager.bulk_grade(rows)
+        assert len(applied) == len(rows) and not errors, errors
+    return run
+
+
+print(f"{'grades':>7}  {'rewrite (s)':>11}  {'per-call (s)':>12}  {'bulk (s)':>8}  {'export (s)':>10}")
+for n in STUDENT_COUNTS:
+    with tempfile.TemporaryDirectory() as tmp:
+        rows = write_data(tmp, n)
+        rewrite_s = timed(tmp, rewrite_per_grade(rows)) / REWRITE_SAMPLE * len(rows)
+    with tempfile.TemporaryDirectory() as tmp:
+        write_data(tmp, n)
+        per_call_s = timed(tmp, per_call(rows))
+    with tempfile.TemporaryDirectory() as tmp:
+        write_data(tmp, n)
+        bulk_s = timed(tmp, bulk(rows))
+        manager = CourseManager(TextFileStorage(tmp))
+        start = time.perf_counter()
+        exported = manager.export_enrollments(io.StringIO())
+        export_s = time.perf_counter() - start
+        manager.close()
+        assert exported == len(rows)
+    print(f"{len(rows):>7}  {rewrite_s:>10.1f}*  {per_call_s:>12.2f}  {bulk_s:>8.2f}  {export_s:>10.2f}")
+print(f"\n* extrapolated from the first {REWRITE_SAMPLE} grades")
@@ -0,0 +1,86 @@
+"""
+Model calls and latency when many students send the same prompt at once.
+
+A burst of STUDENTS requests arrives within BURST_SECONDS; a share of them
+(SAME_SHARE) send the identical prompt - same transcript template, the
+default "What course should I take next?" - the rest distinct ones. Without
+coalescing (every prompt made unique) each request is its own generation;
+with it, identical prompts in flight attach to one generation and receive
+its stream. The backend shares its token rate between all running
+generations, like in bench_scheduler.py.
+
+Usage:  python bench_coalescing.py
+"""
+
+import sys, time, random, pathlib, threading
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent / "main frame"))
+from llm_scheduler import LLMScheduler
+
+# ---------- CONFIG ----------
+TOKENS_PER_SEC = 400
+REPLY_TOKENS   = 40
+STUDENTS       = 40
+BURST_SECONDS  = 0.5
+SAME_SHARE     = [0.0, 0.5, 0.9]
+MAX_CONCURRENT = 2
+# ----------------------------
+
+
+class SharedBackend:
+    # Generates tokens one at a time through one lock: the token rate is shared by all open streams
+    def __init__(self):
+        self.gpu = threading.Lock()
+
+    def stream(self, prompt, options=None, model=None):
+        for i in range(REPLY_TOKENS):
+            with self.gpu:
+                time.sleep(1 / TOKENS_PER_SEC)
+            yield f"w{i} "
+
+
+def pct(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, len(values) * p // 100)]
+
+
+def run(share, coalesce):
+    rng = random.Random(0)
+    scheduler = LLMScheduler(SharedBackend(), MAX_CONCURRENT, max_queued=STUDENTS, max_queued_per_user=STUDENTS,
+                             service_time=REPLY_TOKENS / TOKENS_PER_SEC)
+    arrivals = sorted((rng.uniform(0, BURST_SECONDS), i) for i in range(STUDENTS))
+    latencies = []
+    lock = threading.Lock()
+
+    def ask(i, submitted):
+        same = i < STUDENTS * share
+        prompt = "default question" if same else f"question {i}"
+        if not coalesce:
+            prompt += f" #{i}"
+        replies = "".join(e[1] for e in scheduler.submit(f"s{i}", prompt).events() if e[0] == "text")
+        assert replies
+        with lock:
+            latencies.append(time.perf_counter() - submitted)
+
+    threads = []
+    start = time.perf_counter()
+    for offset, i in arrivals:
+        delay = start + offset - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        threads.append(threading.Thread(target=ask, args=(i, time.perf_counter())))
+        threads[-1].start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    stats = scheduler.stats()
+    scheduler.close()
+    return stats["model_calls"], stats["coalesced"], pct(latencies, 50), pct(latencies, 95), elapsed
+
+
+print(f"{STUDENTS} students within {BURST_SECONDS}s, {MAX_CONCURRENT} generations at once\n")
+print(f"{'same prompt':>11}  {'coalescing':>10}  {'model calls':>11}  {'saved':>5}  {'p50 (s)':>7}  {'p95 (s)':>7}  {'all done (s)':>12}")
+for share in SAME_SHARE:
+    for coalesce in (False, True):
+        calls, saved, p50, p95, elapsed = run(share, coalesce)
+        print(f"{share:>10.0%}  {'on' if coalesce else 'off':>10}  {calls:>11}  {saved:>5}  {p50:>7.2f}  {p95:>7.2f}  {elapsed:>12.2f}")
@@ -0,0 +1,82 @@
+"""
+Benchmark course search: inverted index vs the old linear substring scan.
+
+Builds a synthetic catalog of CATALOG_SIZE courses in the "CODE NNNN: Title"
+format of data/course_list.txt and times representative queries: exact
+course codes, code prefixes, words, word prefixes and misspellings.
+
+First it checks that the index finds everything the linear scan found, for
+every substring of every title in data/course_list.txt (the index may find
+more, e.g. misspellings); the script stops if any result is missing.
+
+Usage:  python bench_course_search.py
+"""
+
+import sys, time, random, pathlib, statistics
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "main frame"))
+from search_index import CourseSearchIndex
+
+# ---------- CONFIG ----------
+CATALOG_SIZE = 100_000
+REPEAT       = 200
+LIMIT        = 20
+QUERIES      = ["CPS 2232", "cps2232", "CPS 22", "Data Structure", "struct",
+                "algoritms", "intro machine", "computer", "os"]
+# ----------------------------
+
+DEPTS = ["CPS", "MATH", "ENG", "HIST", "COMM", "GE", "TECH", "ESL", "ACCT", "FIN",
+         "BIO", "CHEM", "PHYS", "ECON", "PSY", "ART"]
+WORDS = ["Introduction", "to", "Data", "Structure", "Computer", "Programming", "Analysis",
+         "Algorithms", "Machine", "Learning", "Systems", "Database", "Management", "Networks",
+         "Operating", "Advanced", "Topics", "Applied", "Statistics", "Calculus", "Linear",
+         "Algebra", "World", "History", "Literature", "Composition", "Research", "Design",
+         "Security", "Theory", "Graphics", "Software", "Engineering", "Finance", "Accounting"]
+
+
+def linear_search(courses, keyword):
+    # The pre-index implementation of CourseManager.search_courses
+    keyword_lower = keyword.lower()
+    return [course for course in courses if keyword_lower in course.lower() or not keyword]
+
+
+def build_catalog(n):
+    rng = random.Random(0)
+    codes = [f"{d} {num}" for d in DEPTS for num in range(1000, 10000)]
+    catalog = ["CPS 2232: Data Structure"]
+    for code in rng.sample(codes, n - 1):
+        if code != "CPS 2232":
+            catalog.append(f"{code}: {' '.join(rng.sample(WORDS, rng.randint(2, 5)))}")
+    return catalog
+
+
+def median_us(fn, *args):
+    samples = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        fn(*args)
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1e6
+
+
+courses = [l.strip() for l in (ROOT / "data" / "course_list.txt").read_text(encoding="utf-8").splitlines() if l.strip()]
+index = CourseSearchIndex(courses)
+substrings = {c.lower()[i:j] for c in courses for i in range(len(c)) for j in range(i + 1, len(c) + 1)}
+missing = [q for q in sorted(substrings) if not set(linear_search(courses, q)) <= set(index.search(q))]
+print(f"Index finds every linear-scan result for {len(substrings) - len(missing)} of {len(substrings)} title substrings")
+if missing:
+    sys.exit(f"Missing results for: {missing[:20]}")
+
+catalog = build_catalog(CATALOG_SIZE)
+start = time.perf_counter()
+index = CourseSearchIndex(catalog)
+index.search("warm up")
+print(f"Catalog: {len(catalog)} courses, index built in {time.perf_counter() - start:.2f}s\n")
+
+print(f"{'query':<16}  {'scan (us)':>10}  {'index (us)':>10}  {'speed-up':>8}  top hit")
+for q in QUERIES:
+    scan_us = median_us(linear_search, catalog, q)
+    index_us = median_us(index.search, q, LIMIT)
+    hits = index.search(q, LIMIT)
+    print(f"{q:<16}  {scan_us:>10.0f}  {index_us:>10.1f}  {scan_us / index_us:>7.0f}x  {hits[0] if hits else '-'}")
@@ -0,0 +1,76 @@
+"""
+How many advising questions the rule-based fast path (recommender.py) answers
+without the model, and how fast.
+
+Two question sets: COMMON - the everyday questions students type into the
+"Ask AI" box (the CLI's example question and its variants), and the 25
+evaluation questions, which are deliberately specific (careers, topics,
+schedules) and should nearly all go to the model.
+
+The median advice latency of a mix is estimated with MODEL_LATENCY for the
+questions that still need the model.
+
+Usage:  python bench_fast_path.py
+"""
+
+import sys, time, pathlib, statistics
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "main frame"))
+from recommender import Recommender, classify
+
+# ---------- CONFIG ----------
+DATA          = ROOT / "data"
+MODEL_LATENCY = 47.65      # s, full-context latency of the model in the paper's evaluation (README)
+REPEAT        = 200
+COMMON = [
+    "What course should I take next?",
+    "What should I take next semester?",
+    "Which courses next term?",
+    "What classes should I register for now?",
+    "Recommend courses for me",
+    "What courses do I still need to graduate?",
+    "Which courses are left in my plan?",
+    "What are my remaining requirements?",
+    "Which courses should I retake?",
+    "Which courses did I do poorly in?",
+    "Why is CPS 3440 important?",
+    "Which courses help me get a machine learning job?",
+    "Is Python Programming hard?",
+    "Which electives go well with data science?",
+]
+# ----------------------------
+
+plan_text = (DATA / "cps_plan.txt").read_text(encoding="utf-8")
+grades = {}
+for line in (DATA / "enrolled_courses.txt").read_text(encoding="utf-8").splitlines():
+    parts = line.split(",")
+    if parts[0] == "user@smartcourse.com":
+        grades[parts[1]] = parts[2] if len(parts) > 2 and parts[2] else None
+evaluation = [l.strip() for l in (DATA / "evaluation_questions.txt").read_text(encoding="utf-8").splitlines() if l.strip()]
+recommender = Recommender()
+
+print(f"{'intent':<10}  question")
+for question in COMMON:
+    print(f"{classify(question) or 'model':<10}  {question}")
+
+print(f"\n{'questions':<12}  {'fast path':>9}  {'answer p50':>10}  {'p95':>8}  {'advice p50 (est.)':>17}")
+for name, questions in (("common", COMMON), ("evaluation", evaluation)):
+    fast_times, model_answers = [], 0
+    for question in questions:
+        samples = []
+        for _ in range(REPEAT):
+            start = time.perf_counter()
+            reply = recommender.answer(question, grades, plan_text)
+            samples.append(time.perf_counter() - start)
+        if reply is not None:
+            fast_times += samples
+        else:
+            model_answers += REPEAT
+    fast = len(fast_times) // REPEAT
+    fast_times.sort()
+    times = fast_times + [MODEL_LATENCY] * model_answers
+    p50 = f"{statistics.median(fast_times) * 1000:.2f} ms" if fast_times else "-"
+    p95 = f"{fast_times[len(fast_times) * 95 // 100] * 1000:.2f} ms" if fast_times else "-"
+    print(f"{name:<12}  {fast:>4}/{len(questions):<4}  {p50:>10}  {p95:>8}  {statistics.median(times):>15.3f} s")
+print(f"\n(without the fast path every answer takes the model's ~{MODEL_LATENCY:.0f} s)")
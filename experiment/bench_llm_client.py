@@ -0,0 +1,63 @@
+"""
+Per-request overhead of a bare requests.post vs the pooled keep-alive LLMClient.
+
+Both send the same small /api/generate requests to the local stand-in server
+(mock_ollama.py), which answers immediately, so the time measured is the
+client-side and connection overhead rather than generation. The server counts
+the TCP connections it accepted.
+
+Usage:  python bench_llm_client.py
+"""
+
+import sys, time, pathlib, statistics
+import requests
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent / "main frame"))
+from llm_client import LLMClient
+from mock_ollama import serve_in_background
+
+# ---------- CONFIG ----------
+REQUESTS = 500
+PROMPT   = "What course should I take next?"
+MODEL    = "llama3.1:8b"
+# ----------------------------
+
+
+def bare(url, stream):
+    # What ask_ai_question and eval_relevance.ask_ai used to do
+    r = requests.post(f"{url}/api/generate", json={"model": MODEL, "prompt": PROMPT, "stream": stream}, timeout=300)
+    if stream:
+        return b"".join(r.iter_lines())
+    return r.json()["response"]
+
+
+def pooled(client, stream):
+    if stream:
+        return "".join(client.stream(PROMPT))
+    return client.generate(PROMPT)
+
+
+def measure(server, fn):
+    before = server.connections
+    fn()  # warm-up, so the pooled client's first connection is not counted as per-request cost
+    times = []
+    for _ in range(REQUESTS):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    times.sort()
+    return statistics.mean(times) * 1e3, times[len(times) * 95 // 100] * 1e3, server.connections - before
+
+
+server, url = serve_in_background()
+client = LLMClient(base_url=url, model=MODEL)
+print(f"{REQUESTS} requests to {url}\n")
+print(f"{'client':<22}  {'mean (ms)':>9}  {'p95 (ms)':>8}  {'connections':>11}")
+for stream in (False, True):
+    mode = "stream" if stream else "whole"
+    for name, fn in ((f"requests.post ({mode})", lambda: bare(url, stream)),
+                     (f"LLMClient ({mode})", lambda: pooled(client, stream))):
+        mean_ms, p95_ms, connections = measure(server, fn)
+        print(f"{name:<22}  {mean_ms:>9.2f}  {p95_ms:>8.2f}  {connections:>11}")
+client.close()
+server.shutdown()
@@ -0,0 +1,85 @@
+"""
+Memory used by students and their enrollments, before and after the compact model.
+
+"Before" replays the original data_models.Student (per-instance __dict__ and an
+enrolled_courses dict keyed by the course title parsed from each line). "After"
+uses the current Student (__slots__, interned course ids, one-byte grade codes).
+Both load the same enrolled_courses.txt-style lines; memory is measured with
+tracemalloc after parsing.
+
+Usage:  python bench_memory.py
+"""
+
+import sys, gc, random, pathlib, tracemalloc
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent / "main frame"))
+from data_models import Student, GRADES, course_ids
+
+# ---------- CONFIG ----------
+ENROLLMENTS         = 1_000_000
+COURSES_PER_STUDENT = 40
+CATALOG_SIZE        = 2_000
+# ----------------------------
+
+
+class LegacyStudent:
+    # data_models.Student before the compact representation
+    def __init__(self, username, password, major=None):
+        self.username = username
+        self.password = password
+        self.major = major
+        self.enrolled_courses = {}
+
+    def add_course(self, course_name):
+        if course_name not in self.enrolled_courses:
+            self.enrolled_courses[course_name] = None
+
+    def set_grade(self, course_name, grade):
+        if course_name in self.enrolled_courses:
+            self.enrolled_courses[course_name] = grade
+
+
+def enrollment_lines():
+    rng = random.Random(0)
+    catalog = [f"DEPT {1000 + i}: Course Title Number {i}" for i in range(CATALOG_SIZE)]
+    for s in range(ENROLLMENTS // COURSES_PER_STUDENT):
+        for course in rng.sample(catalog, COURSES_PER_STUDENT):
+            grade = rng.choice(GRADES) if rng.random() < 0.8 else None
+            yield f"student{s}@smartcourse.com,{course}" + (f",{grade}" if grade else "")
+
+
+def load(student_cls, lines):
+    # Same parsing as CourseManager.load_enrollments
+    students = {}
+    for line in lines:
+        parts = line.strip().split(",")
+        username, course_name = parts[0], parts[1]
+        grade = parts[2] if len(parts) == 3 else None
+        student = students.get(username)
+        if student is None:
+            student = students[username] = student_cls(username, "pw", "cps")
+        student.add_course(course_name)
+        if grade:
+            student.set_grade(course_name, grade)
+    return students
+
+
+def measure(student_cls, lines):
+    gc.collect()
+    tracemalloc.start()
+    students = load(student_cls, lines)
+    gc.collect()
+    current, _peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return students, current
+
+
+lines = list(enrollment_lines())
+print(f"{len(lines)} enrollments, {ENROLLMENTS // COURSES_PER_STUDENT} students, {CATALOG_SIZE} courses\n")
+
+legacy, before = measure(LegacyStudent, lines)
+del legacy
+compact, after = measure(Student, lines)
+print(f"before (dict per student):    {before / 2**20:8.1f} MiB  ({before / len(lines):6.1f} B/enrollment)")
+print(f"after  (slots + interned ids): {after / 2**20:8.1f} MiB  ({after / len(lines):6.1f} B/enrollment)")
+print(f"intern table: {len(course_ids.names)} course titles;  saving {1 - after / before:.0%}")
@@ -0,0 +1,149 @@
+"""
+Throughput of several app processes sharing one data directory (or SQLite database).
+
+Each worker process opens its own CourseManager on the shared data and runs a
+mix of reads (a student's courses, a course search) and writes (enroll + grade).
+Every worker writes only its own students but reads everyone's, so reads have to
+pick up the other processes' writes. Writes are serialized by the cross-process
+lock; reads only run in parallel with as many CPU cores as workers, so "scaling"
+stays near 1x on a single-core machine.
+
+After the timed part every worker refreshes and checks that it sees all the
+other workers' changes, and the data is reloaded from disk and checked again.
+
+Usage:  python bench_multiprocess.py
+"""
+
+import os, sys, time, random, pathlib, tempfile, multiprocessing
+
+MAIN_FRAME = pathlib.Path(__file__).resolve().parent.parent / "main frame"
+sys.path.insert(0, str(MAIN_FRAME))
+from course_manager import CourseManager
+from storage import TextFileStorage, SQLiteStorage
+
+# ---------- CONFIG ----------
+WORKER_COUNTS   = [1, 2, 4, 8]
+OPS_PER_WORKER  = 4000
+WRITE_FRACTION  = 0.1
+STUDENTS        = 64
+COURSES         = 400
+GRADES          = ["A", "A-", "B+", "B", "B-", "C+", "C", "D", "F"]
+# ----------------------------
+
+COURSE_NAMES = [f"CPS {1000 + i}: Benchmark Course {i}" for i in range(COURSES)]
+USERNAMES = [f"student{s}@smartcourse.com" for s in range(STUDENTS)]
+
+
+def write_data(directory):
+    with open(os.path.join(directory, "course_list.txt"), "w", encoding="utf-8") as f:
+        f.write("\n".join(COURSE_NAMES) + "\n")
+    with open(os.path.join(directory, "account.txt"), "w", encoding="utf-8") as f:
+        for u in USERNAMES:
+            f.write(f"{u},pw,student,cps\n")
+
+
+def make_storage(backend, tmp):
+    if backend == "text":
+        return TextFileStorage(tmp)
+    return SQLiteStorage(os.path.join(tmp, "bench.db"))
+
+
+def plan(w, workers):
+    # The same ops every time, so the expected final state can be computed without running them
+    rng = random.Random(w)
+    own = USERNAMES[w::workers]
+    ops = []
+    for _ in range(OPS_PER_WORKER):
+        if rng.random() < WRITE_FRACTION:
+            ops.append(("write", rng.choice(own), rng.choice(COURSE_NAMES), rng.choice(GRADES)))
+        else:
+            ops.append(("read", rng.choice(USERNAMES), f"{1000 + rng.randrange(COURSES)}"))
+    return ops
+
+
+def expected_state(workers):
+    expected = {u: {} for u in USERNAMES}
+    for w in range(workers):
+        for op in plan(w, workers):
+            if op[0] == "write":
+                expected[op[1]][op[2]] = op[3]
+    return expected
+
+
+def state_of(manager):
+    return {u: dict(manager.get_student_courses(u).items()) for u in USERNAMES}
+
+
+def worker(backend, tmp, w, workers, barrier, results):
+    try:
+        results.put(run_worker(backend, tmp, w, workers, barrier))
+    except Exception:
+        barrier.abort()
+        results.put((float("inf"), False))
+        raise
+
+
+def run_worker(backend, tmp, w, workers, barrier):
+    manager = CourseManager(make_storage(backend, tmp))
+    ops = plan(w, workers)
+    barrier.wait()
+    start = time.perf_counter()
+    for op in ops:
+        if op[0] == "write":
+            manager.enroll_student(op[1], op[2])
+            manager.set_student_grade(op[1], op[2], op[3])
+        else:
+            dict(manager.get_student_courses(op[1]).items())
+            manager.search_courses(op[2], limit=10)
+    manager.flush()
+    elapsed = time.perf_counter() - start
+    barrier.wait()  # every worker's writes are on disk now
+    manager.refresh()
+    sees_all = state_of(manager) == expected_state(workers)
+    manager.close()
+    return elapsed, sees_all
+
+
+def run(backend, workers):
+    with tempfile.TemporaryDirectory() as tmp:
+        write_data(tmp)
+        if backend == "sqlite":
+            seed = SQLiteStorage(os.path.join(tmp, "bench.db"))
+            seed.add_courses(COURSE_NAMES)
+            seed.add_users((u, "pw", "student", "cps") for u in USERNAMES)
+            seed.close()
+        barrier = multiprocessing.Barrier(workers)
+        results = multiprocessing.Queue()
+        procs = [multiprocessing.Process(target=worker, args=(backend, tmp, w, workers, barrier, results))
+                 for w in range(workers)]
+        for p in procs:
+            p.start()
+        outcomes = [results.get() for _ in procs]
+        for p in procs:
+            p.join()
+        # Reload from the data itself, not from the startup snapshot
+        snapshot = os.path.join(tmp, "smartcourse.snapshot")
+        if os.path.exists(snapshot):
+            os.remove(snapshot)
+        reloaded = CourseManager(make_storage(backend, tmp))
+        on_disk = state_of(reloaded) == expected_state(workers)
+        reloaded.close()
+    wall = max(elapsed for elapsed, _ in outcomes)
+    return workers * OPS_PER_WORKER / wall, all(ok for _, ok in outcomes), on_disk
+
+
+if __name__ == "__main__":
+    failures = 0
+    print(f"{OPS_PER_WORKER} ops per worker, {WRITE_FRACTION:.0%} writes (enroll + grade), "
+          f"{STUDENTS} students, {COURSES} courses\n")
+    print(f"{'backend':<8}  {'workers':>7}  {'ops/s':>9}  {'scaling':>7}  {'workers see all':>15}  {'reloaded':>8}")
+    for backend in ("text", "sqlite"):
+        base = None
+        for workers in WORKER_COUNTS:
+            ops_per_s, seen, on_disk = run(backend, workers)
+            base = base or ops_per_s
+            failures += (not seen) + (not on_disk)
+            print(f"{backend:<8}  {workers:>7}  {ops_per_s:>9.0f}  {ops_per_s / base:>6.1f}x"
+                  f"  {'ok' if seen else 'STALE':>15}  {'ok' if on_disk else 'LOST':>8}")
+    print("\nAll workers consistent." if not failures else f"\n{failures} checks failed!")
+    sys.exit(1 if failures else 0)
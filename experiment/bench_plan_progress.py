@@ -0,0 +1,88 @@
+"""
+Cost of the plan part of an advice request: worked out from scratch (read
+the plan file, parse it, compare it with the transcript) vs read from the
+student's PlanProgress, which enroll/drop/grade keep current.
+
+  per request - building the advising prompt and the fast-path answer
+  per change  - what an enroll, drop or grade costs PlanProgress
+
+Usage:  python bench_plan_progress.py
+"""
+
+import sys, time, random, pathlib
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "main frame"))
+from data_models import Student, GRADES
+from plan_progress import PlanProgress
+from plan_registry import DegreePlan
+from prompt_builder import build_advice_prompt
+from recommender import Recommender
+
+# ---------- CONFIG ----------
+PLAN_FILE = ROOT / "data" / "cps_plan.txt"
+QUESTION  = "What should I take next?"
+REPEAT    = 2000
+CHANGES   = 20000
+# ----------------------------
+
+
+def per_call(fn, repeat=REPEAT):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+student = Student("bench@smartcourse.com", "", "cps")
+for line in (ROOT / "data" / "enrolled_courses.txt").read_text(encoding="utf-8").splitlines():
+    parts = line.split(",")
+    if parts[0] == "user@smartcourse.com":
+        student.add_course(parts[1])
+        if len(parts) > 2 and parts[2]:
+            student.set_grade(parts[1], parts[2])
+plan = DegreePlan("cps", PLAN_FILE.read_text(encoding="utf-8"))
+progress = PlanProgress(plan)
+student.attach_progress(progress)
+recommender = Recommender()
+grades = dict(student.enrolled_courses.items())
+
+
+def from_scratch():
+    plan_text = PLAN_FILE.read_text(encoding="utf-8")
+    build_advice_prompt(QUESTION, grades, plan_text)
+    recommender.answer(QUESTION, grades, plan_text)
+
+
+def from_progress():
+    build_advice_prompt(QUESTION, grades, plan.text, progress=progress)
+    recommender.answer(QUESTION, grades, plan.text, progress)
+
+
+print(f"{len(grades)} courses on the transcript, {len(plan.courses)} in the plan\n")
+print(f"{'per request':<34}  {'µs':>8}")
+print(f"{'from scratch (file, parse, sets)':<34}  {per_call(from_scratch):>8.1f}")
+print(f"{'from PlanProgress':<34}  {per_call(from_progress):>8.1f}")
+
+pool = plan.courses + ["ART 1000: Elective"]
+
+
+def apply_changes():
+    # The same random enroll/drop/grade sequence every time; µs per change
+    rng = random.Random(0)
+    start = time.perf_counter()
+    for _ in range(CHANGES):
+        course = rng.choice(pool)
+        op = rng.random()
+        if op < 0.4:
+            student.add_course(course)
+        elif op < 0.6:
+            student.drop_course(course)
+        else:
+            student.set_grade(course, rng.choice(GRADES))
+    return (time.perf_counter() - start) / CHANGES * 1e6
+
+
+print(f"\n{'per change (enroll/drop/grade)':<34}  {apply_changes():>8.1f}")
+student._progress = None  # the same changes without PlanProgress to keep current
+print(f"{'  of which the Student arrays':<34}  {apply_changes():>8.1f}")
@@ -0,0 +1,85 @@
+"""
+Prompt size before and after prompt_builder, for the advising prompt of the
+CLI/GUI.
+
+  verbatim - the whole plan file and the full transcript pasted in (the old
+             prompt of main.py / ui_gradio.py)
+  compact  - prompt_builder: remaining plan, summarised transcript, budget
+             ("own" is the part after the prefix shared by the whole major,
+             what the model evaluates once that prefix is cached; see
+             prefix_cache_report.py)
+
+Tokens are estimated (prompt_builder.estimate_tokens, ~4 characters per
+token); eval_relevance.py records the model's own prompt_eval_count and
+timings together with the relevance metrics, with PROMPT_STYLE set to
+"verbatim" or "compact".
+
+Students: the evaluation student of data/, and synthetic CPS students after
+1-4 years who followed the plan (with a few low grades) plus some
+electives from the catalog.
+
+Usage:  python bench_prompt_builder.py
+"""
+
+import sys, time, random, pathlib
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "main frame"))
+from prompt_builder import PromptBuilder, estimate_tokens, parse_plan, TOKEN_BUDGET
+
+# ---------- CONFIG ----------
+DATA      = ROOT / "data"
+QUESTION  = "What course should I take next?"
+ELECTIVES = 6          # extra catalog courses per synthetic student per year
+BUDGETS   = [TOKEN_BUDGET, 600]
+REPEAT    = 200
+# ----------------------------
+
+
+def verbatim_prompt(question, grades, plan_text):
+    course_info = "\n".join(f"{c} - {g if g else 'Not assigned'}" for c, g in grades.items())
+    return (f'I am a student asking the following academic question:\n"{question}"\n\n'
+            f"My current course history:\n{course_info}\n\n"
+            f"Here is the four-year plan for my major:\n{plan_text}\n\n"
+            "Based on my question, my course history, and the plan above, give me a suggestion.")
+
+
+def synthetic_student(years_done, plan_years, catalog, rng):
+    grades = {}
+    for _heading, courses in plan_years[:years_done]:
+        for course in courses:
+            grades[course] = rng.choice(["A", "A-", "B+", "B", "B", "B-", "C+", "C"])
+        for course in rng.sample(catalog, ELECTIVES):
+            grades.setdefault(course, rng.choice(["A", "B+", "B"]))
+    if years_done < len(plan_years):
+        for course in plan_years[years_done][1][:4]:
+            grades[course] = None  # currently enrolled
+    return grades
+
+
+plan_text = (DATA / "cps_plan.txt").read_text(encoding="utf-8")
+catalog = [l.strip() for l in (DATA / "course_list.txt").read_text(encoding="utf-8").splitlines() if l.strip()]
+students = {"user@smartcourse.com": {}}
+for line in (DATA / "enrolled_courses.txt").read_text(encoding="utf-8").splitlines():
+    parts = line.split(",")
+    if parts[0] == "user@smartcourse.com":
+        students[parts[0]][parts[1]] = parts[2] if len(parts) > 2 and parts[2] else None
+rng = random.Random(0)
+for years in range(1, 5):
+    students[f"synthetic, {years} year(s) done"] = synthetic_student(years, parse_plan(plan_text), catalog, rng)
+
+print(f"{'student':<28}  {'courses':>7}  {'verbatim':>8}  "
+      + "  ".join(f"{f'budget {b}':>10}  {'own':>9}" for b in BUDGETS) + f"  {'build (µs)':>10}")
+for name, grades in students.items():
+    old = estimate_tokens(verbatim_prompt(QUESTION, grades, plan_text))
+    cells = []
+    for budget in BUDGETS:
+        prefix, history, ask = PromptBuilder(budget).parts(QUESTION, grades, plan_text)
+        total, own = estimate_tokens(prefix + history + ask), estimate_tokens(history + ask)
+        cells.append(f"{total:>10}  {own:>4} ({own / old:>3.0%})")
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        PromptBuilder().build(QUESTION, grades, plan_text)
+    build_us = (time.perf_counter() - start) / REPEAT * 1e6
+    print(f"{name:<28}  {len(grades):>7}  {old:>8}  " + "  ".join(cells) + f"  {build_us:>10.0f}")
+print("\n(estimated prompt tokens)")
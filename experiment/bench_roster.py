@@ -0,0 +1,87 @@
+"""
+"How full is course X" and "who takes X": scan of every student vs the reverse index.
+
+"scan" walks every Student's enrolled_courses like the code did before the
+course -> roster index; "index" uses CourseManager.course_count /
+get_course_roster. The memory the index adds is measured with tracemalloc.
+
+Usage:  python bench_roster.py
+"""
+
+import gc, os, sys, time, random, pathlib, tempfile, tracemalloc
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent / "main frame"))
+from course_manager import CourseManager
+from data_models import CourseRosters
+from storage import TextFileStorage
+
+# ---------- CONFIG ----------
+STUDENT_COUNTS      = [1_000, 10_000, 50_000]
+COURSES_PER_STUDENT = 20
+CATALOG_SIZE        = 500
+QUERIES             = 200
+# ----------------------------
+
+
+def write_data(directory, students):
+    rng = random.Random(0)
+    catalog = [f"DEPT {1000 + i}: Course Title Number {i}" for i in range(CATALOG_SIZE)]
+    with open(os.path.join(directory, "course_list.txt"), "w", encoding="utf-8") as f:
+        f.write("\n".join(catalog) + "\n")
+    with open(os.path.join(directory, "account.txt"), "w", encoding="utf-8") as f:
+        for s in range(students):
+            f.write(f"student{s}@smartcourse.com,pw{s},student,cps\n")
+    with open(os.path.join(directory, "enrolled_courses.txt"), "w", encoding="utf-8") as f:
+        for s in range(students):
+            for course in rng.sample(catalog, COURSES_PER_STUDENT):
+                f.write(f"student{s}@smartcourse.com,{course}\n")
+    return catalog
+
+
+def scan_count(manager, course):
+    return sum(1 for s in manager.students if course in s.enrolled_courses)
+
+
+def scan_roster(manager, course):
+    return [(s.username, s.enrolled_courses[course]) for s in manager.students if course in s.enrolled_courses]
+
+
+def per_query_us(fn, manager, courses):
+    start = time.perf_counter()
+    for course in courses:
+        fn(manager, course)
+    return (time.perf_counter() - start) / len(courses) * 1e6
+
+
+def index_memory(manager):
+    # Rebuild the index from scratch under tracemalloc to see what it costs
+    gc.collect()
+    tracemalloc.start()
+    rosters = CourseRosters()
+    for student in manager.students:
+        student.attach_rosters(rosters)
+    gc.collect()
+    size, _peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    for student in manager.students:
+        student.attach_rosters(manager.rosters)
+    return size
+
+
+print(f"{'students':>9}  {'count: scan':>11}  {'index':>7}  {'roster: scan':>12}  {'index':>7}  {'index memory':>12}")
+for n in STUDENT_COUNTS:
+    with tempfile.TemporaryDirectory() as tmp:
+        catalog = write_data(tmp, n)
+        manager = CourseManager(TextFileStorage(tmp))
+        courses = random.Random(1).choices(catalog, k=QUERIES)
+        for course in courses[:5]:
+            assert scan_count(manager, course) == manager.course_count(course)
+            assert sorted(scan_roster(manager, course)) == sorted(manager.get_course_roster(course))
+        scan_c = per_query_us(scan_count, manager, courses[:20])
+        index_c = per_query_us(lambda m, c: m.course_count(c), manager, courses)
+        scan_r = per_query_us(scan_roster, manager, courses[:20])
+        index_r = per_query_us(lambda m, c: m.get_course_roster(c), manager, courses)
+        memory = index_memory(manager)
+        manager.close()
+    print(f"{n:>9}  {scan_c:>9.0f}µs  {index_c:>5.1f}µs  {scan_r:>10.0f}µs  {index_r:>5.0f}µs"
+          f"  {memory / 2**20:>8.1f} MiB")
@@ -0,0 +1,83 @@
+"""
+Answer latency with several model servers of which one is slow and one is down,
+for a client pinned to one server and for the LLMRouter (llm_router.py) without
+and with hedging.
+
+The servers are local stand-ins (mock_ollama.py): FAST_SERVERS answer after
+FAST_TTFT, one after SLOW_TTFT, and one URL has nothing listening. CONCURRENCY
+students ask REQUESTS questions in total. "errors" are answers a student would
+not get.
+
+Usage:  python bench_router.py
+"""
+
+import sys, time, socket, pathlib
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent / "main frame"))
+from llm_client import LLMClient
+from llm_router import LLMRouter
+from mock_ollama import serve_in_background
+
+# ---------- CONFIG ----------
+REQUESTS     = 120
+CONCURRENCY  = 4
+FAST_SERVERS = 2
+FAST_TTFT    = 0.05    # s
+SLOW_TTFT    = 1.5     # s
+HEDGE_AFTER  = 0.2     # s, the fixed hedging delay of the last run
+PROMPT       = "What course should I take next?"
+# ----------------------------
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def run(client):
+    def ask(_):
+        start = time.perf_counter()
+        try:
+            "".join(client.stream(PROMPT))
+        except Exception:
+            return None
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(CONCURRENCY) as pool:
+        start = time.perf_counter()
+        times = list(pool.map(ask, range(REQUESTS)))
+        wall = time.perf_counter() - start
+    ok = sorted(t for t in times if t is not None)
+    p50 = ok[len(ok) // 2] if ok else float("nan")
+    p95 = ok[min(len(ok) - 1, len(ok) * 95 // 100)] if ok else float("nan")
+    return p50, p95, REQUESTS - len(ok), wall
+
+
+fast = [serve_in_background(ttft=FAST_TTFT)[1] for _ in range(FAST_SERVERS)]
+slow = serve_in_background(ttft=SLOW_TTFT)[1]
+dead = f"http://127.0.0.1:{free_port()}"
+urls = fast + [slow, dead]
+
+setups = [
+    ("pinned to the slow server", lambda: LLMClient(base_url=slow)),
+    ("pinned to the dead server", lambda: LLMClient(base_url=dead, retries=0)),
+    ("router, no hedging", lambda: LLMRouter(urls, hedge=False)),
+    ("router, hedging at p95", lambda: LLMRouter(urls)),
+    (f"router, hedging at {HEDGE_AFTER}s", lambda: LLMRouter(urls, hedge_after=HEDGE_AFTER)),
+]
+print(f"{REQUESTS} requests, {CONCURRENCY} at a time; servers: {FAST_SERVERS} answering after {FAST_TTFT}s, "
+      f"1 after {SLOW_TTFT}s, 1 down\n")
+print(f"{'client':<28}  {'p50 (s)':>7}  {'p95 (s)':>7}  {'errors':>6}  {'wall (s)':>8}  {'hedges':>6}  {'failovers':>9}")
+for name, make_client in setups:
+    client = make_client()
+    p50, p95, errors, wall = run(client)
+    hedges = f"{client.hedges} ({client.hedge_wins} won)" if isinstance(client, LLMRouter) else "-"
+    failovers = client.failovers if isinstance(client, LLMRouter) else "-"
+    print(f"{name:<28}  {p50:>7.3f}  {p95:>7.3f}  {errors:>6}  {wall:>8.2f}  {hedges:>6}  {failovers:>9}")
+    if isinstance(client, LLMRouter):
+        for e in client.stats()["endpoints"]:
+            print(f"    {e['url']:<24} {e['requests']:>4} requests  {e['errors']:>3} errors  "
+                  f"circuit {e['circuit']:<9}  {'healthy' if e['healthy'] else 'unhealthy'}")
+    client.close()
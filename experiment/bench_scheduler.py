@@ -0,0 +1,148 @@
+"""
+Latency under a burst of AI questions: straight to the model vs through the scheduler.
+
+The backend is a stand-in for one model instance that shares its token rate
+between every generation in progress (each running request slows down all
+the others), in time scaled down so a run takes seconds. Users give up after
+TIMEOUT seconds, like the HTTP read timeout.
+
+  direct  - every request goes to the backend as it arrives (the old flow)
+  fifo    - through LLMScheduler, but all requests under one user, i.e. plain
+            first-come first-served with the same concurrency limit
+  fair    - through LLMScheduler with per-user queues
+
+Two bursts: "even" has every user ask a few questions; "flood" has one user
+send many questions right before everybody else asks one (latency of the
+others shown separately).
+
+Usage:  python bench_scheduler.py
+"""
+
+import sys, time, random, pathlib, itertools, threading
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent / "main frame"))
+from llm_scheduler import LLMScheduler, SchedulerBusy
+
+# ---------- CONFIG ----------
+TOKENS_PER_SEC  = 400      # backend throughput, shared by all running generations
+REPLY_TOKENS    = 40       # -> 0.1 s per reply with the backend to itself
+TIMEOUT         = 3.0      # seconds before a user gives up
+MAX_CONCURRENT  = 2
+MAX_QUEUED      = 32
+MAX_PER_USER    = 4
+BURST_SECONDS   = 1.0      # requests of the "even" burst arrive within this window
+EVEN_USERS      = 20
+EVEN_PER_USER   = 3
+FLOOD_REQUESTS  = 12       # from the one flooding user
+FLOOD_OTHERS    = 10       # users asking one question each right after
+# ----------------------------
+
+
+class SharedBackend:
+    # Generates tokens one at a time through one lock: the token rate is shared by all open streams
+    def __init__(self):
+        self.gpu = threading.Lock()
+
+    def stream(self, prompt, options=None, model=None):
+        for i in range(REPLY_TOKENS):
+            with self.gpu:
+                time.sleep(1 / TOKENS_PER_SEC)
+            yield f"w{i} "
+
+
+def direct(backend, user, submitted, results):
+    first = None
+    for _ in backend.stream("q"):
+        now = time.perf_counter()
+        first = first or now
+        if now - submitted > TIMEOUT:
+            results.append((user, "timeout", None, None))
+            return  # closing the stream stops the generation
+    now = time.perf_counter()
+    results.append((user, "ok", first - submitted, now - submitted))
+
+
+def scheduled(scheduler, name):
+    prompts = itertools.count()  # all different, so no two requests share a generation
+
+    def run(backend, user, submitted, results):
+        try:
+            ticket = scheduler.submit(user if name == "fair" else "", f"q{next(prompts)}")
+        except SchedulerBusy:
+            results.append((user, "shed", None, None))
+            return
+        timer = threading.Timer(TIMEOUT - (time.perf_counter() - submitted), ticket.cancel)
+        timer.start()
+        first = None
+        for event in ticket.events():
+            if event[0] == "text":
+                first = first or time.perf_counter()
+        timer.cancel()
+        now = time.perf_counter()
+        if ticket.state == "done":
+            results.append((user, "ok", first - submitted, now - submitted))
+        else:
+            results.append((user, "timeout", None, None))
+    return run
+
+
+def burst(kind):
+    # (arrival offset, user) pairs
+    rng = random.Random(0)
+    if kind == "even":
+        return sorted((rng.uniform(0, BURST_SECONDS), f"u{u}") for u in range(EVEN_USERS) for _ in range(EVEN_PER_USER))
+    return [(i * 0.001, "flooder") for i in range(FLOOD_REQUESTS)] + \
+           [(0.02 + i * 0.001, f"u{i}") for i in range(FLOOD_OTHERS)]
+
+
+def run(kind, mode):
+    backend = SharedBackend()
+    scheduler = None
+    if mode == "direct":
+        handle = direct
+    else:
+        per_user = MAX_QUEUED if mode == "fifo" else MAX_PER_USER
+        scheduler = LLMScheduler(backend, MAX_CONCURRENT, MAX_QUEUED, per_user, service_time=REPLY_TOKENS / TOKENS_PER_SEC)
+        handle = scheduled(scheduler, mode)
+    results = []
+    threads = []
+    start = time.perf_counter()
+    for offset, user in burst(kind):
+        delay = start + offset - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        thread = threading.Thread(target=handle, args=(backend, user, time.perf_counter(), results))
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+    if scheduler:
+        scheduler.close()
+    return results
+
+
+def pct(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, len(values) * p // 100)] if values else float("nan")
+
+
+def row(label, results):
+    ok = [r for r in results if r[1] == "ok"]
+    ttft = [r[2] for r in ok]
+    total = [r[3] for r in ok]
+    print(f"{label:<22}  {len(ok):>4}/{len(results):<4}  {sum(r[1] == 'timeout' for r in results):>7}  "
+          f"{sum(r[1] == 'shed' for r in results):>4}  {pct(ttft, 50):>8.2f}  {pct(ttft, 95):>8.2f}  "
+          f"{pct(total, 50):>7.2f}  {pct(total, 95):>7.2f}")
+
+
+print(f"backend {TOKENS_PER_SEC} tokens/s shared, {REPLY_TOKENS} tokens per reply, timeout {TIMEOUT}s, "
+      f"scheduler: {MAX_CONCURRENT} at once, {MAX_QUEUED} queued, {MAX_PER_USER} per user\n")
+print(f"{'burst / mode':<22}  {'answered':>9}  {'timeout':>7}  {'shed':>4}  {'ttft p50':>8}  {'ttft p95':>8}  "
+      f"{'lat p50':>7}  {'lat p95':>7}")
+for kind in ("even", "flood"):
+    for mode in ("direct", "fifo", "fair"):
+        results = run(kind, mode)
+        row(f"{kind} / {mode}", results)
+        if kind == "flood":
+            row("  others only", [r for r in results if r[0] != "flooder"])
+    print()
@@ -0,0 +1,58 @@
+"""
+Benchmark CourseManager start-up with and without the binary snapshot cache.
+
+For each data-set size a temporary data directory is generated in the text
+format of data/. "parse" is a start with no snapshot (the three files are
+parsed line by line, the search index is built and the snapshot is written);
+"snapshot" is the next start, which loads the snapshot (search index included)
+because nothing changed. Every start runs in a fresh interpreter so nothing is
+shared between them.
+
+Usage:  python bench_startup.py
+"""
+
+import os, sys, random, pathlib, tempfile, subprocess
+
+MAIN_FRAME = pathlib.Path(__file__).resolve().parent.parent / "main frame"
+
+# ---------- CONFIG ----------
+RUNS                = [(1_000, 500), (10_000, 500), (50_000, 500), (50_000, 100_000)]   # (students, catalog size)
+COURSES_PER_STUDENT = 20
+GRADES              = ["A", "A-", "B+", "B", "B-", "C+", "C", "D", "F"]
+# ----------------------------
+
+TIMED_START = (
+    "import time, sys; sys.path.insert(0, sys.argv[1]); "
+    "from course_manager import CourseManager; "
+    "t = time.perf_counter(); CourseManager(); print(time.perf_counter() - t)"
+)
+
+
+def write_data(directory, students, catalog_size):
+    rng = random.Random(0)
+    catalog = [f"DEPT {1000 + i}: Course Title Number {i}" for i in range(catalog_size)]
+    with open(os.path.join(directory, "course_list.txt"), "w", encoding="utf-8") as f:
+        f.write("\n".join(catalog) + "\n")
+    with open(os.path.join(directory, "account.txt"), "w", encoding="utf-8") as f:
+        for s in range(students):
+            f.write(f"student{s}@smartcourse.com,pw{s},student,cps\n")
+    with open(os.path.join(directory, "enrolled_courses.txt"), "w", encoding="utf-8") as f:
+        for s in range(students):
+            for course in rng.sample(catalog, COURSES_PER_STUDENT):
+                f.write(f"student{s}@smartcourse.com,{course},{rng.choice(GRADES)}\n")
+
+
+def timed_start(directory):
+    out = subprocess.run([sys.executable, "-c", TIMED_START, str(MAIN_FRAME)],
+                         cwd=directory, capture_output=True, text=True, check=True)
+    return float(out.stdout)
+
+
+print(f"{'students':>9}  {'enrollments':>11}  {'courses':>7}  {'parse (ms)':>10}  {'snapshot (ms)':>13}  {'speed-up':>8}")
+for n, catalog_size in RUNS:
+    with tempfile.TemporaryDirectory() as tmp:
+        write_data(tmp, n, catalog_size)
+        parse_s = timed_start(tmp)
+        snapshot_s = timed_start(tmp)
+        print(f"{n:>9}  {n * COURSES_PER_STUDENT:>11}  {catalog_size:>7}  {parse_s * 1e3:>10.0f}"
+              f"  {snapshot_s * 1e3:>13.0f}  {parse_s / snapshot_s:>7.1f}x")
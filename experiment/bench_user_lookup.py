@@ -0,0 +1,60 @@
+"""
+Benchmark username lookups in CourseManager.
+
+Compares the username index (get_student_by_username / authenticate_user)
+against the old linear scan over manager.students for roster sizes from
+100 to 1M accounts. Each roster is written to a temporary account.txt and
+loaded through the normal CourseManager constructor.
+
+Usage:  python bench_user_lookup.py
+"""
+
+import os, sys, time, random, pathlib, tempfile
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent / "main frame"))
+from course_manager import CourseManager
+
+# ---------- CONFIG ----------
+SIZES         = [100, 1_000, 10_000, 100_000, 1_000_000]
+INDEX_LOOKUPS = 100_000
+SCAN_LOOKUPS  = 200        # the linear scan gets very slow at 1M users
+# ----------------------------
+
+
+def linear_lookup(manager, username):
+    # The pre-index implementation of get_student_by_username
+    for student in manager.students:
+        if student.username == username:
+            return student
+    return None
+
+
+def per_call_us(fn, names):
+    start = time.perf_counter()
+    for name in names:
+        fn(name)
+    return (time.perf_counter() - start) / len(names) * 1e6
+
+
+print(f"{'users':>9}  {'load (s)':>9}  {'index (us)':>11}  {'login (us)':>11}  {'scan (us)':>11}")
+for n in SIZES:
+    with tempfile.TemporaryDirectory() as tmp:
+        with open(os.path.join(tmp, "account.txt"), "w", encoding="utf-8") as f:
+            for i in range(n):
+                f.write(f"user{i}@smartcourse.com,pw{i},student,cps\n")
+
+        cwd = os.getcwd()
+        os.chdir(tmp)
+        try:
+            start = time.perf_counter()
+            manager = CourseManager()
+            load_s = time.perf_counter() - start
+        finally:
+            os.chdir(cwd)
+
+    names = [f"user{random.randrange(n)}@smartcourse.com" for _ in range(INDEX_LOOKUPS)]
+    index_us = per_call_us(manager.get_student_by_username, names)
+    login_us = per_call_us(lambda u: manager.authenticate_user(u, "pw", True), names)
+    scan_us = per_call_us(lambda u: linear_lookup(manager, u), names[:SCAN_LOOKUPS])
+
+    print(f"{n:>9}  {load_s:>9.2f}  {index_us:>11.3f}  {login_us:>11.3f}  {scan_us:>11.1f}")
@@ -0,0 +1,109 @@
+"""
+Checks that class-size limits hold across several app processes sharing one
+data directory (or SQLite database).
+
+Every worker process opens its own CourseManager and, at the same moment, tries
+to enroll its own students in one course whose limit is far below the number of
+students trying (half one at a time, half with bulk_enroll). Afterwards the
+course must be exactly full, in every worker and in the data reloaded from disk.
+One worker then changes the limit and every other worker must see the new one.
+
+Usage:  python check_capacity.py
+"""
+
+import os, sys, pathlib, tempfile, multiprocessing
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent / "main frame"))
+from course_manager import CourseManager
+from storage import TextFileStorage, SQLiteStorage
+
+# ---------- CONFIG ----------
+WORKERS      = 4
+STUDENTS     = 40      # per worker
+CAPACITY     = 25
+NEW_CAPACITY = 60
+COURSE       = "CPS 4150: Computer Architecture"
+# ----------------------------
+
+USERNAMES = [f"student{s}@smartcourse.com" for s in range(WORKERS * STUDENTS)]
+
+
+def write_data(directory):
+    with open(os.path.join(directory, "course_list.txt"), "w", encoding="utf-8") as f:
+        f.write(COURSE + "\n")
+    with open(os.path.join(directory, "account.txt"), "w", encoding="utf-8") as f:
+        for u in USERNAMES:
+            f.write(f"{u},pw,student,cps\n")
+
+
+def make_storage(backend, tmp):
+    if backend == "text":
+        return TextFileStorage(tmp)
+    return SQLiteStorage(os.path.join(tmp, "check.db"))
+
+
+def worker(backend, tmp, w, barrier, results):
+    try:
+        manager = CourseManager(make_storage(backend, tmp))
+        own = USERNAMES[w * STUDENTS:(w + 1) * STUDENTS]
+        barrier.wait()
+        accepted = sum(manager.enroll_student(u, COURSE) for u in own[:STUDENTS // 2])
+        for u in own[STUDENTS // 2:]:
+            accepted += len(manager.bulk_enroll([(u, COURSE)])[0])
+        manager.flush()
+        barrier.wait()  # every worker has enrolled
+        if w == 0:
+            manager.set_course_capacity(COURSE, NEW_CAPACITY)
+            manager.flush()
+        barrier.wait()  # the new limit is saved
+        manager.refresh()
+        results.put((accepted, len(manager.get_course_roster(COURSE)), manager.course_capacity(COURSE)))
+        manager.close()
+    except Exception:
+        barrier.abort()
+        results.put((0, -1, None))
+        raise
+
+
+def run(backend):
+    with tempfile.TemporaryDirectory() as tmp:
+        write_data(tmp)
+        if backend == "sqlite":
+            seed = SQLiteStorage(os.path.join(tmp, "check.db"))
+            seed.add_courses([COURSE])
+            seed.add_users((u, "pw", "student", "cps") for u in USERNAMES)
+            seed.close()
+        seed = CourseManager(make_storage(backend, tmp))
+        seed.set_course_capacity(COURSE, CAPACITY)
+        seed.close()
+        barrier = multiprocessing.Barrier(WORKERS)
+        results = multiprocessing.Queue()
+        procs = [multiprocessing.Process(target=worker, args=(backend, tmp, w, barrier, results))
+                 for w in range(WORKERS)]
+        for p in procs:
+            p.start()
+        outcomes = [results.get() for _ in procs]
+        for p in procs:
+            p.join()
+        snapshot = os.path.join(tmp, "smartcourse.snapshot")
+        if os.path.exists(snapshot):
+            os.remove(snapshot)
+        reloaded = CourseManager(make_storage(backend, tmp))
+        on_disk = len(reloaded.get_course_roster(COURSE))
+        reloaded.close()
+    return sum(o[0] for o in outcomes), [o[1] for o in outcomes], [o[2] for o in outcomes], on_disk
+
+
+if __name__ == "__main__":
+    failures = 0
+    print(f"{WORKERS} processes x {STUDENTS} students enrolling in one course with {CAPACITY} seats\n")
+    print(f"{'backend':<8}  {'accepted':>8}  {'rosters':<16}  {'reloaded':>8}  {'new limit seen':<16}")
+    for backend in ("text", "sqlite"):
+        accepted, rosters, limits, on_disk = run(backend)
+        ok = accepted == CAPACITY and on_disk == CAPACITY and all(r == CAPACITY for r in rosters)
+        ok_limit = all(limit == NEW_CAPACITY for limit in limits)
+        failures += (not ok) + (not ok_limit)
+        print(f"{backend:<8}  {accepted:>8}  {str(rosters):<16}  {on_disk:>8}  {str(limits):<16}"
+              f"  {'ok' if ok and ok_limit else 'FAILED'}")
+    print("\nNo course was overbooked." if not failures else f"\n{failures} checks failed!")
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,54 @@
+"""
+Checks that the streamed reply of utils.ThinkFilter is what the whole-reply
+code showed: the text after the last </think> (the whole text without one).
+
+Every case is fed in one piece, one character at a time and split in two at
+every position, so tags cut across chunks are covered. The script exits with
+an error on the first difference.
+
+Usage:  python check_think_filter.py
+"""
+
+import sys, pathlib
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent / "main frame"))
+from utils import ThinkFilter
+
+# ---------- CONFIG ----------
+LONG = "Take CPS 2232: Data Structure next, then CPS 3440: Analysis of Algorithms in the spring."
+CASES = [
+    "reasoning here</think>Answer",                    # closing tag without an opening one
+    "a<think>b</think>c<think>d</think>e",             # several blocks: only the text after the last
+    "<think>Let me look at the plan.</think>\n\n" + LONG,
+    LONG,                                              # no reasoning: streamed after HOLD_CHARS
+    LONG + " Also consider MATH 2110 if x < y.",
+    "<think>unfinished reasoning",                     # no </think> at all: shown as it is
+    "",
+]
+# ----------------------------
+
+
+def whole_reply(text):
+    # ask_ai_question before streaming
+    return text.split("</think>")[-1].strip() if "</think>" in text else text.strip()
+
+
+def streamed(chunks):
+    f = ThinkFilter()
+    return ("".join(f.feed(c) for c in chunks) + f.flush()).strip()
+
+
+failures = 0
+for text in CASES:
+    splits = [[text], list(text)] + [[text[:i], text[i:]] for i in range(1, len(text))]
+    expected = whole_reply(text)
+    wrong = [chunks for chunks in splits if streamed(chunks) != expected]
+    status = "ok" if not wrong else f"FAILED for {len(wrong)} of {len(splits)} chunkings, e.g. {wrong[0]!r}"
+    print(f"{status:<6}  {text[:60]!r} -> {expected[:40]!r}")
+    failures += bool(wrong)
+
+f = ThinkFilter()
+shown = f.feed(LONG[:ThinkFilter.HOLD_CHARS + 8])
+print(f"\nA reply without reasoning starts showing after {ThinkFilter.HOLD_CHARS} characters: {bool(shown)}")
+if failures or not shown:
+    sys.exit(1)
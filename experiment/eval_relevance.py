@@ -7,10 +7,34 @@ PlanScore      = (# courses in plan & not taken) / #rec
 PersonalScore  = (# courses in plan & (not taken or low grade)) / #rec
 Lift           = PersonalScore − PlanScore
 Recall         = good(plan) / (plan − taken)
+
+PROMPT_STYLE "compact" builds the prompts with prompt_builder (remaining plan,
+summarised transcript, token budget); "verbatim" pastes the whole plan file and
+transcript as before, for comparing prompt tokens, latency and the metrics.
+"question-first" is "compact" with the question moved to the front, the layout
+before the plan and instructions became a prefix shared by all prompts of a
+mode: with it Ollama has to evaluate every prompt from the start.
+
+Mode "rules" scores the deterministic "what next" list of recommender.py, the
+fast path the apps answer common questions with, for every question (no model).
+
+WORKERS questions are evaluated at once (the server has to run that many in
+parallel for it to pay off), mode by mode, so prompts in flight together share
+that prefix. Every row goes to OUT_CSV as soon as it is scored, and a rerun
+with the same settings skips the (question, mode) pairs already there, so an
+interrupted run or failed requests cost only what is missing.
+PromptTokens is the estimated prompt size, PromptEvalTokens and PromptEval what
+the model reports it actually evaluated (the reused prefix is not counted).
 """
 
-import re, csv, time, difflib, pathlib, random, statistics, requests, json
+import os, re, csv, json, time, difflib, random, statistics
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from course_manager import CourseManager
+from llm_client import LLMClient, URL_ENV_VAR, MODEL_ENV_VAR, DEFAULT_URL, DEFAULT_MODEL
+from llm_router import LLMRouter
+from plan_registry import get_plan_registry
+from prompt_builder import PromptBuilder, estimate_tokens, TOKEN_BUDGET
+from recommender import Recommender
 
 BOOT_ITER = 10000
 LOW_GRADE_THRESHOLD = "B-"
@@ -20,17 +44,35 @@ STREAM_MODEL = True
 TEST_STUDENT  = "user@smartcourse.com"
 QUESTION_FILE = "evaluation_questions.txt"
 OUT_CSV       = "relevance_scores.csv"
-MODEL_NAME    = "llama3.1:8b"
-OLLAMA_URL    = "http://127.0.0.1:11434"
+MODEL_NAME    = os.environ.get(MODEL_ENV_VAR) or DEFAULT_MODEL   # the apps' settings (llm_client.py)
+OLLAMA_URL    = os.environ.get(URL_ENV_VAR) or DEFAULT_URL       # e.g. mock_ollama.py
+PROMPT_STYLE  = "compact"          # or "question-first", "verbatim"
+PROMPT_TOKEN_BUDGET = TOKEN_BUDGET
+WORKERS       = 4                  # questions in flight at once; match the server's OLLAMA_NUM_PARALLEL
+RESUME        = True               # keep the rows already in OUT_CSV (see CHECKPOINT)
+CHECKPOINT    = OUT_CSV + ".json"  # the settings OUT_CSV was made with
 # ----------------------------
 
+# Pooled keep-alive connections shared by the workers instead of a new one per request; several
+# comma-separated URLs spread the questions over those servers
+urls = [u.strip() for u in OLLAMA_URL.split(",") if u.strip()]
+if len(urls) > 1:
+    client = LLMRouter(urls, model=MODEL_NAME, read_timeout=600)
+else:
+    client = LLMClient(base_url=OLLAMA_URL, model=MODEL_NAME, read_timeout=600, pool_size=max(WORKERS, 10))
+
 mgr = CourseManager()
 student = mgr.get_student_by_username(TEST_STUDENT)
 if not student:
     raise ValueError(f"{TEST_STUDENT} not found.")
 
-plan_file = f"{student.major}_plan.txt"
-plan_courses = {l.strip() for l in open(plan_file, encoding="utf-8") if l.strip()}
+# The plan the apps advise from: its text for the prompts, its course set (without the "Year N:"
+# headings) for the scores
+plan = get_plan_registry().get(student.major)
+if plan is None:
+    raise ValueError(f"No plan for major {student.major}.")
+plan_text = plan.text
+plan_courses = plan.course_set
 
 all_courses = [l.strip() for l in open("course_list.txt", encoding="utf-8") if l.strip()]
 all_codes = {c.split(":")[0].strip(): c for c in all_courses}
@@ -45,21 +87,15 @@ def grade_low(c: str) -> bool:
     g = course_grades.get(c)
     return g is not None and grade_rank.get(g, 99) >= grade_rank[LOW_GRADE_THRESHOLD]
 
-def ask_ai(prompt: str) -> tuple[str, float]:
+def ask_ai(prompt: str) -> tuple[str, float, dict]:
+    # Also returns Ollama's timings and token counts for the request (see llm_client.STAT_FIELDS)
     start = time.time()
-    payload = {"model": MODEL_NAME, "prompt": prompt, "stream": STREAM_MODEL}
-    r = requests.post(f"{OLLAMA_URL}/api/generate", json=payload, timeout=600)
+    stats = {}
     if STREAM_MODEL:
-        parts = []
-        for line in r.iter_lines():
-            if line:
-                data = json.loads(line.decode())
-                if "response" in data:
-                    parts.append(data["response"])
-        txt = "".join(parts)
+        txt = "".join(client.stream(prompt, stats=stats))
     else:
-        txt = r.json().get("response", "")
-    return txt.strip(), time.time() - start
+        txt = client.generate(prompt, stats=stats)
+    return txt.strip(), time.time() - start, stats
 
 def extract_courses(text: str) -> set[str]:
     found = set()
@@ -95,10 +131,30 @@ noTranscript_suffix = (
 )
 
 
+builder = PromptBuilder(PROMPT_TOKEN_BUDGET, LOW_GRADE_THRESHOLD)
+recommender = Recommender(LOW_GRADE_THRESHOLD)
+
 def build_prompt(mode: str, q: str) -> str:
+    if PROMPT_STYLE == "verbatim":
+        return build_verbatim_prompt(mode, q)
+    if mode == "full":
+        parts = builder.parts(q, course_grades, plan_text, "Based on ALL information, recommend courses.", full_suffix)
+    elif mode == "noTranscript":
+        parts = builder.parts(q, None, plan_text, "Based on plan only, recommend courses.", noTranscript_suffix)
+    elif mode == "noPlan":
+        parts = builder.parts(q, course_grades, None, "Based on history only, recommend courses.", base_suffix)
+    else:
+        return q + base_suffix
+    prefix, history, ask = parts
+    if PROMPT_STYLE == "question-first":
+        return ask + "\n" + prefix + history
+    return prefix + history + ask
+
+def build_verbatim_prompt(mode: str, q: str) -> str:
+    # The prompts used before prompt_builder
     history = "\n".join(f"{c} - {g or 'Not assigned'}"
                         for c, g in course_grades.items())
-    plan_txt = "\n".join(plan_courses)
+    plan_txt = plan_text.strip()
 
     if mode == "full":
         return (
@@ -125,54 +181,123 @@ def build_prompt(mode: str, q: str) -> str:
     return q + base_suffix
 
 # ---------- evaluation ----------
-rows = []
-for q in (l.strip() for l in open(QUESTION_FILE, encoding="utf-8") if l.strip()):
-    for mode in ("full", "noTranscript", "noPlan", "question"):
-        rep, lat = ask_ai(build_prompt(mode, q))
-        recs = extract_courses(rep)
-
-        good_plan = {c for c in recs if c in plan_courses and c not in taken_courses}
-        good_personal = {
-            c for c in recs
-            if c in plan_courses and (c not in taken_courses or grade_low(c))
-        }
-
-        plan_score = len(good_plan) / len(recs) if recs else 0
-        pers_score = len(good_personal) / len(recs) if recs else 0
-        lift = pers_score - plan_score
-        recall = (len(good_plan) /
-                  (len(plan_courses - taken_courses))
-                  if plan_courses - taken_courses else 0)
-
-        rows.append([q, mode, len(recs), plan_score, pers_score, lift, recall, f"{lat:.2f}s"])
-        print(f"[{mode}] {q[:38]}… Rec:{len(recs)} Plan:{plan_score:.3f} Pers:{pers_score:.3f}")
-
-# Save results to CSV
-with open(OUT_CSV, "w", newline="", encoding="utf-8") as f:
-    csv.writer(f).writerow(
-        ["Question", "Mode", "#Rec", "PlanScore", "PersonalScore", "Lift", "Recall", "Latency"]
-    )
-    csv.writer(f).writerows(rows)
-print(f"Saved → {OUT_CSV}")
+MODES = ("full", "noTranscript", "noPlan", "question", "rules")
+HEADER = ["Question", "Mode", "#Rec", "PlanScore", "PersonalScore", "Lift", "Recall", "Latency",
+          "PromptTokens", "PromptEvalTokens", "PromptEval"]
+
+
+def evaluate(q: str, mode: str) -> list:
+    # One CSV row; runs in a worker thread
+    if mode == "rules":
+        start = time.time()
+        rep, stats = recommender.reply("next", course_grades, plan_text), {}
+        lat, prompt_tokens = time.time() - start, 0
+    else:
+        prompt = build_prompt(mode, q)
+        rep, lat, stats = ask_ai(prompt)
+        prompt_tokens = estimate_tokens(prompt)
+    prompt_eval_tokens = stats.get("prompt_eval_count", "")
+    prompt_eval = stats.get("prompt_eval_duration", 0) / 1e9
+    recs = extract_courses(rep)
+
+    good_plan = {c for c in recs if c in plan_courses and c not in taken_courses}
+    good_personal = {
+        c for c in recs
+        if c in plan_courses and (c not in taken_courses or grade_low(c))
+    }
+
+    plan_score = len(good_plan) / len(recs) if recs else 0
+    pers_score = len(good_personal) / len(recs) if recs else 0
+    lift = pers_score - plan_score
+    recall = (len(good_plan) /
+              (len(plan_courses - taken_courses))
+              if plan_courses - taken_courses else 0)
+
+    return [q, mode, len(recs), plan_score, pers_score, lift, recall, f"{lat:.2f}s",
+            prompt_tokens, prompt_eval_tokens, f"{prompt_eval:.2f}s"]
+
+
+# OUT_CSV is also the checkpoint: a rerun with the same settings only evaluates the (question, mode)
+# pairs it doesn't have yet, e.g. after an interrupted run or failed requests
+settings = {"student": TEST_STUDENT, "model": MODEL_NAME, "prompt_style": PROMPT_STYLE,
+            "token_budget": PROMPT_TOKEN_BUDGET, "questions": QUESTION_FILE}
+done = set()
+if RESUME and os.path.exists(OUT_CSV) and os.path.exists(CHECKPOINT):
+    with open(CHECKPOINT, encoding="utf-8") as f:
+        same = json.load(f) == settings
+    with open(OUT_CSV, newline="", encoding="utf-8") as f:
+        old = list(csv.reader(f))
+    if same and old and old[0] == HEADER:
+        done = {(r[0], r[1]) for r in old[1:] if len(r) == len(HEADER)}
+    else:
+        print(f"{OUT_CSV} is from other settings: starting over.")
+if not done:
+    with open(OUT_CSV, "w", newline="", encoding="utf-8") as f:
+        csv.writer(f).writerow(HEADER)
+    with open(CHECKPOINT, "w", encoding="utf-8") as f:
+        json.dump(settings, f)
+
+questions = [l.strip() for l in open(QUESTION_FILE, encoding="utf-8") if l.strip()]
+# Submitted mode by mode, so prompts running close together share the prefix
+todo = [(q, mode) for mode in MODES for q in questions if (q, mode) not in done]
+total = len(done) + len(todo)
+print(f"{len(done)} of {total} (question, mode) pairs already in {OUT_CSV}, {len(todo)} to go, {WORKERS} workers")
+
+failed = 0
+start = time.time()
+pool = ThreadPoolExecutor(WORKERS)
+with open(OUT_CSV, "a", newline="", encoding="utf-8") as f:
+    writer = csv.writer(f)
+    futures = {pool.submit(evaluate, q, mode): (q, mode) for q, mode in todo}
+    try:
+        for n, future in enumerate(as_completed(futures), 1):
+            q, mode = futures[future]
+            rate = n / (time.time() - start)
+            progress = f"[{len(done) + n}/{total}  {rate:.2f}/s  ETA {(len(todo) - n) / rate:.0f}s]"
+            try:
+                row = future.result()
+            except Exception as e:
+                failed += 1
+                print(f"{progress} [{mode}] {q[:38]}… failed: {e}")
+                continue
+            writer.writerow(row)
+            f.flush()  # kept even if the run is interrupted
+            print(f"{progress} [{mode}] {q[:38]}… Rec:{row[2]} Plan:{row[3]:.3f} Pers:{row[4]:.3f}")
+    except KeyboardInterrupt:
+        pool.shutdown(wait=False, cancel_futures=True)
+        raise SystemExit(f"\nInterrupted: the rows so far are in {OUT_CSV}; run again to continue.")
+pool.shutdown()
+print(f"Saved → {OUT_CSV} ({time.time() - start:.1f}s)")
+if failed:
+    print(f"{failed} pairs failed; run again to evaluate just those.")
 
-# Aggregate results
+# Aggregate results, over every row in OUT_CSV
+with open(OUT_CSV, newline="", encoding="utf-8") as f:
+    rows = [r for r in list(csv.reader(f))[1:] if len(r) == len(HEADER)]
 grouped = {}
-for *_q, m, _r, ps, prs, lf, rc, _ in rows:
-    grouped.setdefault(m, []).append((ps, prs, lf, rc))
+for _q, m, _r, ps, prs, lf, rc, lat, pt, pet, pe in sorted(rows, key=lambda r: MODES.index(r[1])):
+    grouped.setdefault(m, []).append((float(ps), float(prs), float(lf), float(rc), float(lat[:-1]), int(pt),
+                                      float(pe[:-1]), int(pet) if pet else ""))
 
 def ci(vals):
     boots = [statistics.mean(random.choices(vals, k=len(vals))) for _ in range(BOOT_ITER)]
     return statistics.quantiles(boots, n=20)[1:19:17]  # 5th & 95th pctile
 
-print("\n=== Aggregate metrics (95% CI) ===")
+print(f"\n=== Aggregate metrics (95% CI), {PROMPT_STYLE} prompts ===")
 for mode, v in grouped.items():
     pl = [x[0] for x in v]; pe = [x[1] for x in v]; li = [x[2] for x in v]; rc = [x[3] for x in v]
     mp, (pl_lo, pl_hi) = statistics.mean(pl), ci(pl)
     ms, (pe_lo, pe_hi) = statistics.mean(pe), ci(pe)
     ml, (li_lo, li_hi) = statistics.mean(li), ci(li)
     mr = statistics.mean(rc)
+    counts = [x[7] for x in v if x[7] != ""]   # not reported by every server
+    evaluated = f"{statistics.mean(counts):.0f}" if counts else "n/a"
     print(
         f"{mode:9}  Plan {mp:.3f} CI[{pl_lo:.3f},{pl_hi:.3f}]  "
         f"Personal {ms:.3f} CI[{pe_lo:.3f},{pe_hi:.3f}]  "
-        f"Lift {ml:+.3f} CI[{li_lo:+.3f},{li_hi:+.3f}]  Recall {mr:.3f}"
+        f"Lift {ml:+.3f} CI[{li_lo:+.3f},{li_hi:+.3f}]  Recall {mr:.3f}  "
+        f"PromptTokens {statistics.mean(x[5] for x in v):.0f}  "
+        f"Evaluated {evaluated}  "
+        f"PromptEval {statistics.mean(x[6] for x in v):.2f}s  "
+        f"Latency {statistics.mean(x[4] for x in v):.2f}s"
     )
@@ -0,0 +1,240 @@
+"""
+Local stand-in for Ollama's /api/generate, for benchmarks and for trying the apps
+and the evaluation without a model.
+
+It answers both non-streaming requests (one JSON object) and streaming ones
+(newline-delimited JSON chunks, one word each, ending with "done": true and
+Ollama's timing and token-count fields), and speaks HTTP/1.1 keep-alive like
+Ollama does. GET /api/version answers health checks (llm_router.py). A request
+without a prompt only "loads the model" and gets an empty reply.
+
+Timing and faults (all off by default, so the server answers at once):
+  ttft         seconds before the first word; `jitter` varies it by up to that
+               fraction either way, and `prompt_tps` adds the prompt's tokens
+               divided by that rate (longer prompts start later, like Ollama)
+  tps          words per second after the first (0: all at once)
+  error_rate   share of requests answered with HTTP 500 {"error": ...}
+  parallel     requests generated at once; the rest wait (Ollama's
+               OLLAMA_NUM_PARALLEL; 0: no limit)
+
+Replies are the fixed DEFAULT_REPLY or a template: "{courses}" in it becomes
+`courses` course lines ("CPS 2232: Data Structure") taken from the prompt - the
+candidate courses of an advising prompt, or else any course codes in it, or else
+courses of the catalog drawn by the prompt - so the evaluation scores
+something. The same prompt always gets the same reply.
+
+Usage:  python mock_ollama.py [port] [--ttft S] [--jitter F] [--prompt-tps N] [--tps N]
+                              [--error-rate F] [--parallel N] [--reply canned|template|FILE]
+                              [--courses N] [--seed N]          (default port 11434)
+        then run the apps with SMARTCOURSE_LLM_URL=http://127.0.0.1:<port>
+"""
+
+import re, sys, json, time, random, pathlib, argparse, threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_REPLY = (
+    "Based on your plan and transcript, I suggest:\n"
+    "CPS 2232: Data Structure\n"
+    "CPS 3440: Analysis of Algorithms\n"
+    "MATH 2110: Discrete Structure\n"
+)
+TEMPLATE_REPLY = "Based on your plan and transcript, I suggest:\n{courses}\n"
+CATALOG = pathlib.Path(__file__).resolve().parent.parent / "data" / "course_list.txt"
+CANDIDATES_HEADING = "Candidate courses"   # prompt_builder's list of plan courses still to take
+CODE = re.compile(r"\b[A-Z]{2,4} \d{4}\b")
+CHARS_PER_TOKEN = 4                        # like prompt_builder.estimate_tokens
+
+
+def load_catalog(path=CATALOG):
+    # code -> "CODE: Name"
+    try:
+        lines = [l.strip() for l in open(path, encoding="utf-8") if l.strip()]
+    except FileNotFoundError:
+        return {}
+    return {l.split(":")[0].strip(): l for l in lines}
+
+
+def pick_courses(prompt, catalog, n):
+    # Up to n course lines for a templated reply, always the same for the same prompt
+    at = prompt.rfind(CANDIDATES_HEADING)
+    codes = list(dict.fromkeys(CODE.findall(prompt[at:] if at >= 0 else prompt)))
+    if not codes and catalog:
+        codes = random.Random(prompt).sample(sorted(catalog), min(n, len(catalog)))
+    return [catalog.get(code, code) for code in codes[:n]]
+
+
+class MockOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep connections open between requests
+    disable_nagle_algorithm = True  # headers and body go out as separate writes
+
+    def setup(self):
+        super().setup()
+        with self.server.stats_lock:
+            self.server.connections += 1
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if self.path != "/api/version":
+            self.send_error(404)
+            return
+        self._json(200, {"version": "0.0.0-mock"})
+
+    def do_POST(self):
+        if self.path != "/api/generate":
+            self.send_error(404)
+            return
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        prompt = body.get("prompt") or ""
+        model = body.get("model", "mock")
+        with server.stats_lock:
+            server.requests += 1
+            fail = server.random.random() < server.error_rate
+            ttft = server.ttft * (1 + server.jitter * (2 * server.random.random() - 1))
+            if fail:
+                server.errors += 1
+        if fail:
+            self._json(500, {"error": "mock failure"})
+            return
+        if not prompt:
+            # No prompt: only load the model, like Ollama
+            self._json(200, {"model": model, "response": "", "done": True})
+            return
+        prompt_tokens = max(1, len(prompt) // CHARS_PER_TOKEN)
+        if server.prompt_tps:
+            ttft += prompt_tokens / server.prompt_tps
+        with server.slots:
+            self._generate(body, model, self.reply(prompt), ttft, prompt_tokens)
+
+    def reply(self, prompt):
+        reply = self.server.reply
+        if "{courses}" in reply:
+            reply = reply.replace("{courses}", "\n".join(pick_courses(prompt, self.server.catalog,
+                                                                      self.server.courses)))
+        return reply
+
+    def _generate(self, body, model, reply, ttft, prompt_tokens):
+        server = self.server
+        start = time.perf_counter()
+        with server.stats_lock:
+            server.active += 1
+            server.peak_active = max(server.peak_active, server.active)
+        try:
+            words = reply.split(" ")
+            pieces = [word + (" " if i < len(words) - 1 else "") for i, word in enumerate(words)]
+            time.sleep(max(0.0, ttft))
+            first = time.perf_counter()
+            delay = 1 / server.tps if server.tps else 0.0
+            if body.get("stream", True):
+                # Ollama streams by default: one JSON object per line
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for i, piece in enumerate(pieces):
+                    if i and delay:
+                        time.sleep(delay)
+                    self._chunk({"model": model, "response": piece, "done": False})
+                self._chunk(dict({"model": model, "response": "", "done": True},
+                                 **self._timings(start, first, prompt_tokens, len(pieces))))
+                self.wfile.write(b"0\r\n\r\n")
+            else:
+                time.sleep(delay * (len(pieces) - 1))
+                self._json(200, dict({"model": model, "response": reply, "done": True},
+                                     **self._timings(start, first, prompt_tokens, len(pieces))))
+        finally:
+            with server.stats_lock:
+                server.active -= 1
+
+    def _timings(self, start, first, prompt_tokens, eval_tokens):
+        # Ollama's STAT_FIELDS (nanoseconds): the wait before the first word counts as prompt evaluation
+        now = time.perf_counter()
+        return {"total_duration": int((now - start) * 1e9), "load_duration": 0,
+                "prompt_eval_count": prompt_tokens, "prompt_eval_duration": int((first - start) * 1e9),
+                "eval_count": eval_tokens, "eval_duration": int((now - first) * 1e9)}
+
+    def _json(self, status, obj):
+        data = json.dumps(obj).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _chunk(self, obj):
+        line = (json.dumps(obj) + "\n").encode()
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+        self.wfile.flush()
+
+
+class MockOllamaServer(ThreadingHTTPServer):
+    def handle_error(self, request, client_address):
+        # A client that stops reading a reply (a cancelled or hedged request) is normal, not an error
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class _NoLimit:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+def make_server(host="127.0.0.1", port=11434, reply=DEFAULT_REPLY, ttft=0.0, jitter=0.0, prompt_tps=0.0,
+                tps=0.0, error_rate=0.0, parallel=0, courses=5, seed=None, catalog=None):
+    # reply may be a template with "{courses}" (TEMPLATE_REPLY); see the module docstring for the rest
+    server = MockOllamaServer((host, port), MockOllamaHandler)
+    server.daemon_threads = True
+    server.reply = reply
+    server.ttft = ttft
+    server.jitter = jitter
+    server.prompt_tps = prompt_tps
+    server.tps = tps
+    server.error_rate = error_rate
+    server.courses = courses
+    server.catalog = load_catalog() if catalog is None else catalog
+    server.slots = threading.BoundedSemaphore(parallel) if parallel else _NoLimit()
+    server.random = random.Random(seed)
+    server.connections = 0  # TCP connections accepted
+    server.requests = 0
+    server.errors = 0       # requests answered with an error on purpose
+    server.active = 0       # replies being generated right now
+    server.peak_active = 0
+    server.stats_lock = threading.Lock()
+    return server
+
+
+def serve_in_background(port=0, **kwargs):
+    # Starts a server on a free port (port=0) in a daemon thread; returns (server, base_url)
+    server = make_server(port=port, **kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for Ollama's /api/generate")
+    parser.add_argument("port", nargs="?", type=int, default=11434)
+    parser.add_argument("--ttft", type=float, default=0.0, help="seconds before the first word")
+    parser.add_argument("--jitter", type=float, default=0.0, help="ttft varies by up to this fraction")
+    parser.add_argument("--prompt-tps", type=float, default=0.0, help="prompt tokens evaluated per second")
+    parser.add_argument("--tps", type=float, default=0.0, help="words per second (0: all at once)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests that fail")
+    parser.add_argument("--parallel", type=int, default=0, help="requests generated at once (0: no limit)")
+    parser.add_argument("--reply", default="canned", help='"canned", "template" or a file with the reply text')
+    parser.add_argument("--courses", type=int, default=5, help="course lines in a templated reply")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+    if args.reply == "canned":
+        reply = DEFAULT_REPLY
+    elif args.reply == "template":
+        reply = TEMPLATE_REPLY
+    else:
+        reply = pathlib.Path(args.reply).read_text(encoding="utf-8")
+    print(f"Mock Ollama listening on http://127.0.0.1:{args.port}")
+    make_server(port=args.port, reply=reply, ttft=args.ttft, jitter=args.jitter, prompt_tps=args.prompt_tps,
+                tps=args.tps, error_rate=args.error_rate, parallel=args.parallel, courses=args.courses,
+                seed=args.seed).serve_forever()
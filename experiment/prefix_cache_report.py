@@ -0,0 +1,106 @@
+"""
+Prompt evaluation with the stable-prefix prompt layout vs the question first.
+
+  question first - the question, then the plan and instructions, then the
+                   transcript (the layout before prompt_builder put the parts
+                   shared by a major first)
+  stable prefix  - plan and instructions first (byte-identical for every
+                   student of the major), then the transcript, then the question
+
+Ollama keeps the evaluated tokens of the last prompt and only evaluates a new
+prompt from the first token where the two differ. The advising prompts of a
+mix of students and questions are sent one after the other:
+
+  offline - the share of each prompt that matches the previous one from the
+            start, i.e. what can be reused at best (estimated tokens)
+  model   - prompt_eval_count / prompt_eval_duration as reported by the model,
+            and the time to the first token; needs SMARTCOURSE_LLM_URL (or
+            Ollama on localhost) and skipped when no model answers
+
+Usage:  python prefix_cache_report.py
+"""
+
+import sys, time, random, pathlib, statistics
+import requests
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "main frame"))
+from llm_client import LLMClient
+from prompt_builder import PromptBuilder, estimate_tokens, parse_plan
+
+# ---------- CONFIG ----------
+DATA      = ROOT / "data"
+STUDENTS  = 6            # synthetic students, 0-3 plan years done
+REQUESTS  = 24           # prompts per layout
+OPTIONS   = {"num_predict": 8}   # short replies: prompt evaluation is what is measured
+# ----------------------------
+
+
+def synthetic_students(plan, rng):
+    students = []
+    for i in range(STUDENTS):
+        grades = {}
+        for _heading, courses in plan[:i % 4]:
+            for course in courses:
+                grades[course] = rng.choice(["A", "A-", "B+", "B", "B-", "C+"])
+        students.append(grades)
+    return students
+
+
+def layouts(builder, question, grades, plan_text):
+    prefix, history, ask = builder.parts(question, grades, plan_text)
+    return {"question first": ask + "\n" + prefix + history, "stable prefix": prefix + history + ask}
+
+
+def shared_prefix(a, b):
+    n = 0
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        n += 1
+    return n
+
+
+plan_text = (DATA / "cps_plan.txt").read_text(encoding="utf-8")
+questions = [l.strip() for l in (DATA / "evaluation_questions.txt").read_text(encoding="utf-8").splitlines() if l.strip()]
+rng = random.Random(0)
+students = synthetic_students(parse_plan(plan_text), rng)
+builder = PromptBuilder()
+prompts = {"question first": [], "stable prefix": []}
+for i in range(REQUESTS):
+    for name, prompt in layouts(builder, rng.choice(questions), rng.choice(students), plan_text).items():
+        prompts[name].append(prompt)
+
+print(f"{REQUESTS} advising prompts, {STUDENTS} students, {len(questions)} questions\n")
+print(f"{'layout':<16}  {'tokens':>6}  {'reusable':>8}  {'to evaluate':>11}")
+for name, sequence in prompts.items():
+    reusable = [shared_prefix(prev, cur) for prev, cur in zip(sequence, sequence[1:])]
+    tokens = statistics.mean(estimate_tokens(p) for p in sequence[1:])
+    reused = statistics.mean(estimate_tokens(p[:n]) for p, n in zip(sequence[1:], reusable))
+    print(f"{name:<16}  {tokens:>6.0f}  {reused / tokens:>8.0%}  {tokens - reused:>11.0f}")
+print("(estimated tokens per prompt after the first)\n")
+
+client = LLMClient(read_timeout=600)
+print(f"model {client.model} at {client.base_url}, keep_alive {client.keep_alive}")
+try:
+    client.generate("Hello", OPTIONS)  # loads the model, so the first measured prompt doesn't pay for it
+except requests.RequestException as e:
+    print(f"no model to measure ({e.__class__.__name__}), offline estimate only")
+    sys.exit()
+
+print(f"{'layout':<16}  {'evaluated':>9}  {'prompt eval p50':>15}  {'mean':>6}  {'ttft p50':>8}")
+for name, sequence in prompts.items():
+    client.generate(sequence[0], OPTIONS)  # the cache starts from a prompt of this layout
+    counts, evals, ttfts = [], [], []
+    for prompt in sequence[1:]:
+        stats = {}
+        start = time.perf_counter()
+        pieces = client.stream(prompt, OPTIONS, stats=stats)
+        next(pieces, None)
+        ttfts.append(time.perf_counter() - start)
+        for _ in pieces:
+            pass
+        counts.append(stats.get("prompt_eval_count", 0))
+        evals.append(stats.get("prompt_eval_duration", 0) / 1e9)
+    print(f"{name:<16}  {statistics.mean(counts):>9.0f}  {statistics.median(evals):>14.3f}s  "
+          f"{statistics.mean(evals):>5.3f}s  {statistics.median(ttfts):>7.3f}s")
@@ -0,0 +1,106 @@
+"""
+Hit rate and reuse quality of the semantic question cache at several thresholds.
+
+Reference: the questions of evaluation_questions.txt, treated as already
+answered. Two probe sets are matched against them:
+
+  paraphrases - reworded versions of some reference questions; reusing the
+                answer is right only when the match is the question they
+                paraphrase
+  distinct    - every reference question against all the others (leave one
+                out); these are different questions, so any reuse is wrong
+  negatives   - NEGATIVE_PAIRS: near-identical wording that differs in a
+                course code, grade, order, action (take/drop/avoid) or
+                department, so reuse is wrong too; the matcher must reject
+                them however high their cosine
+
+hit rate  = paraphrases answered from the right question / paraphrases
+wrong     = paraphrases answered from another question
+false hit = distinct questions answered from another question
+negative  = negative pairs answered from each other
+precision = right reuses / all reuses
+
+No model is needed: this measures which answers would be reused, not how
+the model would have answered.
+
+Usage:  python semantic_cache_report.py
+"""
+
+import sys, time, pathlib
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "main frame"))
+from semantic_cache import QuestionMatcher, SIMILARITY_THRESHOLD, vectorize, cosine
+
+# ---------- CONFIG ----------
+QUESTION_FILE = ROOT / "data" / "evaluation_questions.txt"
+THRESHOLDS    = [0.4, 0.5, 0.6, 0.7, 0.8, 0.9]
+# (line number in QUESTION_FILE, paraphrase)
+PARAPHRASES = [
+    (1, "Considering the AI classes I've already completed, which electives should I pick next term to build my AI foundation?"),
+    (2, "If I want to go into quant finance, which data science electives help the most?"),
+    (3, "I'm planning a master's in cybersecurity; which courses should I prioritize this year?"),
+    (5, "What electives best prepare me for a PhD in machine learning?"),
+    (6, "My workload is heavy; which easier courses could raise my GPA?"),
+    (7, "How can I balance difficulty this semester and still stay on track for graduation?"),
+    (10, "What courses fit a career in fintech?"),
+    (11, "I've mostly done front-end courses; which backend courses should I take next semester to become a full-stack developer?"),
+    (12, "Which gen-ed courses should I finish first based on my transcript?"),
+    (13, "What major core courses do I still have to complete before my senior year?"),
+    (14, "Which courses satisfy the writing intensive requirement most efficiently?"),
+    (18, "Can you look at my transcript and tell me which areas I need to improve?"),
+    (21, "Since I like collaborative work, what project-based courses should I choose next?"),
+    (23, "If I retake a failed course, what support courses would help me succeed?"),
+    (24, "I got a C in Calculus II, what should I take next to strengthen my math?"),
+    (25, "I've finished two AI electives; which other AI course would you recommend?"),
+]
+# (question, earlier question whose answer must not be reused for it)
+NEGATIVE_PAIRS = [
+    ("Can I take CPS 4150 next semester?", "Can I take CPS 4951 next semester?"),
+    ("I got C in Calculus II, what should I take next to strengthen my math?",
+     "I got A in Calculus II, what should I take next to strengthen my math?"),
+    ("Is CPS 3440 harder than CPS 3740?", "Is CPS 3740 harder than CPS 3440?"),
+    ("I got a C in Calculus I, what should I take next?", "I got a C in Calculus II, what should I take next?"),
+    ("Should I take Data Structure?", "Should I drop Data Structure?"),
+    ("Which courses should I avoid next semester?", "Which courses should I take next semester?"),
+    ("Which math courses should I take next semester?", "Which CPS courses should I take next semester?"),
+]
+# ----------------------------
+
+questions = [l.strip() for l in open(QUESTION_FILE, encoding="utf-8") if l.strip()]
+matcher = QuestionMatcher()
+
+start = time.perf_counter()
+paraphrase_matches = [(i - 1, matcher.best_match(p, questions, threshold=0.0)) for i, p in PARAPHRASES]
+distinct_matches = [matcher.best_match(q, questions[:i] + questions[i + 1:], threshold=0.0)
+                    for i, q in enumerate(questions)]
+per_lookup_ms = (time.perf_counter() - start) / (len(PARAPHRASES) + len(questions)) * 1e3
+negative_matches = [matcher.best_match(q, [earlier], threshold=0.0) for q, earlier in NEGATIVE_PAIRS]
+
+print(f"{len(questions)} reference questions, {len(PARAPHRASES)} paraphrases, "
+      f"{per_lookup_ms:.2f} ms per lookup against {len(questions)} candidates\n")
+print(f"{'threshold':>9}  {'hit rate':>8}  {'wrong':>5}  {'false hit':>9}  {'negative':>8}  {'precision':>9}")
+for t in THRESHOLDS:
+    right = sum(1 for i, m in paraphrase_matches if m and m[0] >= t and m[1] == questions[i])
+    wrong = sum(1 for i, m in paraphrase_matches if m and m[0] >= t and m[1] != questions[i])
+    false = sum(1 for m in distinct_matches if m and m[0] >= t)
+    negative = sum(1 for m in negative_matches if m and m[0] >= t)
+    reused = right + wrong + false + negative
+    precision = f"{right / reused:.2f}" if reused else "-"
+    marker = "  <- default" if t == SIMILARITY_THRESHOLD else ""
+    print(f"{t:>9.2f}  {right / len(PARAPHRASES):>8.2f}  {wrong:>5}  {false:>9}  {negative:>8}  {precision:>9}{marker}")
+
+print("\nParaphrase scores (right question / best wrong question):")
+for (i, p), (_, m) in zip(PARAPHRASES, paraphrase_matches):
+    own = matcher.best_match(p, [questions[i - 1]], threshold=0.0)
+    other = matcher.best_match(p, questions[:i - 1] + questions[i:], threshold=0.0)
+    print(f"  {own[0] if own else 0:.2f} / {other[0] if other else 0:.2f}  {p}")
+print("\nClosest distinct pairs:")
+for score, q, other in sorted(((m[0], q, m[1]) for q, m in zip(questions, distinct_matches) if m), reverse=True)[:5]:
+    print(f"  {score:.2f}  {q}\n        ~ {other}")
+print("\nNegative pairs (cosine of the words alone, then whether the matcher reuses the answer):")
+for (q, earlier), m in zip(NEGATIVE_PAIRS, negative_matches):
+    print(f"  {cosine(vectorize(q), vectorize(earlier)):.3f}  {'REUSED' if m else 'rejected'}  {q}\n"
+          f"                   ~ {earlier}")
+if any(negative_matches):
+    sys.exit("A negative pair was matched.")
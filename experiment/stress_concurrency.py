@@ -0,0 +1,117 @@
+"""
+Multi-threaded stress test for a shared CourseManager (as used by ui_gradio.py).
+
+Every thread enrolls, grades and drops courses for the *same* students at the
+same time, but each (student, course) pair belongs to exactly one thread, so
+the final state is known in advance. After the run the in-memory state and a
+fresh CourseManager reloaded from disk (text files and SQLite) must both match
+it exactly: no lost enrollments, grades or drops.
+
+Usage:  python stress_concurrency.py
+"""
+
+import os, sys, time, random, pathlib, tempfile, threading
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent / "main frame"))
+from course_manager import CourseManager
+from storage import TextFileStorage, SQLiteStorage
+
+# ---------- CONFIG ----------
+THREAD_COUNTS = [1, 4, 16, 64]
+STUDENTS      = 4
+COURSES       = 512
+GRADES        = ["A", "A-", "B+", "B", "B-", "C+", "C", "D", "F"]
+# ----------------------------
+
+COURSE_NAMES = [f"TEST {1000 + i}: Stress Course {i}" for i in range(COURSES)]
+USERNAMES = [f"student{s}@smartcourse.com" for s in range(STUDENTS)]
+
+
+def write_data(directory):
+    with open(os.path.join(directory, "course_list.txt"), "w", encoding="utf-8") as f:
+        f.write("\n".join(COURSE_NAMES) + "\n")
+    with open(os.path.join(directory, "account.txt"), "w", encoding="utf-8") as f:
+        for u in USERNAMES:
+            f.write(f"{u},pw,student,cps\n")
+
+
+def expected_state():
+    # Thread t owns every course c with c % threads == t: it enrolls, grades, and drops every third one
+    expected = {u: {} for u in USERNAMES}
+    for u in USERNAMES:
+        for c, course in enumerate(COURSE_NAMES):
+            if c % 3 != 0:
+                expected[u][course] = GRADES[(c + len(u)) % len(GRADES)]
+    return expected
+
+
+def worker(manager, t, threads, start_barrier):
+    rng = random.Random(t)
+    ops = [(u, c) for u in USERNAMES for c in range(COURSES) if c % threads == t]
+    rng.shuffle(ops)
+    start_barrier.wait()
+    for u, c in ops:
+        course = COURSE_NAMES[c]
+        manager.enroll_student(u, course)
+        if c % 3 == 0:
+            manager.drop_student_course(u, course)
+        else:
+            manager.set_student_grade(u, course, GRADES[(c + len(u)) % len(GRADES)])
+
+
+def state_of(manager):
+    return {u: dict(manager.get_student_courses(u).items()) for u in USERNAMES}
+
+
+def run(make_storage, threads):
+    manager = CourseManager(make_storage())
+    barrier = threading.Barrier(threads + 1)
+    pool = [threading.Thread(target=worker, args=(manager, t, threads, barrier)) for t in range(threads)]
+    for th in pool:
+        th.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for th in pool:
+        th.join()
+    manager.flush()
+    elapsed = time.perf_counter() - start
+    in_memory = state_of(manager)
+    manager.close()
+    return elapsed, in_memory
+
+
+failures = 0
+ops_total = STUDENTS * COURSES * 2
+print(f"{STUDENTS} students x {COURSES} courses, {ops_total} enroll/grade/drop calls per run\n")
+print(f"{'backend':<8}  {'threads':>7}  {'ops/s':>9}  {'memory':>7}  {'reloaded':>8}")
+for backend in ("text", "sqlite"):
+    for threads in THREAD_COUNTS:
+        with tempfile.TemporaryDirectory() as tmp:
+            write_data(tmp)
+            db_path = os.path.join(tmp, "stress.db")
+            if backend == "text":
+                make_storage = lambda: TextFileStorage(tmp)
+            else:
+                seed = SQLiteStorage(db_path)
+                seed.add_courses(COURSE_NAMES)
+                seed.add_users((u, "pw", "student", "cps") for u in USERNAMES)
+                seed.close()
+                make_storage = lambda: SQLiteStorage(db_path)
+
+            elapsed, in_memory = run(make_storage, threads)
+            # Reload from the data files themselves, not from the startup snapshot
+            snapshot = os.path.join(tmp, "smartcourse.snapshot")
+            if os.path.exists(snapshot):
+                os.remove(snapshot)
+            reloaded = CourseManager(make_storage())
+            on_disk = state_of(reloaded)
+            reloaded.close()
+
+            expected = expected_state()
+            ok_memory, ok_disk = in_memory == expected, on_disk == expected
+            failures += (not ok_memory) + (not ok_disk)
+            print(f"{backend:<8}  {threads:>7}  {ops_total / elapsed:>9.0f}  {'ok' if ok_memory else 'LOST':>7}"
+                  f"  {'ok' if ok_disk else 'LOST':>8}")
+
+print("\nNo lost updates." if not failures else f"\n{failures} runs lost updates!")
+sys.exit(1 if failures else 0)
@@ -1,127 +1,485 @@
-from data_models import Student, Instructor
+import csv
+import threading
+import time
+from data_models import GRADES, CourseRosters, Student, Instructor, course_ids, grade_codes
+from plan_progress import PlanProgress
+from plan_registry import get_plan_registry
+from search_index import CourseSearchIndex
+from snapshot_cache import load_snapshot, save_snapshot
+from storage import StorageWriter, open_storage
+
+# Reads look for other processes' changes at most this often (seconds); a few stat() calls each time would
+# otherwise cost more than the lookup itself. Looking up a user or course we don't know always looks.
+REFRESH_INTERVAL = 0.05
 
 class CourseManager:
     # Create an instance of CourseManager to manage courses, students, and instructors.
-    def __init__(self):
-        self.courses = self.load_course_list("course_list.txt")
+    # `storage` is where everything is persisted; by default the text files in the working directory.
+    #
+    # One manager is shared by every Gradio session. A student's courses are only changed while holding
+    # that student's lock, so sessions working on different students never wait for each other, and
+    # all writes go through a single StorageWriter thread instead of being made by the sessions.
+    #
+    # Several processes (e.g. app workers) may also share the same data. Reads first apply whatever the
+    # other processes wrote (see storage.py), at most REFRESH_INTERVAL after it was written; writes catch up
+    # with everything first.
+    def __init__(self, storage=None):
+        self.storage = storage if storage is not None else open_storage()
         self.students = []
         self.instructors = []
-        self.load_user_accounts("account.txt")
-        self.load_enrollments("enrolled_courses.txt")
+        # username -> Student/Instructor, kept in step with the two lists above
+        self._users = {}
+        self._indexed_students = 0
+        self._indexed_instructors = 0
+        self._registry_lock = threading.Lock()  # guards account creation, the username index and the catalog
+        self._student_locks = {}                # username -> lock for that student's enrollments
+        # course -> enrolled students, kept current by the Student objects themselves
+        self.rosters = CourseRosters()
+        self.plans = get_plan_registry()        # major -> DegreePlan, reloaded when a plan file changes
+        self.plans.load_all()
+        self._progress = {}                     # username -> PlanProgress, attached on first use
+        self._refreshed = 0.0                   # time.monotonic() of the last refresh()
+        # Start from the binary snapshot when the data files haven't changed since it was written.
+        # No process writes while we load, so the fingerprint matches exactly what was read.
+        with self.storage.reading():
+            fingerprint = self.storage.fingerprint()
+            if not self.load_snapshot(fingerprint):
+                self.courses = self.load_course_list()
+                self.search_index = CourseSearchIndex(self.courses)
+                self.load_user_accounts()
+                self.load_enrollments()
+                self.save_snapshot(fingerprint)
+            self.storage.mark_synced(fingerprint)
+            self.capacities = self.storage.load_capacities()  # course -> maximum number of students
+        with self._registry_lock:
+            self._sync_user_index()
+        self._writer = StorageWriter(self.storage)
+        self.storage.on_changes = self._apply_changes
 
-    def load_course_list(self, filename):
-        try:
-            # Open the course list file in read-only mode and read its contents.
-            with open(filename, "r", encoding="utf-8") as file:
-                return [line.strip() for line in file if line.strip()]
-        except FileNotFoundError:
-            return []
+    def load_course_list(self):
+        # Intern the catalog titles so enrollments share the catalog's strings and ids
+        return [course_ids.name(course_ids.intern(c)) for c in self.storage.load_courses()]
 
-    def load_user_accounts(self, filename):
-        try:
-            with open(filename, "r", encoding="utf-8") as file:
-                for line in file:
-                    parts = line.strip().split(",")
-                    # Check if a major is assigned to the student
-                    if len(parts) >= 3:
-                        username, password, role = parts[0], parts[1], parts[2]
-                        major = parts[3] if len(parts) >= 4 else None
+    def load_user_accounts(self):
+        for username, password, role, major in self.storage.load_users():
+            if role == "student":
+                self.students.append(Student(username, password, major))
+            else:
+                self.instructors.append(Instructor(username, password))
+
+    def load_enrollments(self):
+        # The backend hands back enroll/drop/grade events; replaying them rebuilds every student's courses
+        for op, username, course_name, grade in self.storage.load_enrollments():
+            self._apply_event(op, username, course_name, grade)
+
+    def _apply_event(self, op, username, course_name, grade=None):
+        student = self._find_user(username)
+        if not isinstance(student, Student):
+            return
+        if op == "E":
+            student.add_course(course_name)
+        elif op == "D":
+            student.drop_course(course_name)
+        elif op == "G":
+            student.set_grade(course_name, grade)
+
+    def refresh(self):
+        # Pick up changes other processes sharing the data have made
+        self._refreshed = time.monotonic()
+        self.storage.refresh()
+
+    def _refresh_if_due(self):
+        if time.monotonic() - self._refreshed >= REFRESH_INTERVAL:
+            self.refresh()
+
+    def _apply_changes(self, changes):
+        # Called by the storage with other processes' changes, oldest first
+        for change in changes:
+            kind = change[0]
+            if kind == "user":
+                _, username, password, role, major = change
+                with self._registry_lock:
+                    self._sync_user_index()
+                    if username not in self._users:
                         if role == "student":
                             self.students.append(Student(username, password, major))
                         else:
                             self.instructors.append(Instructor(username, password))
-        except FileNotFoundError:
-            pass
-
-    def load_enrollments(self, filename):
-        try:
-            with open(filename, "r", encoding="utf-8") as file:
-                for line in file:
-                    parts = line.strip().split(",")
-                    # Check if the line has enough parts to extract username, course name, and grade
-                    if len(parts) >= 2:
-                        username, course_name = parts[0], parts[1]
-                        grade = parts[2] if len(parts) == 3 else None
-                        student = self.get_student_by_username(username)
-                        if student:
-                            student.add_course(course_name)
-                            if grade:
-                                student.set_grade(course_name, grade)
-        except FileNotFoundError:
-            pass
+                        self._sync_user_index()
+            elif kind == "course":
+                course_name = course_ids.name(course_ids.intern(change[1]))
+                with self._registry_lock:
+                    if course_name not in self.search_index:
+                        self.courses.append(course_name)
+                        self.search_index.add(course_name)
+            elif kind == "capacity":
+                _, course_name, capacity = change
+                if capacity is None:
+                    self.capacities.pop(course_name, None)
+                else:
+                    self.capacities[course_name] = capacity
+            elif kind == "reset":
+                # Every enrollment follows, replayed from the beginning
+                for student in list(self.students):
+                    with self._student_lock(student.username):
+                        student.clear_courses()
+            else:
+                with self._student_lock(change[1]):
+                    self._apply_event(*change)
+        # Our own changes that aren't written yet will be written after these, so where both touch the same
+        # enrollment ours must win: apply them again on top. After a reset all of them, as none are in the replay.
+        reset = any(change[0] == "reset" for change in changes)
+        touched = {(change[1], change[2]) for change in changes if change[0] in ("E", "D", "G")}
+        for event in self._writer.pending_events():
+            if reset or (event[1], event[2]) in touched:
+                with self._student_lock(event[1]):
+                    self._apply_event(*event)
 
     def save_account(self, username, password, is_student):
-        with open("account.txt", "a", encoding="utf-8") as file:
-            role = "student" if is_student else "instructor"
-            # If the user is a student, include their major in the account file
-            if is_student:
-                student = self.get_student_by_username(username)
-                major = student.major if student else ""
-                file.write(f"{username},{password},{role},{major}\n")
-            else:
-                # For instructors, just save username, password, and role
-                file.write(f"{username},{password},{role}\n")
+        role = "student" if is_student else "instructor"
+        # If the user is a student, include their major in the account record
+        student = self._find_user(username) if is_student else None
+        # Written before returning, like add_catalog_course and set_course_capacity: an app may exit right after
+        self._writer.run(self.storage.add_user, username, password, role, student.major if student else None)
+
+    def enrollment_rows(self):
+        for student in self.students:
+            for course_name, grade in student.enrolled_courses.items():
+                yield student.username, course_name, grade
 
     def save_enrollments(self):
-        with open("enrolled_courses.txt", "w", encoding="utf-8") as file:
-            for student in self.students:
-                for course_name, grade in student.enrolled_courses.items():
-                    line = f"{student.username},{course_name}"
-                    # If the student has a grade for the course, include it in the line
-                    if grade is not None:
-                        line += f",{grade}"
-                    file.write(line + "\n")
+        # Full rewrite of every enrollment; normally each change is recorded on its own as it happens.
+        # The rows are produced on the writer thread, after every change queued before this call.
+        self._writer.call(lambda: self.storage.save_enrollments(self.enrollment_rows()))
+        self._writer.flush()
 
     def append_enrollment(self, username, course_name):
-        with open("enrolled_courses.txt", "a", encoding="utf-8") as file:
-            file.write(f"{username},{course_name}\n")
+        self._writer.record("E", username, course_name)
 
-    def create_account(self, username, password, is_student):
-        if is_student:
-            self.students.append(Student(username, password))
-        else:
+    def flush(self):
+        # Wait until every change made so far has been persisted
+        self._writer.flush()
+
+    def load_snapshot(self, fingerprint):
+        path = self.storage.snapshot_path
+        state = load_snapshot(path, fingerprint) if path else None
+        if state is None:
+            return False
+        # Ids in the snapshot are only valid as-is if this process interned the same titles in the same order
+        course_map = [course_ids.intern(name) for name in state["course_names"]]
+        grade_map = [grade_codes.intern(name) for name in state["grade_names"]]
+        if course_map == list(range(len(course_map))):
+            course_map = None
+        if grade_map == list(range(len(grade_map))):
+            grade_map = None
+        self.courses = [course_ids.name(course_ids.intern(c)) for c in state["courses"]]
+        self.search_index = state["search_index"]
+        for username, password, major, course_bytes, grade_bytes in state["students"]:
+            student = Student(username, password, major)
+            student.import_enrollments(course_bytes, grade_bytes, course_map, grade_map)
+            self.students.append(student)
+        for username, password in state["instructors"]:
             self.instructors.append(Instructor(username, password))
+        return True
+
+    def save_snapshot(self, fingerprint):
+        path = self.storage.snapshot_path
+        if not path:
+            return
+        state = {
+            "courses": self.courses,
+            "search_index": self.search_index,
+            "course_names": course_ids.names,
+            "grade_names": grade_codes.names,
+            "students": [(s.username, s.password, s.major, *s.export_enrollments()) for s in self.students],
+            "instructors": [(i.username, i.password) for i in self.instructors],
+        }
+        save_snapshot(path, fingerprint, state)
+
+    def close(self):
+        # The snapshot is only ever written right after parsing the files (see __init__), never from memory:
+        # anything memory got wrong, e.g. a write that failed, would otherwise be loaded at every start
+        self._writer.close()
+        self.storage.close()
+
+    def create_account(self, username, password, is_student, major=None):
+        with self._registry_lock:
+            # The UIs may already have appended the user object themselves, so only add it once
+            self._sync_user_index()
+            if username not in self._users:
+                if is_student:
+                    self.students.append(Student(username, password, major))
+                else:
+                    self.instructors.append(Instructor(username, password))
+                self._sync_user_index()
         self.save_account(username, password, is_student)
 
+    def _sync_user_index(self):
+        # Pick up users appended directly to self.students / self.instructors since the last sync.
+        # Only the new tail of each list is indexed, so this is O(1) when nothing changed.
+        if self._indexed_students < len(self.students):
+            for student in self.students[self._indexed_students:]:
+                self._users.setdefault(student.username, student)
+                student.attach_rosters(self.rosters)
+            self._indexed_students = len(self.students)
+        if self._indexed_instructors < len(self.instructors):
+            for instructor in self.instructors[self._indexed_instructors:]:
+                self._users.setdefault(instructor.username, instructor)
+            self._indexed_instructors = len(self.instructors)
+
+    def get_user(self, username):
+        self._refresh_if_due()
+        user = self._find_user(username)
+        if user is None:
+            # May have just registered in another process
+            self.refresh()
+            user = self._find_user(username)
+        return user
+
+    def _find_user(self, username):
+        if self._indexed_students < len(self.students) or self._indexed_instructors < len(self.instructors):
+            with self._registry_lock:
+                self._sync_user_index()
+        return self._users.get(username)
+
+    def _student_lock(self, username):
+        lock = self._student_locks.get(username)
+        if lock is None:
+            # setdefault is atomic, so two sessions racing here still end up with the same lock
+            lock = self._student_locks.setdefault(username, threading.Lock())
+        return lock
+
+    def user_exists(self, username):
+        return self.get_user(username) is not None
+
     def authenticate_user(self, username, password, is_student):
-        user_list = self.students if is_student else self.instructors # Select the appropriate user list based on the role
-        return any(user.username == username and user.password == password for user in user_list) # Check if the user exists in the selected list
+        user = self.get_user(username)
+        # The account must exist, have the requested role and match the password
+        return user is not None and isinstance(user, Student) == is_student and user.password == password
 
     def is_student_account(self, username):
-        return any(student.username == username for student in self.students)
+        return isinstance(self.get_user(username), Student)
 
     def get_student_by_username(self, username):
-        for student in self.students:
-            if student.username == username:
-                return student
-        return None
+        user = self.get_user(username)
+        return user if isinstance(user, Student) else None
+
+    def search_courses(self, keyword, limit=None):
+        # User can search for courses for any keyword, including an empty string to return all courses.
+        # Matches come back ranked: exact course code, then substring and word/prefix/typo matches.
+        self._refresh_if_due()
+        return self.search_index.search(keyword, limit)
+
+    def has_course(self, course_name):
+        self._refresh_if_due()
+        if course_name not in self.search_index:
+            self.refresh()
+        return course_name in self.search_index
+
+    def add_catalog_course(self, course_name):
+        if self.has_course(course_name):
+            return
+        course_name = course_ids.name(course_ids.intern(course_name))
+        with self._registry_lock:
+            if course_name in self.search_index:
+                return
+            self.courses.append(course_name)
+            self.search_index.add(course_name)
+        self._writer.run(self.storage.add_course, course_name)
+
+    def course_count(self, course_name):
+        return self.rosters.count(course_name)
+
+    def course_capacity(self, course_name):
+        # None when the course has no limit
+        return self.capacities.get(course_name)
 
-    def search_courses(self, keyword):
-        keyword_lower = keyword.lower()
-        # User can search for courses for any keyword, including an empty string to return all courses
-        return [course for course in self.courses if keyword_lower in course.lower() or not keyword]
+    def is_course_full(self, course_name):
+        capacity = self.capacities.get(course_name)
+        return capacity is not None and self.rosters.count(course_name) >= capacity
+
+    def set_course_capacity(self, course_name, capacity):
+        # capacity None removes the limit. Students already enrolled stay enrolled even above a lower limit.
+        if capacity is None:
+            self.capacities.pop(course_name, None)
+        else:
+            self.capacities[course_name] = capacity
+        self._writer.run(self.storage.save_capacity, course_name, capacity)
+
+    def get_course_roster(self, course_name):
+        # (username, grade) for every student enrolled in the course, in enrollment order
+        self._refresh_if_due()
+        return [(student.username, student.enrolled_courses.get(course_name))
+                for student in self.rosters.students(course_name)]
 
     def enroll_student(self, username, course_name):
+        # Returns False if the student doesn't exist or the course is full
         student = self.get_student_by_username(username)
-        if student and course_name not in student.enrolled_courses:
-            student.add_course(course_name)
-            self.append_enrollment(username, course_name)
+        if not student:
+            return False
+        if self.capacities.get(course_name) is not None:
+            return self._writer.run(self._take_seat, username, course_name)
+        with self._student_lock(username):
+            if course_name not in student.enrolled_courses:
+                student.add_course(course_name)
+                # Queued while still holding the lock so this student's events are written in order
+                self.append_enrollment(username, course_name)
+            return True
+
+    def _take_seat(self, username, course_name):
+        # Enrolls in a course with a limit, on the writer thread. Under the storage's write lock every other
+        # process's enrollments have been applied to the rosters and none can be added until ours is written,
+        # so two processes can't both take the last seat.
+        with self.storage.writing():
+            student = self._find_user(username)
+            with self._student_lock(username):
+                if course_name in student.enrolled_courses:
+                    return True
+                capacity = self.capacities.get(course_name)
+                if capacity is not None and self.rosters.count(course_name) >= capacity:
+                    return False
+                student.add_course(course_name)
+                self.storage.record("E", username, course_name)
+        return True
 
     def drop_student_course(self, username, course_name):
         student = self.get_student_by_username(username)
         if student:
-            student.drop_course(course_name)
-            self.save_enrollments()
+            with self._student_lock(username):
+                student.drop_course(course_name)
+                self._writer.record("D", username, course_name)
 
     def set_student_grade(self, username, course_name, grade):
         student = self.get_student_by_username(username)
-        if student and course_name in student.enrolled_courses:
-            student.set_grade(course_name, grade)
-            self.save_enrollments()
+        if student:
+            with self._student_lock(username):
+                if course_name in student.enrolled_courses:
+                    student.set_grade(course_name, grade)
+                    self._writer.record("G", username, course_name, grade)
+
+    def bulk_enroll(self, rows):
+        # rows: (username, course_name) pairs. Returns (changes applied, errors); nothing is applied on error.
+        # The changes are the (username, course_name, grade) rows that changed something, in file order.
+        return self._apply_batch("E", rows)
+
+    def bulk_drop(self, rows):
+        return self._apply_batch("D", rows)
+
+    def bulk_grade(self, rows):
+        # rows: (username, course_name, grade) triples
+        return self._apply_batch("G", rows)
+
+    def _apply_batch(self, op, rows):
+        # Every row is checked before anything changes; the valid batch is then applied in one pass over the
+        # students and persisted as one record_many write
+        self.refresh()
+        batch, errors = [], []
+        for row_number, row in enumerate(rows, 1):
+            username = row[0].strip() if len(row) > 0 else ""
+            course_name = row[1].strip() if len(row) > 1 else ""
+            grade = row[2].strip().upper() if op == "G" and len(row) > 2 else None
+            if not isinstance(self._find_user(username), Student):
+                errors.append(f"Row {row_number}: {username or '(empty)'} is not a registered student.")
+            elif op == "E" and course_name not in self.search_index:
+                errors.append(f"Row {row_number}: {course_name or '(empty)'} is not in the course catalog.")
+            elif op == "G" and grade not in GRADES:
+                errors.append(f"Row {row_number}: invalid grade '{grade or ''}'.")
+            else:
+                batch.append((row_number, username, course_name, grade))
+        if errors:
+            return [], errors
+        if op == "E":
+            # Seats are counted and taken on the writer thread under the storage's write lock, like _take_seat
+            return self._writer.run(self._enroll_batch, batch)
+        return self._apply_checked(op, batch, self._writer.record_many)
+
+    def _enroll_batch(self, batch):
+        with self.storage.writing():
+            return self._apply_checked("E", batch, self.storage.record_many)
+
+    def _apply_checked(self, op, batch, persist):
+        # Lock every student in the batch (always in the same order, so two batches can't deadlock) so the
+        # checks below still hold when the changes are made
+        locks = [self._student_lock(username) for username in sorted({row[1] for row in batch})]
+        errors = []
+        for lock in locks:
+            lock.acquire()
+        try:
+            seats_taken, seated = {}, set()
+            for row_number, username, course_name, grade in batch:
+                courses = self._find_user(username).enrolled_courses
+                capacity = self.capacities.get(course_name)
+                if (op == "E" and capacity is not None and course_name not in courses
+                        and (username, course_name) not in seated):
+                    seated.add((username, course_name))
+                    seats_taken[course_name] = seats_taken.get(course_name, self.rosters.count(course_name)) + 1
+                    if seats_taken[course_name] > capacity:
+                        errors.append(f"Row {row_number}: {course_name} is full ({capacity} students).")
+                if op != "E" and course_name not in courses:
+                    errors.append(f"Row {row_number}: {username} is not enrolled in {course_name}.")
+                elif op == "D" and courses[course_name] is not None:
+                    errors.append(f"Row {row_number}: {course_name} has already been graded and cannot be dropped.")
+            if errors:
+                return [], errors
+            events = []
+            for row_number, username, course_name, grade in batch:
+                courses = self._find_user(username).enrolled_courses
+                # Rows that change nothing (e.g. repeated ones) are skipped
+                if op == "E":
+                    unchanged = course_name in courses
+                elif op == "D":
+                    unchanged = course_name not in courses
+                else:
+                    unchanged = courses[course_name] == grade
+                if unchanged:
+                    continue
+                self._apply_event(op, username, course_name, grade)
+                events.append((op, username, course_name, grade))
+            persist(events)
+        finally:
+            for lock in locks:
+                lock.release()
+        return [event[1:] for event in events], []
+
+    def export_enrollments(self, file):
+        # Streams every enrollment to `file` as CSV (username,course,grade) and returns the row count
+        self._refresh_if_due()
+        writer = csv.writer(file)
+        writer.writerow(["username", "course", "grade"])
+        count = 0
+        for username, course_name, grade in self.enrollment_rows():
+            writer.writerow([username, course_name, grade or ""])
+            count += 1
+        return count
+
+    def get_plan(self, major):
+        # The major's four-year plan (a plan_registry.DegreePlan), None when there is no plan file for it
+        return self.plans.get(major)
+
+    def plan_progress(self, username):
+        # The student's PlanProgress in their major's plan (remaining plan, retakes, next year), None when
+        # there is no such student or no plan. Built once from the transcript, then kept current by the
+        # student's enroll/drop/grade changes, so reading it costs nothing; built again when the plan changed.
+        student = self.get_student_by_username(username)
+        if student is None:
+            return None
+        plan = self.get_plan(student.major)
+        if plan is None:
+            return None
+        progress = self._progress.get(username)
+        if progress is None or progress.plan is not plan:
+            with self._student_lock(username):
+                progress = self._progress.get(username)
+                if progress is None or progress.plan is not plan:
+                    progress = PlanProgress(plan)
+                    student.attach_progress(progress)
+                    self._progress[username] = progress
+        return progress
 
     def get_student_courses(self, username):
         student = self.get_student_by_username(username)
         return student.enrolled_courses if student else {}
 
     def list_all_students(self):
+        self._refresh_if_due()
         return [student.username for student in self.students]
@@ -1,25 +1,218 @@
+import threading
+from array import array
+from collections.abc import Mapping, ItemsView
+
+GRADES = ["A", "A-", "B+", "B", "B-", "C+", "C", "D", "F"]
+
+
+class InternTable:
+    # Maps each distinct string to a small integer id and back, so it is stored only once.
+    __slots__ = ("names", "ids", "_lock")
+
+    def __init__(self, names=()):
+        self.names = []   # id -> string
+        self.ids = {}     # string -> id
+        self._lock = threading.Lock()
+        for name in names:
+            self.intern(name)
+
+    def intern(self, name):
+        cid = self.ids.get(name)
+        if cid is None:
+            with self._lock:
+                cid = self.ids.get(name)
+                if cid is None:
+                    cid = len(self.names)
+                    self.names.append(name)
+                    self.ids[name] = cid
+        return cid
+
+    def get(self, name):
+        return self.ids.get(name)
+
+    def name(self, cid):
+        return self.names[cid]
+
+
+# Course titles, shared by the catalog and every student's enrollments (CourseManager seeds it from the catalog)
+course_ids = InternTable()
+# Grades are stored as one byte: 0 means "not graded yet", otherwise grade_codes id + 1
+grade_codes = InternTable(GRADES)
+
+
+class EnrolledCourses(Mapping):
+    # Read-only course_name -> grade (None if not yet graded) view over a Student's arrays.
+    # It behaves like the dict Student.enrolled_courses used to be; changes go through the Student methods.
+    __slots__ = ("_student",)
+
+    def __init__(self, student):
+        self._student = student
+
+    def __getitem__(self, course_name):
+        cids, grades = self._student._enrolled
+        i = _position(cids, course_name)
+        if i < 0:
+            raise KeyError(course_name)
+        code = grades[i]
+        return grade_codes.name(code - 1) if code else None
+
+    def __contains__(self, course_name):
+        return _position(self._student._enrolled[0], course_name) >= 0
+
+    def __iter__(self):
+        return (course_ids.name(cid) for cid in self._student._enrolled[0])
+
+    def __len__(self):
+        return len(self._student._enrolled[0])
+
+    def items(self):
+        return _EnrolledItems(self)
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+
+class _EnrolledItems(ItemsView):
+    # Walks both arrays together instead of looking every course up again
+    def __iter__(self):
+        cids, grades = self._mapping._student._enrolled
+        for cid, code in zip(cids, grades):
+            yield course_ids.name(cid), grade_codes.name(code - 1) if code else None
+
+
+class CourseRosters:
+    # Reverse index: course id -> {username: Student} for everyone enrolled, in enrollment order.
+    # Students attached to it keep it current from add_course/drop_course, so a roster or a class size
+    # never needs a walk over every student. Grades are read from the Student, so set_grade needs no update.
+    __slots__ = ("_rosters",)
+
+    def __init__(self):
+        self._rosters = {}
+
+    def add(self, cid, student):
+        roster = self._rosters.get(cid)
+        if roster is None:
+            roster = self._rosters.setdefault(cid, {})
+        roster[student.username] = student
+
+    def remove(self, cid, student):
+        roster = self._rosters.get(cid)
+        if roster is not None:
+            roster.pop(student.username, None)
+
+    def count(self, course_name):
+        cid = course_ids.get(course_name)
+        roster = self._rosters.get(cid) if cid is not None else None
+        return len(roster) if roster else 0
+
+    def students(self, course_name):
+        cid = course_ids.get(course_name)
+        roster = self._rosters.get(cid) if cid is not None else None
+        return list(roster.values()) if roster else []
+
+
+def _position(cids, course_name):
+    cid = course_ids.get(course_name)
+    if cid is None:
+        return -1
+    try:
+        return cids.index(cid)
+    except ValueError:
+        return -1
+
+
+EMPTY = (array("I"), array("B"))
+
+
 class Student:
+    # Enrollments are two parallel arrays: interned course ids and one-byte grade codes. They are kept as one
+    # (course ids, grades) pair that adding or dropping a course replaces as a whole, so readers, who take no
+    # lock, read the pair once and never see one array changed without the other. Only a grade is changed in place.
+    __slots__ = ("username", "password", "major", "_enrolled", "_rosters", "_progress")
+
     def __init__(self, username, password, major=None):
         self.username = username
         self.password = password
         self.major = major
-        self.enrolled_courses = {}  # course_name -> grade (None if not yet graded)
+        self._enrolled = EMPTY
+        self._rosters = None  # the CourseRosters this student is listed in, once attached
+        self._progress = None  # the PlanProgress (plan_progress.py) kept current for this student, once attached
+
+    def attach_rosters(self, rosters):
+        self._rosters = rosters
+        for cid in self._enrolled[0]:
+            rosters.add(cid, self)
+
+    def attach_progress(self, progress):
+        self._progress = progress
+        progress.reset(self.enrolled_courses.items())
+
+    @property
+    def enrolled_courses(self):
+        return EnrolledCourses(self)  # course_name -> grade (None if not yet graded)
+
+    def export_enrollments(self):
+        cids, grades = self._enrolled
+        return cids.tobytes(), grades.tobytes()
+
+    def import_enrollments(self, course_bytes, grade_bytes, course_map=None, grade_map=None):
+        # The maps translate ids saved by another process to this process's intern tables
+        self.clear_courses()
+        cids = array("I")
+        cids.frombytes(course_bytes)
+        grades = array("B")
+        grades.frombytes(grade_bytes)
+        if course_map is not None:
+            cids = array("I", (course_map[cid] for cid in cids))
+        if grade_map is not None:
+            grades = array("B", (grade_map[code - 1] + 1 if code else 0 for code in grades))
+        self._enrolled = (cids, grades)
+        if self._rosters is not None:
+            self.attach_rosters(self._rosters)
+        if self._progress is not None:
+            self._progress.reset(self.enrolled_courses.items())
+
+    def clear_courses(self):
+        if self._rosters is not None:
+            for cid in self._enrolled[0]:
+                self._rosters.remove(cid, self)
+        self._enrolled = EMPTY
+        if self._progress is not None:
+            self._progress.reset()
 
     def add_course(self, course_name):
-        if course_name not in self.enrolled_courses:
-            self.enrolled_courses[course_name] = None
+        cids, grades = self._enrolled
+        if _position(cids, course_name) < 0:
+            cid = course_ids.intern(course_name)
+            self._enrolled = (cids + array("I", (cid,)), grades + array("B", (0,)))
+            if self._rosters is not None:
+                self._rosters.add(cid, self)
+            if self._progress is not None:
+                self._progress.added(course_name)
 
     def drop_course(self, course_name):
-        if course_name in self.enrolled_courses:
-            del self.enrolled_courses[course_name]
+        cids, grades = self._enrolled
+        i = _position(cids, course_name)
+        if i >= 0:
+            if self._rosters is not None:
+                self._rosters.remove(cids[i], self)
+            self._enrolled = (cids[:i] + cids[i + 1:], grades[:i] + grades[i + 1:])
+            if self._progress is not None:
+                self._progress.dropped(course_name)
 
     def set_grade(self, course_name, grade):
-        if course_name in self.enrolled_courses:
-            self.enrolled_courses[course_name] = grade
+        cids, grades = self._enrolled
+        i = _position(cids, course_name)
+        if i >= 0:
+            grades[i] = grade_codes.intern(grade) + 1 if grade is not None else 0
+            if self._progress is not None:
+                self._progress.graded(course_name, grade)
 
 
 class Instructor:
+    __slots__ = ("username", "password")
+
     def __init__(self, username, password):
         # The logic for grading students is written in course_manager, not in data_models.
         self.username = username
-        self.password = password
\ No newline at end of file
+        self.password = password
@@ -0,0 +1,132 @@
+import json
+import os
+import random
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+
+# Where the model runs and which model to use; the environment variables override the defaults.
+# Several comma-separated URLs spread the requests over those servers (llm_router.py).
+URL_ENV_VAR = "SMARTCOURSE_LLM_URL"
+MODEL_ENV_VAR = "SMARTCOURSE_LLM_MODEL"
+DEFAULT_URL = "http://localhost:11434"
+DEFAULT_MODEL = "llama3.1:8b"
+
+CONNECT_TIMEOUT = 5    # seconds to establish a connection
+READ_TIMEOUT = 300     # seconds to wait for the (next part of the) reply
+RETRIES = 2            # extra attempts after a connection failure or a busy/unavailable server (never after
+                       # a read timeout: the server may still be generating, and a retry would start over)
+BACKOFF = 0.5          # seconds before the first retry, doubled for each further one
+POOL_SIZE = 10         # connections kept open per host
+# Seconds Ollama keeps the model - and with it the evaluated prompt prefix it can reuse - loaded after a
+# request (its own default is 5 minutes)
+KEEP_ALIVE = 30 * 60
+RETRY_STATUSES = {429, 502, 503, 504}
+# Timings and token counts Ollama reports with the last part of a reply (durations in nanoseconds)
+STAT_FIELDS = ("total_duration", "load_duration", "prompt_eval_count", "prompt_eval_duration",
+               "eval_count", "eval_duration")
+
+
+class LLMClient:
+    # Talks to an Ollama-compatible /api/generate endpoint over one pooled requests.Session, so repeated
+    # requests reuse open keep-alive connections instead of paying a new TCP handshake each time.
+    # Safe to share between threads.
+    def __init__(self, base_url=None, model=None, connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT,
+                 retries=RETRIES, backoff=BACKOFF, pool_size=POOL_SIZE, keep_alive=KEEP_ALIVE):
+        self.base_url = (base_url or os.environ.get(URL_ENV_VAR) or DEFAULT_URL).rstrip("/")
+        self.model = model or os.environ.get(MODEL_ENV_VAR) or DEFAULT_MODEL
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.keep_alive = keep_alive
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def payload(self, prompt, stream, options=None, model=None):
+        payload = {"model": model or self.model, "prompt": prompt, "stream": stream}
+        if self.keep_alive is not None:
+            payload["keep_alive"] = self.keep_alive
+        if options:
+            payload["options"] = options
+        return payload
+
+    def generate(self, prompt, options=None, model=None, stats=None):
+        # The complete reply text (raw, including any <think> block). A `stats` dict gets the STAT_FIELDS.
+        with self._post(self.payload(prompt, False, options, model), stream=False) as resp:
+            data = resp.json()
+        if stats is not None:
+            stats.update((k, data[k]) for k in STAT_FIELDS if k in data)
+        return data.get("response", "")
+
+    def stream(self, prompt, options=None, model=None, stats=None):
+        # Yields the reply in the pieces the server sends them. Only the request itself is retried:
+        # once text has been handed out, a broken stream raises instead of starting over.
+        # A `stats` dict gets the STAT_FIELDS once the reply is complete.
+        # The body is read to its end even after "done", otherwise the connection can't go back to the pool.
+        with self._post(self.payload(prompt, True, options, model), stream=True) as resp:
+            done = False
+            for line in resp.iter_lines():
+                if not line or done:
+                    continue
+                data = json.loads(line)
+                if data.get("error"):
+                    raise RuntimeError(data["error"])
+                if data.get("response"):
+                    yield data["response"]
+                done = data.get("done", False)
+                if done and stats is not None:
+                    stats.update((k, data[k]) for k in STAT_FIELDS if k in data)
+
+    def preload(self, model=None):
+        # Loads the model (a request without a prompt) and restarts its keep_alive period
+        payload = {"model": model or self.model, "stream": False}
+        if self.keep_alive is not None:
+            payload["keep_alive"] = self.keep_alive
+        with self._post(payload, stream=False) as resp:
+            resp.json()
+
+    def _post(self, payload, stream):
+        url = self.base_url + "/api/generate"
+        for attempt in range(self.retries + 1):
+            last_try = attempt == self.retries
+            try:
+                resp = self.session.post(url, json=payload, stream=stream, timeout=self.timeout)
+            except (requests.ConnectionError, requests.ConnectTimeout):
+                # ReadTimeout is a Timeout but not a ConnectionError, so it is raised at once
+                if last_try:
+                    raise
+            else:
+                if resp.status_code not in RETRY_STATUSES or last_try:
+                    if resp.status_code >= 400:
+                        resp.close()
+                    resp.raise_for_status()
+                    return resp
+                resp.close()
+            # Exponential backoff with a little jitter so clients that failed together don't retry together
+            time.sleep(self.backoff * 2 ** attempt * (1 + random.random() / 2))
+
+    def close(self):
+        self.session.close()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    # The client shared by the CLI and the GUI, created on first use: an LLMRouter when the URL
+    # setting lists several servers
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                urls = [url.strip() for url in os.environ.get(URL_ENV_VAR, "").split(",") if url.strip()]
+                if len(urls) > 1:
+                    from llm_router import LLMRouter  # imports this module
+                    _client = LLMRouter(urls)
+                else:
+                    _client = LLMClient()
+    return _client
@@ -0,0 +1,315 @@
+import os
+import queue
+import threading
+import time
+from collections import deque
+import requests
+from llm_client import LLMClient, CONNECT_TIMEOUT
+
+# Spreads the AI requests over several Ollama instances, e.g.
+# SMARTCOURSE_LLM_URL="http://gpu1:11434,http://gpu2:11434". Each request goes to the reachable instance
+# with the fewest requests in progress; an instance that fails keeps getting skipped for a while instead
+# of making every student wait for its timeout, and a reply that is slow to start is also asked of a
+# second instance, taking whichever starts first.
+HEDGE_ENV_VAR = "SMARTCOURSE_LLM_HEDGE"   # "off": never send a second copy of a request
+HEALTH_INTERVAL = 10         # seconds between health checks of each instance
+HEALTH_TIMEOUT = 2           # seconds for a health check answer
+FAILURE_THRESHOLD = 3        # failed requests in a row that open an instance's circuit
+OPEN_TIME = 30               # seconds an open circuit stays open before one trial request is let through
+HEDGE_MIN_SAMPLES = 20       # replies timed before hedging starts, so the p95 means something
+TTFT_SAMPLES = 200           # times to first text kept for the p95
+
+
+class NoEndpointAvailable(requests.ConnectionError):
+    # Every instance is failing its health checks or has an open circuit
+    pass
+
+
+class Endpoint:
+    """
+    One Ollama instance and what the router knows about it. The circuit is
+      "closed"     requests go through
+      "open"       FAILURE_THRESHOLD requests in a row failed: skipped for OPEN_TIME seconds
+      "half-open"  one trial request goes through; it closes the circuit again or reopens it
+    and `healthy` is the result of the last health check. The router changes both under its lock.
+    """
+    def __init__(self, client):
+        self.client = client
+        self.url = client.base_url
+        self.outstanding = 0
+        self.healthy = True
+        self.circuit = "closed"
+        self.failures = 0             # failed requests in a row
+        self.opened = 0.0
+        self.trial = False            # the half-open trial request is in progress
+        self.requests = 0
+        self.errors = 0
+        self.ttfts = deque(maxlen=TTFT_SAMPLES)
+
+    def available(self, now, open_time):
+        if self.circuit == "open" and now - self.opened >= open_time:
+            self.circuit = "half-open"
+        if not self.healthy:
+            return False
+        return self.circuit == "closed" or (self.circuit == "half-open" and not self.trial)
+
+
+class Attempt:
+    # One copy of a request, sent to one endpoint from a thread of its own. Its pieces and then
+    # ("done", stats) or ("error", exception) go to the request's queue, tagged with the attempt.
+    def __init__(self, router, endpoint, events, prompt, options, model):
+        self.router = router
+        self.endpoint = endpoint
+        self.events = events
+        self.args = (prompt, options, model)
+        self.started = time.monotonic()
+        self.stop = threading.Event()
+        threading.Thread(target=self._run, name="llm-attempt", daemon=True).start()
+
+    def _run(self):
+        # A stopped attempt ends at its next piece: closing the stream drops the connection, which makes
+        # Ollama stop generating. One still waiting for the start of its reply only notices then.
+        stats = {}
+        answered = False
+        try:
+            pieces = self.endpoint.client.stream(*self.args, stats=stats)
+            try:
+                for piece in pieces:
+                    if not answered:
+                        answered = True
+                        self.router._first_text(self.endpoint, time.monotonic() - self.started)
+                    if self.stop.is_set():
+                        break
+                    self.events.put((self, "text", piece))
+            finally:
+                pieces.close()
+        except Exception as e:
+            self.router._release(self.endpoint, False)
+            self.events.put((self, "error", e))
+        else:
+            # A copy stopped before its reply started says nothing about the endpoint
+            self.router._release(self.endpoint, True if answered or not self.stop.is_set() else None)
+            self.events.put((self, "done", stats))
+
+
+class LLMRouter:
+    """
+    An LLMClient for a pool of Ollama instances: generate(), stream(), preload(), `model` and `keep_alive`
+    work the same, so get_client() hands out a router when SMARTCOURSE_LLM_URL lists several URLs.
+
+    - A request goes to the available endpoint with the fewest requests in progress.
+    - A background thread asks every endpoint for /api/version at once, now and every HEALTH_INTERVAL
+      seconds; one that doesn't answer gets no requests until it does again.
+    - Each endpoint has a circuit breaker (see Endpoint).
+    - A request that fails before any text came back is sent to the next endpoint. Once text has been
+      handed out, an error is raised as with LLMClient.
+    - Hedging: when no text has come back after `hedge_after` seconds - by default the p95 time to
+      first text of the last replies - a copy goes to a second endpoint, and the first to answer wins.
+
+    The endpoints' clients don't retry themselves: trying another instance is faster than waiting for
+    the same one.
+    """
+    def __init__(self, urls, model=None, clients=None, hedge=None, hedge_after=None,
+                 health_interval=HEALTH_INTERVAL, failure_threshold=FAILURE_THRESHOLD, open_time=OPEN_TIME,
+                 **client_options):
+        client_options.setdefault("retries", 0)
+        clients = clients or [LLMClient(base_url=url, model=model, **client_options) for url in urls]
+        self.endpoints = [Endpoint(client) for client in clients]
+        self.model = clients[0].model
+        self.keep_alive = clients[0].keep_alive
+        if hedge is None:
+            hedge = os.environ.get(HEDGE_ENV_VAR, "").lower() != "off"
+        self.hedge = hedge
+        self.hedge_after = hedge_after
+        self.failure_threshold = failure_threshold
+        self.open_time = open_time
+        self.hedges = 0               # copies sent because a reply was slow to start
+        self.hedge_wins = 0           # of which answered first
+        self.failovers = 0            # requests sent on after an endpoint failed
+        self._ttfts = deque(maxlen=TTFT_SAMPLES)
+        self._next = 0                # breaks ties between equally busy endpoints round-robin
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self.health_interval = health_interval
+        if health_interval:
+            threading.Thread(target=self._check_health, name="llm-health", daemon=True).start()
+
+    @property
+    def base_url(self):
+        return ",".join(endpoint.url for endpoint in self.endpoints)
+
+    def generate(self, prompt, options=None, model=None, stats=None):
+        # Streams underneath, so that hedging and failover can go by the start of the reply
+        return "".join(self.stream(prompt, options, model, stats))
+
+    def stream(self, prompt, options=None, model=None, stats=None):
+        events = queue.Queue()
+        attempts = []
+        ended = 0                     # attempts whose last event was taken from the queue
+        tried = set()
+        winner = None
+        hedged = not self.hedge       # hedged once already (or not at all)
+        hedge = None                  # the copy sent by hedging
+
+        def send():
+            endpoint = self._acquire(tried)
+            if endpoint is None:
+                return None
+            tried.add(endpoint)
+            attempt = Attempt(self, endpoint, events, prompt, options, model)
+            attempts.append(attempt)
+            return attempt
+
+        if send() is None:
+            raise NoEndpointAvailable("No AI server is available right now.")
+        try:
+            while True:
+                timeout = None
+                if winner is None and not hedged:
+                    delay = self.hedge_delay()
+                    if delay is not None:
+                        timeout = max(0.0, attempts[-1].started + delay - time.monotonic())
+                try:
+                    attempt, kind, value = events.get(timeout=timeout)
+                except queue.Empty:
+                    hedged = True
+                    hedge = send()
+                    if hedge is not None:
+                        self.hedges += 1
+                    continue
+                if winner is not None and attempt is not winner:
+                    continue
+                if kind == "error":
+                    ended += 1
+                    if winner is not None:
+                        raise value
+                    if ended < len(attempts):
+                        continue  # the other copy may still answer
+                    if send() is None:
+                        raise value
+                    self.failovers += 1
+                    continue
+                if winner is None:
+                    winner = attempt
+                    if attempt is hedge:
+                        self.hedge_wins += 1
+                    for other in attempts:
+                        if other is not winner:
+                            other.stop.set()
+                if kind == "text":
+                    yield value
+                else:
+                    if stats is not None:
+                        stats.update(value)
+                    return
+        finally:
+            for attempt in attempts:
+                attempt.stop.set()
+
+    def preload(self, model=None):
+        # Loads the model on every reachable endpoint at once; fails only when none of them could
+        errors = []
+
+        def load(endpoint):
+            try:
+                endpoint.client.preload(model)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=load, args=(endpoint,), daemon=True)
+                   for endpoint in self.endpoints if endpoint.healthy]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if not threads:
+            raise NoEndpointAvailable("No AI server is available right now.")
+        if len(errors) == len(threads):
+            raise errors[0]
+
+    def hedge_delay(self):
+        # Seconds without text after which a request is hedged, None while there are too few replies timed
+        if self.hedge_after is not None:
+            return self.hedge_after
+        ttfts = sorted(self._ttfts)
+        if len(ttfts) < HEDGE_MIN_SAMPLES:
+            return None
+        return ttfts[min(len(ttfts) - 1, len(ttfts) * 95 // 100)]
+
+    def stats(self):
+        with self._lock:
+            endpoints = [{"url": e.url, "healthy": e.healthy, "circuit": e.circuit, "outstanding": e.outstanding,
+                          "requests": e.requests, "errors": e.errors,
+                          "ttft_p50": sorted(e.ttfts)[len(e.ttfts) // 2] if e.ttfts else None}
+                         for e in self.endpoints]
+        return {"endpoints": endpoints, "hedge_after": self.hedge_delay(), "hedges": self.hedges,
+                "hedge_wins": self.hedge_wins, "failovers": self.failovers}
+
+    def close(self):
+        self._closed.set()
+        for endpoint in self.endpoints:
+            endpoint.client.close()
+
+    # ----- endpoint bookkeeping -----
+
+    def _acquire(self, exclude=()):
+        # The least busy available endpoint not in `exclude`, counted as busy with one more request
+        now = time.monotonic()
+        with self._lock:
+            n = len(self.endpoints)
+            order = [self.endpoints[(self._next + i) % n] for i in range(n)]
+            candidates = [e for e in order if e not in exclude and e.available(now, self.open_time)]
+            if not candidates:
+                return None
+            endpoint = min(candidates, key=lambda e: e.outstanding)
+            self._next = (self.endpoints.index(endpoint) + 1) % n
+            endpoint.outstanding += 1
+            endpoint.requests += 1
+            if endpoint.circuit == "half-open":
+                endpoint.trial = True
+            return endpoint
+
+    def _release(self, endpoint, ok):
+        # ok True / False: the request succeeded / failed; None: it was stopped before it could tell
+        with self._lock:
+            endpoint.outstanding -= 1
+            if endpoint.circuit == "half-open" and endpoint.trial:
+                endpoint.trial = False
+                if ok is False:
+                    endpoint.circuit, endpoint.opened = "open", time.monotonic()
+            if ok is True:
+                endpoint.failures = 0
+                endpoint.circuit = "closed"
+            elif ok is False:
+                endpoint.errors += 1
+                endpoint.failures += 1
+                if endpoint.failures >= self.failure_threshold and endpoint.circuit == "closed":
+                    endpoint.circuit, endpoint.opened = "open", time.monotonic()
+
+    def _first_text(self, endpoint, ttft):
+        with self._lock:
+            endpoint.ttfts.append(ttft)
+            self._ttfts.append(ttft)
+
+    def _check_health(self):
+        # Every endpoint is checked in a thread of its own, like preload(), so one that doesn't answer
+        # doesn't hold up the others' results by up to HEALTH_TIMEOUT each
+        while True:
+            threads = [threading.Thread(target=self._check_endpoint, args=(endpoint,), daemon=True)
+                       for endpoint in self.endpoints]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            if self._closed.wait(self.health_interval):
+                return
+
+    def _check_endpoint(self, endpoint):
+        try:
+            resp = endpoint.client.session.get(endpoint.url + "/api/version", timeout=(CONNECT_TIMEOUT, HEALTH_TIMEOUT))
+            resp.close()
+            healthy = resp.status_code == 200
+        except requests.RequestException:
+            healthy = False
+        with self._lock:
+            endpoint.healthy = healthy
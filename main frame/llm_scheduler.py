@@ -0,0 +1,319 @@
+import asyncio
+import json
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from llm_client import get_client
+
+# Admission control in front of the model: at most MAX_CONCURRENT generations run at once, the rest wait
+# in one queue per user and are started round-robin across users, so one student asking ten questions
+# doesn't hold everybody else up. Past MAX_QUEUED waiting requests new ones are turned away.
+MAX_CONCURRENT = 2           # generations sent to each model server at once (Ollama's OLLAMA_NUM_PARALLEL)
+MAX_QUEUED = 32              # waiting requests, over all users
+MAX_QUEUED_PER_USER = 2
+SERVICE_TIME = 30.0          # seconds one generation is assumed to take until some have finished
+SERVICE_TIME_WEIGHT = 0.2    # weight of the latest generation in the running average
+LATENCY_SAMPLES = 1000       # finished requests kept for stats()
+
+
+class SchedulerBusy(Exception):
+    # Raised by submit() when the queue (or the user's share of it) is full
+    pass
+
+
+class Ticket:
+    """
+    One request handed to the scheduler. events() (or aevents() from async code) yields
+      ("queued", position, eta)  while waiting - position 1 starts next, eta in seconds
+      ("started",)               when the generation is sent to the model
+      ("text", piece)            for every piece of the reply
+    and ends when the reply is complete; a model error is raised. cancel() withdraws the
+    request or stops its generation, from any thread.
+
+    Identical requests (same model, prompt and options) made while one is queued or running share
+    its generation (`shared` is set on the later ones): they get the text produced so far at once
+    and the rest as it comes. The generation is only stopped when every ticket on it is cancelled.
+    """
+    def __init__(self, scheduler, generation, shared):
+        self.scheduler = scheduler
+        self.generation = generation
+        self.shared = shared
+        self.submitted = time.time()
+        self.cancelled = False
+        self._events = asyncio.Queue()   # on the scheduler's loop
+
+    @property
+    def state(self):
+        # queued -> running -> done / failed / cancelled
+        return "cancelled" if self.cancelled else self.generation.state
+
+    @property
+    def position(self):
+        return self.generation.position
+
+    @property
+    def eta(self):
+        return self.generation.eta
+
+    def events(self):
+        loop = self.scheduler.loop
+        try:
+            while True:
+                event = asyncio.run_coroutine_threadsafe(self._events.get(), loop).result()
+                if event is None:
+                    return
+                if isinstance(event, BaseException):
+                    raise event
+                yield event
+        finally:
+            self.cancel()  # no-op once finished; stops the generation if the reader went away
+
+    async def aevents(self):
+        loop = self.scheduler.loop
+        try:
+            while True:
+                event = await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(self._events.get(), loop))
+                if event is None:
+                    return
+                if isinstance(event, BaseException):
+                    raise event
+                yield event
+        finally:
+            self.cancel()
+
+    def cancel(self):
+        if self.state in ("queued", "running"):
+            self.scheduler.loop.call_soon_threadsafe(self.scheduler._cancel, self)
+
+
+class Generation:
+    # One request to the model and the tickets waiting for it
+    def __init__(self, key, user, prompt, options, model):
+        self.key = key
+        self.user = user
+        self.prompt = prompt
+        self.options = options
+        self.model = model
+        self.state = "queued"
+        self.position = None
+        self.eta = None
+        self.started = None
+        self.first_text = None
+        self.pieces = []             # the reply so far, replayed to tickets that join late
+        self.tickets = []
+        self.stop = threading.Event()
+
+
+class LLMScheduler:
+    # Runs its own asyncio loop in a background thread; submit() and Ticket can be used from any thread.
+    # Generations themselves run in a small thread pool, since the HTTP client is blocking.
+    def __init__(self, client=None, max_concurrent=MAX_CONCURRENT, max_queued=MAX_QUEUED,
+                 max_queued_per_user=MAX_QUEUED_PER_USER, service_time=SERVICE_TIME):
+        self.client = client
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.max_queued_per_user = max_queued_per_user
+        self.service_time = service_time
+        self._queues = OrderedDict()   # user -> deque of waiting generations; the first user is served next
+        self._inflight = {}            # (model, prompt, options) -> queued or running Generation
+        self._queued = 0
+        self._running = 0
+        self._executor = ThreadPoolExecutor(max_concurrent, thread_name_prefix="llm")
+        self.model_calls = 0           # generations started
+        self.coalesced = 0             # requests that shared another's generation: model calls saved
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.rejected = 0
+        self._latencies = deque(maxlen=LATENCY_SAMPLES)  # (queue wait, time to first text, total) per ticket
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, name="llm-scheduler", daemon=True).start()
+
+    def submit(self, user, prompt, options=None, model=None):
+        # A Ticket for the request, or SchedulerBusy when it can't be queued
+        return asyncio.run_coroutine_threadsafe(self._submit(user, prompt, options, model), self.loop).result()
+
+    def stats(self):
+        # Counters and latency percentiles (seconds) of the last LATENCY_SAMPLES finished requests
+        def percentiles(values):
+            values = sorted(values)
+            if not values:
+                return None, None
+            return values[len(values) // 2], values[min(len(values) - 1, len(values) * 95 // 100)]
+
+        samples = list(self._latencies)
+        stats = {"running": self._running, "queued": self._queued, "model_calls": self.model_calls,
+                 "coalesced": self.coalesced, "completed": self.completed, "failed": self.failed,
+                 "cancelled": self.cancelled, "rejected": self.rejected, "service_time": self.service_time}
+        for i, name in enumerate(("wait", "ttft", "latency")):
+            stats[f"{name}_p50"], stats[f"{name}_p95"] = percentiles([s[i] for s in samples])
+        return stats
+
+    def close(self):
+        def stop():
+            for queue in self._queues.values():
+                for generation in queue:
+                    generation.state = "cancelled"
+                    self._emit(generation, None)
+            self._queues.clear()
+            self.loop.stop()
+        self.loop.call_soon_threadsafe(stop)
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    # ----- on the scheduler's loop -----
+
+    async def _submit(self, user, prompt, options, model):
+        key = (model, prompt, json.dumps(options, sort_keys=True))
+        generation = self._inflight.get(key)
+        if generation is not None:
+            ticket = Ticket(self, generation, True)
+            self.coalesced += 1
+            generation.tickets.append(ticket)
+            # Catch up with what the others already got
+            if generation.state == "queued":
+                ticket._events.put_nowait(("queued", generation.position, generation.eta))
+            else:
+                ticket._events.put_nowait(("started",))
+                for piece in generation.pieces:
+                    ticket._events.put_nowait(("text", piece))
+            return ticket
+        queue = self._queues.get(user)
+        if self._queued >= self.max_queued or (queue and len(queue) >= self.max_queued_per_user):
+            self.rejected += 1
+            raise SchedulerBusy("Too many questions are waiting for the AI advisor right now.")
+        generation = Generation(key, user, prompt, options, model)
+        ticket = Ticket(self, generation, False)
+        generation.tickets.append(ticket)
+        self._inflight[key] = generation
+        if queue is None:
+            queue = self._queues[user] = deque()
+        queue.append(generation)
+        self._queued += 1
+        self._dispatch()
+        return ticket
+
+    def _emit(self, generation, event):
+        for ticket in generation.tickets:
+            ticket._events.put_nowait(event)
+
+    def _dispatch(self):
+        while self._running < self.max_concurrent and self._queues:
+            user, queue = next(iter(self._queues.items()))
+            generation = queue.popleft()
+            if queue:
+                self._queues.move_to_end(user)  # round-robin: this user's next request waits for the others
+            else:
+                del self._queues[user]
+            self._queued -= 1
+            self._running += 1
+            self.model_calls += 1
+            generation.state = "running"
+            generation.started = time.time()
+            self._emit(generation, ("started",))
+            self.loop.create_task(self._run(generation))
+        self._publish_positions()
+
+    def _publish_positions(self):
+        # Round-robin order: the k-th (from 0) waiting request of a user starts after k of its own, up to
+        # k + 1 of every user ahead of it in the rotation and up to k of every user behind it
+        users = list(self._queues.values())
+        for j, queue in enumerate(users):
+            for k, generation in enumerate(queue):
+                ahead = k + sum(min(len(other), k + 1) for other in users[:j]) + \
+                    sum(min(len(other), k) for other in users[j + 1:])
+                position = ahead + 1
+                if position != generation.position:
+                    generation.position = position
+                    # Everyone ahead has to start, max_concurrent at a time; the running ones are half done on average
+                    generation.eta = (ahead // self.max_concurrent + 0.5) * self.service_time
+                    self._emit(generation, ("queued", position, generation.eta))
+
+    async def _run(self, generation):
+        try:
+            await self.loop.run_in_executor(self._executor, self._generate, generation)
+        except Exception as e:
+            generation.state = "failed"
+            self.failed += 1
+            self._finish(generation, e)
+        else:
+            if generation.stop.is_set():
+                generation.state = "cancelled"
+                self.cancelled += 1
+            else:
+                generation.state = "done"
+                self.completed += 1
+                now = time.time()
+                self.service_time += SERVICE_TIME_WEIGHT * (now - generation.started - self.service_time)
+                for ticket in generation.tickets:
+                    self._latencies.append((max(0.0, generation.started - ticket.submitted),
+                                            max(0.0, (generation.first_text or now) - ticket.submitted),
+                                            now - ticket.submitted))
+            self._finish(generation, None)
+        finally:
+            self._running -= 1
+            self._dispatch()
+
+    def _finish(self, generation, event):
+        if self._inflight.get(generation.key) is generation:
+            del self._inflight[generation.key]
+        self._emit(generation, event)
+        generation.tickets = []
+
+    def _generate(self, generation):
+        # In a worker thread. Closing the stream early drops the connection, which stops the generation.
+        client = self.client or get_client()
+        pieces = client.stream(generation.prompt, generation.options, generation.model)
+        try:
+            for piece in pieces:
+                if generation.stop.is_set():
+                    return
+                if generation.first_text is None:
+                    generation.first_text = time.time()
+                self.loop.call_soon_threadsafe(self._add_piece, generation, piece)
+        finally:
+            pieces.close()
+
+    def _add_piece(self, generation, piece):
+        generation.pieces.append(piece)
+        self._emit(generation, ("text", piece))
+
+    def _cancel(self, ticket):
+        generation = ticket.generation
+        if ticket.cancelled or ticket not in generation.tickets:
+            return
+        ticket.cancelled = True
+        generation.tickets.remove(ticket)
+        ticket._events.put_nowait(None)
+        if generation.tickets:
+            return  # others are still waiting for this reply
+        if generation.state == "queued":
+            queue = self._queues.get(generation.user)
+            if queue and generation in queue:
+                queue.remove(generation)
+                if not queue:
+                    del self._queues[generation.user]
+                self._queued -= 1
+            generation.state = "cancelled"
+            self.cancelled += 1
+            del self._inflight[generation.key]
+            self._publish_positions()
+        elif generation.state == "running":
+            generation.stop.set()
+            del self._inflight[generation.key]  # a new identical request must not join a stopping generation
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    # The scheduler shared by every session of this process, created on first use; with several
+    # model servers (an LLMRouter) it runs MAX_CONCURRENT generations per server
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                servers = len(getattr(get_client(), "endpoints", ())) or 1
+                _scheduler = LLMScheduler(max_concurrent=MAX_CONCURRENT * servers)
+    return _scheduler
@@ -1,11 +1,46 @@
+import atexit
 from course_manager import CourseManager
-from utils import write_log, send_enrollment_email, send_grade_email, ask_ai_question
-from data_models import Student, Instructor
-import textwrap
+from utils import (write_log, send_enrollment_email, send_grade_email, send_grade_emails, read_enrollment_csv,
+                   grade_email_messages, stream_ai_question, ai_cache_stats, answer_from_plan)
+from response_cache import context_key
+from prompt_builder import build_advice_prompt
+from model_manager import get_model_manager
 
 SECURITY_PASSWORD = "smartcourse12345"
 
 
+def print_stream(chunks, width=80):
+    # Prints streamed text as it arrives, wrapped at `width` columns like textwrap.fill.
+    # Words are printed whole, so a word split across two chunks appears when it is complete.
+    column = 0
+    word = ""
+
+    def emit(word, column):
+        if column and column + 1 + len(word) > width:
+            print()
+            column = 0
+        if column:
+            print(" ", end="")
+            column += 1
+        print(word, end="", flush=True)
+        return column + len(word)
+
+    for chunk in chunks:
+        for ch in chunk:
+            if ch in " \n":
+                if word:
+                    column = emit(word, column)
+                    word = ""
+                if ch == "\n":
+                    print()
+                    column = 0
+            else:
+                word += ch
+    if word:
+        emit(word, column)
+    print()
+
+
 def display_student_menu(manager, username):
     while True:
         print("\nStudent Menu:\n1. Enroll in Course\n2. View My Courses\n3. Drop Course\n4. Ask AI for Advice\n5. Exit")
@@ -20,14 +55,18 @@ def display_student_menu(manager, username):
                 continue
             print("Matched courses:")
             for c in matched:
-                print("  ", c)
+                capacity = manager.course_capacity(c)
+                # Show how full the course is when it has a class-size limit
+                print("  ", c, f"({manager.course_count(c)}/{capacity} enrolled)" if capacity is not None else "")
             course_to_enroll = input("Enter course to enroll: ").strip()
-            if course_to_enroll in manager.courses:
+            if manager.has_course(course_to_enroll):
                 enrolled = manager.get_student_courses(username)
                 if course_to_enroll in enrolled:
                     print("You are already enrolled in this course.")
                     continue
-                manager.enroll_student(username, course_to_enroll)
+                if not manager.enroll_student(username, course_to_enroll):
+                    print("Sorry, this course is full.")
+                    continue
                 write_log(f"{username} enrolled in {course_to_enroll}")
                 send_enrollment_email(
                     username,
@@ -76,32 +115,46 @@ def display_student_menu(manager, username):
             course_info = "\n".join([f"{c} - {g if g else 'Not assigned'}" for c, g in student_courses.items()])
 
             student = manager.get_student_by_username(username)
-            plan_text = ""
-            if student and student.major:
-                try:
-                    with open(f"{student.major}_plan.txt", "r", encoding="utf-8") as f:
-                        plan_text = f.read()
-                except FileNotFoundError:
-                    print(f"No major plan found for {student.major}.")
-
-            full_prompt = (
-                f'I am a student asking the following academic question:\n"{question}"\n\n'
-                f"My current course history:\n{course_info}\n\n"
-                f"Here is the four-year plan for my major:\n{plan_text}\n\n"
-                "Based on my question, my course history, and the plan above, give me a suggestion."
-            )
+            # Where the student stands in the plan is kept current by the manager; no file to read here
+            progress = manager.plan_progress(username)
+            plan_text = progress.plan.text if progress else None
+            if progress is None and student and student.major:
+                print(f"No major plan found for {student.major}.")
 
-            reply, latency = ask_ai_question(full_prompt)   # ← unpacking tuple
-            print(f"\n[AI ADVICE]  (⏱ {latency:.1f}s)")
-            for para in reply.strip().split("\n"):
-                if para.strip():
-                    print(textwrap.fill(para.strip(), width=80))
-                else:
-                    print()
+            # Common questions (what next, what is left, what to retake) are answered from the plan right away
+            fast = answer_from_plan(question, student_courses, plan_text, progress)
+            if fast is not None:
+                reply, latency = fast
+                print("\n[AI ADVICE]")
+                print_stream([reply])
+                print(f"(⚡ answered from your plan and transcript in {latency * 1000:.1f} ms)")
+                continue
+
+            # Only the part of the plan still to do and a summary of the transcript, within the token budget
+            full_prompt = build_advice_prompt(question, student_courses, plan_text, progress=progress)
+
+            model = get_model_manager()
+            model.user_active(username)
+            # Print the advice as the model writes it instead of waiting for the whole reply
+            print("\n[AI ADVICE]")
+            if not model.ready:
+                print("(⏳ the AI model is warming up, the first answer takes a little longer)")
+            # Cached replies are dropped once the transcript or the plan changes
+            stream = stream_ai_question(full_prompt, username, context_key(course_info, plan_text or ""), question)
+            print_stream(stream)
+            if stream.cached:
+                stats = ai_cache_stats()
+                if stream.similar_to:
+                    print(f'(⚡ answer to your similar question "{stream.similar_to}")')
+                print(f"(⚡ cached answer - cache hits {stats['hits'] + stats['similar_hits']}, misses {stats['misses']})")
+            elif not stream.busy:
+                print(f"(⏱ first words after {stream.ttft:.1f}s, complete after {stream.latency:.1f}s"
+                      + (", including loading the model)" if stream.cold else ")"))
 
         # 5. Exit
         elif choice == "5":
-            manager.save_enrollments()
+            get_model_manager().user_left(username)
+            manager.close()  # Changes are saved as they happen; this waits for queued writes to finish
             print("Goodbye!")
             break
         else:
@@ -110,7 +163,8 @@ def display_student_menu(manager, username):
 
 def display_instructor_menu(manager):
     while True:
-        print("\nInstructor Menu:\n1. View Student Courses\n2. Assign Grade\n3. Exit")
+        print("\nInstructor Menu:\n1. View Student Courses\n2. Assign Grade\n3. View Course Roster"
+              "\n4. Import from CSV (enroll/drop/grade)\n5. Export Enrollments to CSV\n6. Exit")
         choice = input("Your choice: ")
         if choice == "1":
             print("Registered Students:")
@@ -124,6 +178,9 @@ def display_instructor_menu(manager):
                 print(f"Courses enrolled by {selected_student}:")
                 for course_name, grade in student_courses.items():
                     print(f"{course_name} - Grade: {grade if grade else 'Not assigned'}")
+                progress = manager.plan_progress(selected_student)
+                if progress:
+                    print(f"Plan progress: {progress.summary()}")
             else:
                 print("No courses found for this student.")
 
@@ -159,7 +216,78 @@ def display_instructor_menu(manager):
             print(f"Grade {grade} assigned to {selected_student} for {course_name}.")
 
         elif choice == "3":
-            manager.save_enrollments() # Make sure to save the grading changes before exiting
+            keyword = input("Search course keyword: ")
+            matched = manager.search_courses(keyword, limit=20)
+            if not matched:
+                print("No matching courses found.")
+                continue
+            for c in matched:
+                print("  ", c)
+            course_name = input("Enter course name: ").strip()
+            if not manager.has_course(course_name):
+                print("Invalid course.")
+                continue
+            roster = manager.get_course_roster(course_name)
+            capacity = manager.course_capacity(course_name)
+            print(f"{course_name}: {len(roster)} enrolled" + (f" of {capacity}" if capacity is not None else ""))
+            for student_name, grade in roster:
+                print(f"  {student_name} - Grade: {grade if grade else 'Not assigned'}")
+            new_capacity = input("New class-size limit (number, 'none' to remove, empty to keep): ").strip().lower()
+            if new_capacity == "none":
+                manager.set_course_capacity(course_name, None)
+                write_log(f"Removed the class-size limit of {course_name}")
+                print("Limit removed.")
+            elif new_capacity.isdigit():
+                manager.set_course_capacity(course_name, int(new_capacity))
+                write_log(f"Set the class-size limit of {course_name} to {new_capacity}")
+                print(f"Limit set to {new_capacity}.")
+            elif new_capacity:
+                print("Invalid limit.")
+
+        elif choice == "4":
+            action = input("Import action (enroll/drop/grade): ").strip().lower()
+            if action not in ["enroll", "drop", "grade"]:
+                print("Invalid action. Please enter 'enroll', 'drop', or 'grade'.")
+                continue
+            path = input("CSV file (username,course[,grade] per line): ").strip()
+            try:
+                with open(path, "r", encoding="utf-8", newline="") as f:
+                    rows = list(read_enrollment_csv(f))
+            except OSError as e:
+                print(f"Could not read {path}: {e}")
+                continue
+            bulk = {"enroll": manager.bulk_enroll, "drop": manager.bulk_drop, "grade": manager.bulk_grade}[action]
+            # The whole file is checked first; if any row is invalid nothing is imported
+            applied, errors = bulk(rows)
+            if errors:
+                print(f"Nothing was imported; {len(errors)} invalid row(s):")
+                for error in errors[:20]:
+                    print("  ", error)
+                if len(errors) > 20:
+                    print(f"   ... and {len(errors) - 20} more")
+                continue
+            write_log(f"Bulk {action} from {path}: {len(applied)} change(s)")
+            if action == "grade" and applied:
+                # One email per student rather than one per grade, for the grades that actually changed
+                try:
+                    send_grade_emails(grade_email_messages(applied))
+                except Exception as e:
+                    print(f"[Warning] Failed to send grade emails: {e}")
+            print(f"Imported {len(rows)} row(s): {len(applied)} change(s) applied.")
+
+        elif choice == "5":
+            path = input("Export to CSV file: ").strip()
+            try:
+                with open(path, "w", encoding="utf-8", newline="") as f:
+                    count = manager.export_enrollments(f)
+            except OSError as e:
+                print(f"Could not write {path}: {e}")
+                continue
+            write_log(f"Exported {count} enrollments to {path}")
+            print(f"Exported {count} enrollment(s) to {path}.")
+
+        elif choice == "6":
+            manager.close() # Grading changes are saved as they happen; wait for queued writes before exiting
             print("Goodbye!")
             break
         else:
@@ -168,7 +296,9 @@ def display_instructor_menu(manager):
 
 def main():
     print("Welcome to SmartCourse!")
+    get_model_manager().start()  # load the model in the background while the user logs in
     manager = CourseManager()
+    atexit.register(manager.close)  # writes still queued are saved however the CLI ends (Exit, EOF, Ctrl+C)
     while True:
         print("Main Menu:\n1. Login\n2. Register for new account\n3. Exit")
         main_choice = input("Select an option (1/2/3): ").strip()
@@ -185,6 +315,7 @@ def main():
                 print(f"Welcome, {username}!")
                 # Display the appropriate menu based on the user's role
                 if is_student:
+                    get_model_manager().user_active(username)  # keep the model loaded while logged in
                     display_student_menu(manager, username)
                 else:
                     display_instructor_menu(manager)
@@ -210,22 +341,18 @@ def main():
                     continue
             is_student = role == "student" # Set this boolean variable to determine if the account is for a student or instructor
             # Check if the username already exists in either students or instructors
-            if manager.get_student_by_username(username) or any(
-                    instructor.username == username for instructor in manager.instructors):
+            if manager.user_exists(username):
                 print("Username already exists. Please choose a different username.")
                 continue
+            major = None
             if is_student:
                 major = input("Enter your major (cps, acct, math): ").strip().lower()
                 if major not in ["cps", "acct", "math"]:
                     print("Sorry, currently this system only support cps, acct and math. Please enter 'cps', 'acct', or 'math'.")
                     continue
-                # Append student's username, password and major to the account.txt file if the account is for a student
-                manager.students.append(Student(username, password, major))
-            else:
-                # Append instructor's username and password to the instructors list if the account is for an instructor
-                manager.instructors.append(Instructor(username, password))
 
-            manager.create_account(username, password, is_student)
+            # Register the user in the manager (and its username index) and append it to account.txt
+            manager.create_account(username, password, is_student, major)
             write_log(f"Created new account: {username}")
             print("Account created. Please log in.")
         elif main_choice == "3":
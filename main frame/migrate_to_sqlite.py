@@ -0,0 +1,54 @@
+"""
+Import the text data files (account.txt, course_list.txt, enrolled_courses.txt and
+its journal, course_capacity.txt) into a SQLite database for the SQLite storage backend.
+
+Usage:  python migrate_to_sqlite.py [data_dir] [database]
+        (defaults: the current directory and smartcourse.db)
+
+Afterwards run the apps with SMARTCOURSE_DB=<database> to use it.
+"""
+
+import sys
+from storage import TextFileStorage, SQLiteStorage
+from course_manager import CourseManager
+
+BATCH_SIZE = 10000
+
+
+def batches(rows, size=BATCH_SIZE):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def migrate(data_dir, db_path):
+    # Replaying the journal through CourseManager gives the current state of every enrollment
+    manager = CourseManager(TextFileStorage(data_dir))
+    target = SQLiteStorage(db_path)
+
+    target.add_courses(manager.courses)
+    users = [(s.username, s.password, "student", s.major) for s in manager.students]
+    users += [(i.username, i.password, "instructor", None) for i in manager.instructors]
+    for batch in batches(users):
+        target.add_users(batch)
+    # save_enrollments replaces everything in one transaction, so a rerun never duplicates rows
+    target.save_enrollments(manager.enrollment_rows())
+    for course_name, capacity in manager.capacities.items():
+        target.save_capacity(course_name, capacity)
+    target.close()
+    manager.close()
+    return (len(manager.courses), len(users), sum(len(s.enrolled_courses) for s in manager.students),
+            len(manager.capacities))
+
+
+if __name__ == "__main__":
+    data_dir = sys.argv[1] if len(sys.argv) > 1 else "."
+    db_path = sys.argv[2] if len(sys.argv) > 2 else "smartcourse.db"
+    courses, users, enrollments, capacities = migrate(data_dir, db_path)
+    print(f"Imported {courses} courses, {users} users, {enrollments} enrollments and {capacities} class-size limits "
+          f"into {db_path}")
@@ -0,0 +1,145 @@
+import threading
+import time
+from collections import deque
+from llm_client import get_client
+
+# Keeps the model loaded while it is needed: the first question after starting the app, or after a quiet
+# spell in which Ollama unloaded the model, would otherwise wait for the whole model load.
+REFRESH_INTERVAL = 10 * 60   # seconds between keep_alive refreshes while students are logged in
+SESSION_IDLE = 60 * 60       # a login without any activity for this long no longer keeps the model loaded
+RETRY_INTERVAL = 30          # seconds before a failed load is tried again
+OLLAMA_KEEP_ALIVE = 5 * 60   # Ollama's own default, for a client that doesn't send keep_alive
+LATENCY_SAMPLES = 1000       # answers kept per kind for stats()
+
+
+class ModelManager:
+    """
+    start() loads the model in a background thread. While students are logged in the load request is
+    repeated every REFRESH_INTERVAL seconds, which restarts Ollama's keep_alive period; once they are
+    gone the model is left to be unloaded.
+
+    `state` is one of
+      "cold"     not loaded - not yet, or no longer (keep_alive ran out)
+      "warming"  being loaded
+      "ready"    loaded: answers start without the load delay
+      "failed"   the last load failed (see `error`); tried again every RETRY_INTERVAL seconds
+
+    record() keeps the latencies of answers that started cold apart from the warm ones.
+    """
+    def __init__(self, client=None, refresh_interval=REFRESH_INTERVAL, session_idle=SESSION_IDLE,
+                 retry_interval=RETRY_INTERVAL):
+        self.client = client
+        self.refresh_interval = refresh_interval
+        self.session_idle = session_idle
+        self.retry_interval = retry_interval
+        self.error = None
+        self.loads = 0                 # successful load / keep_alive requests
+        self._state = "cold"
+        self._loaded_until = 0.0
+        self._sessions = {}            # username -> time of the last activity
+        self._latencies = {"cold": deque(maxlen=LATENCY_SAMPLES), "warm": deque(maxlen=LATENCY_SAMPLES)}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == "ready" and time.time() > self._loaded_until:
+                return "cold"
+            return self._state
+
+    @property
+    def ready(self):
+        return self.state == "ready"
+
+    def start(self):
+        # Starts loading the model in the background (only the first call does anything) and returns at once
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="model-manager", daemon=True)
+                self._thread.start()
+
+    def user_active(self, username):
+        # A student logged in or asked something: keep the model loaded, and load it again if it was unloaded
+        with self._lock:
+            self._sessions[username] = time.time()
+        if self.state in ("cold", "failed"):
+            self._wake.set()
+
+    def user_left(self, username):
+        with self._lock:
+            self._sessions.pop(username, None)
+
+    def used(self):
+        # An answer came from the model, so it is loaded for another keep_alive period
+        with self._lock:
+            self._state = "ready"
+            self._loaded_until = time.time() + self._keep_alive()
+
+    def record(self, cold, latency, ttft):
+        self._latencies["cold" if cold else "warm"].append((ttft, latency))
+
+    def stats(self):
+        # State, load counters and the median time to first text / total latency of cold and warm answers
+        with self._lock:
+            sessions = len(self._sessions)
+        stats = {"state": self.state, "loads": self.loads, "sessions": sessions,
+                 "error": str(self.error) if self.error else None}
+        for kind, samples in self._latencies.items():
+            samples = list(samples)
+            stats[f"{kind}_answers"] = len(samples)
+            for i, name in enumerate(("ttft", "latency")):
+                values = sorted(s[i] for s in samples)
+                stats[f"{kind}_{name}_p50"] = values[len(values) // 2] if values else None
+        return stats
+
+    def _keep_alive(self):
+        keep_alive = (self.client or get_client()).keep_alive
+        return OLLAMA_KEEP_ALIVE if keep_alive is None else keep_alive
+
+    def _needed(self):
+        # Whether somebody is still logged in; logins idle for too long are forgotten
+        now = time.time()
+        with self._lock:
+            for username, seen in list(self._sessions.items()):
+                if now - seen > self.session_idle:
+                    del self._sessions[username]
+            return bool(self._sessions)
+
+    def _run(self):
+        self._load()
+        while True:
+            self._wake.wait(self.retry_interval if self._state == "failed" else self.refresh_interval)
+            self._wake.clear()
+            if self._needed():
+                self._load()
+
+    def _load(self):
+        with self._lock:
+            if self._state != "ready" or time.time() > self._loaded_until:
+                self._state = "warming"
+        try:
+            (self.client or get_client()).preload()
+        except Exception as e:
+            with self._lock:
+                self._state = "failed"
+            self.error = e
+        else:
+            self.error = None
+            self.loads += 1
+            self.used()
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_model_manager():
+    # The manager shared by every session of this process, created on first use (start() loads the model)
+    global _manager
+    if _manager is None:
+        with _manager_lock:
+            if _manager is None:
+                _manager = ModelManager()
+    return _manager
@@ -0,0 +1,127 @@
+import threading
+from bisect import bisect_left, insort
+from data_models import GRADES
+from prompt_builder import is_low_grade, LOW_GRADE_THRESHOLD
+
+
+class PlanProgress:
+    """
+    Where one student stands in their major's plan (a plan_registry.DegreePlan): the plan courses
+    still to do (not taken yet, or taken with a grade at or below the threshold), the low grades to
+    retake, and the next plan year with courses left. The Student keeps it current from add_course /
+    drop_course / set_grade, like CourseRosters, so an advice request reads it instead of working it
+    out from the plan file and the transcript. Each read is built once and kept until the next change.
+    """
+    __slots__ = ("plan", "threshold", "_todo", "_low", "_cache", "_lock")
+
+    def __init__(self, plan, threshold=LOW_GRADE_THRESHOLD):
+        self.plan = plan
+        self.threshold = threshold
+        self._todo = list(range(len(plan.courses)))  # sorted positions of the plan courses still to do
+        self._low = {}                               # course -> low grade, in or outside the plan
+        self._cache = {}
+        self._lock = threading.RLock()  # a read may build on another one
+
+    def reset(self, enrolled=()):
+        # Starts over from (course, grade) pairs, e.g. a student's enrolled_courses.items()
+        with self._lock:
+            self._todo = list(range(len(self.plan.courses)))
+            self._low = {}
+            self._cache = {}
+        for course_name, grade in enrolled:
+            self.added(course_name)
+            if grade is not None:
+                self.graded(course_name, grade)
+
+    # ----- called by Student -----
+
+    def added(self, course_name):
+        with self._lock:
+            self._set_todo(course_name, False)
+
+    def dropped(self, course_name):
+        with self._lock:
+            self._low.pop(course_name, None)
+            self._set_todo(course_name, True)
+
+    def graded(self, course_name, grade):
+        # grade None: back to "in progress"
+        low = grade is not None and is_low_grade(grade, self.threshold)
+        with self._lock:
+            if low:
+                self._low[course_name] = grade
+            else:
+                self._low.pop(course_name, None)
+            self._set_todo(course_name, low)
+
+    def _set_todo(self, course_name, todo):
+        self._cache = {}
+        i = self.plan.position.get(course_name)
+        if i is None:
+            return
+        at = bisect_left(self._todo, i)
+        present = at < len(self._todo) and self._todo[at] == i
+        if todo and not present:
+            insort(self._todo, i)
+        elif not todo and present:
+            del self._todo[at]
+
+    # ----- reads -----
+
+    def _cached(self, name, build):
+        value = self._cache.get(name)
+        if value is None:
+            with self._lock:
+                value = self._cache.get(name)
+                if value is None:
+                    value = self._cache[name] = build()
+        return value
+
+    def remaining_years(self):
+        # [(heading, [course, ...]), ...]: the plan without what is done, empty years left out
+        def build():
+            years = []
+            for i in self._todo:
+                year = self.plan.year_of[i]
+                if not years or years[-1][0] != year:
+                    years.append((year, []))
+                years[-1][1].append(self.plan.courses[i])
+            return [(self.plan.years[year][0], courses) for year, courses in years]
+        return self._cached("remaining", build)
+
+    def retakes(self):
+        # [(course, grade), ...] of every low grade, the lowest first (then by name)
+        return self._cached("retakes", lambda: sorted(self._low.items(), key=lambda item: (-GRADES.index(item[1]), item[0])))
+
+    def candidates(self):
+        # [(course, reason), ...]: plan courses to retake (reason "retake (C)"), the lowest grade first (then
+        # in plan order), then the plan courses not taken yet in plan order (reason the plan year)
+        def build():
+            retakes = sorted(((c, g) for c, g in self._low.items() if c in self.plan),
+                             key=lambda item: (-GRADES.index(item[1]), self.plan.position[item[0]]))
+            retakes = [(c, f"retake ({g})") for c, g in retakes]
+            todo = [(self.plan.courses[i], self.plan.years[self.plan.year_of[i]][0])
+                    for i in self._todo if self.plan.courses[i] not in self._low]
+            return retakes + todo
+        return self._cached("candidates", build)
+
+    def next_year(self):
+        # (heading, [course, ...]) of the first plan year with courses still to do, None when there is none
+        remaining = self.remaining_years()
+        return remaining[0] if remaining else None
+
+    def remaining_count(self):
+        return len(self._todo)
+
+    def done_count(self):
+        return len(self.plan.courses) - len(self._todo)
+
+    def summary(self):
+        # One line for the instructor views, e.g. "12 of 38 plan courses done, 2 worth retaking; next: Year 2 (9 left)"
+        retakes = sum(1 for course, _grade in self.retakes() if course in self.plan)
+        text = f"{self.done_count()} of {len(self.plan.courses)} plan courses done, {retakes} worth retaking"
+        next_year = self.next_year()
+        if next_year is None:
+            return text + "; plan complete"
+        heading, courses = next_year
+        return text + f"; next: {heading or 'plan'} ({len(courses)} left)"
@@ -0,0 +1,107 @@
+import os
+import threading
+import time
+from prompt_builder import parse_plan
+
+# Every major's four-year plan ({major}_plan.txt), parsed once and shared by the CLI, the GUI and
+# experiment/eval_relevance.py. A plan file is checked for changes (modification time and size) at most
+# every CHECK_INTERVAL seconds and parsed again when it changed, so an edited plan is picked up without
+# a restart.
+PLAN_SUFFIX = "_plan.txt"
+CHECK_INTERVAL = 2.0   # seconds
+
+
+class DegreePlan:
+    # A major's plan: the raw text (for prompts), the years in order, the courses in plan order (each
+    # once) with their codes, position and year, and the sets used to score recommendations
+    __slots__ = ("major", "text", "years", "courses", "codes", "position", "year_of", "course_set", "code_set")
+
+    def __init__(self, major, text):
+        self.major = major
+        self.text = text
+        self.years = parse_plan(text)   # [(heading, [course, ...]), ...]; "Year N:" lines are headings
+        self.courses = []
+        self.position = {}              # course -> index in self.courses
+        self.year_of = []               # index in self.courses -> index in self.years
+        for year, (_heading, courses) in enumerate(self.years):
+            for course in courses:
+                if course not in self.position:
+                    self.position[course] = len(self.courses)
+                    self.courses.append(course)
+                    self.year_of.append(year)
+        self.codes = [course.split(":")[0].strip() for course in self.courses]   # "CPS 2232", ...
+        self.course_set = frozenset(self.courses)
+        self.code_set = frozenset(self.codes)
+
+    def __contains__(self, course_name):
+        return course_name in self.position
+
+
+class PlanRegistry:
+    """
+    get(major) -> the major's DegreePlan, or None when it has no plan file. A changed file gives a new
+    DegreePlan object, so holders can tell by identity that theirs is outdated.
+    """
+    def __init__(self, directory=".", check_interval=CHECK_INTERVAL):
+        self.directory = directory
+        self.check_interval = check_interval
+        self.reloads = 0
+        self._plans = {}        # major -> (DegreePlan or None, (mtime_ns, size) or None, time of the last check)
+        self._lock = threading.Lock()
+
+    def path(self, major):
+        return os.path.join(self.directory, f"{major}{PLAN_SUFFIX}")
+
+    def get(self, major):
+        if not major:
+            return None
+        entry = self._plans.get(major)
+        if entry is not None and time.monotonic() - entry[2] < self.check_interval:
+            return entry[0]
+        with self._lock:
+            entry = self._plans.get(major)
+            now = time.monotonic()
+            if entry is not None and now - entry[2] < self.check_interval:
+                return entry[0]
+            try:
+                st = os.stat(self.path(major))
+                version = (st.st_mtime_ns, st.st_size)
+            except FileNotFoundError:
+                version = None
+            if entry is not None and entry[1] == version:
+                plan = entry[0]
+            else:
+                plan = self._load(major) if version is not None else None
+                if entry is not None:
+                    self.reloads += 1
+            self._plans[major] = (plan, version, now)
+            return plan
+
+    def majors(self):
+        # Every major with a plan file in the directory
+        return sorted(name[:-len(PLAN_SUFFIX)] for name in os.listdir(self.directory) if name.endswith(PLAN_SUFFIX))
+
+    def load_all(self):
+        for major in self.majors():
+            self.get(major)
+
+    def _load(self, major):
+        try:
+            with open(self.path(major), "r", encoding="utf-8") as f:
+                return DegreePlan(major, f.read())
+        except FileNotFoundError:
+            return None
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_plan_registry():
+    # The registry of the plans in the working directory, shared by everything in this process
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = PlanRegistry()
+    return _registry
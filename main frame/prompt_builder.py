@@ -0,0 +1,188 @@
+import math
+from collections import Counter
+from data_models import GRADES
+
+# Builds the advising prompts of the CLI, the GUI and experiment/eval_relevance.py. Instead of pasting the
+# whole plan file and transcript, the plan part only lists what is still to do - plan courses not taken
+# yet plus taken ones with a low grade - and the transcript is summarised, within a token budget.
+#
+# The parts that are the same for every student of a major - the plan and the instructions - come first,
+# the student's own transcript and question last. Every prompt for a major then starts with the same
+# bytes, and Ollama can reuse the already evaluated prefix kept in its cache (see llm_client.KEEP_ALIVE)
+# instead of evaluating the whole prompt again.
+
+TOKEN_BUDGET = 800           # estimated prompt tokens; the details are shortened until the prompt fits
+LOW_GRADE_THRESHOLD = "B-"   # grades at or below this one count as low (worth retaking / prioritising)
+CHARS_PER_TOKEN = 4          # rough average for English text with Llama-style tokenizers
+
+ADVICE_INSTRUCTION = "Based on the plan above and on my course history and question below, give me a suggestion."
+# With a plan and a transcript the model only ranks and explains the candidates worked out beforehand
+# (see recommender.py) instead of picking from everything it knows
+RANK_INSTRUCTION = ("Answer my question below by recommending courses from the candidate courses listed after my "
+                    "course history, the most suitable first, and explain each choice briefly.")
+
+
+def estimate_tokens(text):
+    # Good enough for budgeting; the model reports the exact count (prompt_eval_count) afterwards
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def parse_plan(text):
+    # [(heading, [course, ...]), ...] from a *_plan.txt; "Year N:" lines are headings, not courses
+    years = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if line.endswith(":") and ":" not in line[:-1]:
+            years.append((line[:-1], []))
+        else:
+            if not years:
+                years.append(("", []))
+            years[-1][1].append(line)
+    return years
+
+
+def plan_courses(years):
+    return [course for _heading, courses in years for course in courses]
+
+
+def is_low_grade(grade, threshold=LOW_GRADE_THRESHOLD):
+    return grade in GRADES and GRADES.index(grade) >= GRADES.index(threshold)
+
+
+def remaining_plan(years, grades, threshold=LOW_GRADE_THRESHOLD):
+    # The plan without the courses already taken, except those graded low; empty years are left out
+    remaining = []
+    for heading, courses in years:
+        todo = [c for c in courses if c not in grades or is_low_grade(grades[c], threshold)]
+        if todo:
+            remaining.append((heading, todo))
+    return remaining
+
+
+def _code(course):
+    # "CPS 2232: Data Structure" -> "CPS 2232"
+    return course.split(":")[0].strip()
+
+
+def transcript_lines(grades, threshold=LOW_GRADE_THRESHOLD, detail=True, names=True):
+    # Low grades and courses in progress are listed by name, or by code when not `names`. The courses passed
+    # with a good grade need less room: their codes and grades on one line when `detail`, or else a count
+    # per department
+    low = [f"{c if names else _code(c)} - {g}" for c, g in grades.items() if g is not None and is_low_grade(g, threshold)]
+    current = [c if names else _code(c) for c, g in grades.items() if g is None]
+    passed = [(c, g) for c, g in grades.items() if g is not None and not is_low_grade(g, threshold)]
+    lines = []
+    if passed:
+        if detail:
+            lines.append(f"Completed ({len(passed)}): " + ", ".join(f"{_code(c)} {g}" for c, g in passed))
+        else:
+            counts = Counter(_code(c).split()[0] for c, _g in passed)
+            lines.append(f"Completed with a grade above {threshold}: {len(passed)} courses ("
+                         + ", ".join(f"{dept} {n}" for dept, n in counts.most_common()) + ")")
+    if low:
+        lines.append(f"Low grades ({threshold} or below, worth retaking):")
+        lines += low
+    if current:
+        lines.append("Currently enrolled (no grade yet):")
+        lines += current
+    if not lines:
+        lines.append("(no courses taken yet)")
+    return lines
+
+
+def _plan_lines(years):
+    lines = []
+    for heading, courses in years:
+        if heading:
+            lines.append(f"{heading}:")
+        lines += courses
+    return lines
+
+
+def _remaining_lines(years):
+    # The names are in the plan at the top already, so the codes are enough: one line per year
+    return [(f"{heading}: " if heading else "") + ", ".join(_code(c) for c in courses) for heading, courses in years]
+
+
+class PromptBuilder:
+    """
+    build(question, grades, plan_text) -> prompt. `grades` is the {course: grade or None} transcript,
+    None to leave the transcript out; `plan_text` the content of the major's plan file, None to
+    leave the plan out. With both, the courses of the plan still to do are listed after the transcript.
+
+    parts() returns the prompt in its three sections: the prefix shared by every prompt with the same
+    plan, instruction and suffix; the student's course history; the question.
+
+    Instead of plan_text, `progress` can be the student's PlanProgress (plan_progress.py), whose plan is
+    parsed already and whose remaining plan is kept current, so nothing is worked out per request.
+
+    To fit the budget the student's section is shortened step by step: completed courses are counted per
+    department instead of listed by code, then the remaining plan loses its last years, then low grades and
+    current courses are given by code only. The prefix and the question count against the budget but are
+    never cut: the plan in the prefix is what Ollama keeps cached for the whole major, so the prompt is
+    about as long as the whole plan file and transcript pasted in, but only the student's section is
+    evaluated per question. A prompt that still exceeds the budget is sent anyway, with a warning.
+    """
+    def __init__(self, budget=TOKEN_BUDGET, threshold=LOW_GRADE_THRESHOLD):
+        self.budget = budget
+        self.threshold = threshold
+        self.warned = False
+
+    def build(self, question, grades=None, plan_text=None, instruction=ADVICE_INSTRUCTION, suffix="", progress=None):
+        return "".join(self.parts(question, grades, plan_text, instruction, suffix, progress))
+
+    def parts(self, question, grades=None, plan_text=None, instruction=ADVICE_INSTRUCTION, suffix="", progress=None):
+        if progress is not None:
+            plan = progress.plan.years
+            years = progress.remaining_years() if grades is not None else None
+        else:
+            plan = parse_plan(plan_text) if plan_text is not None else None
+            years = remaining_plan(plan, grades, self.threshold) if plan is not None and grades is not None else None
+        prefix = self._prefix(plan, instruction, suffix)
+        ask = f'I am a student asking the following academic question:\n"{question}"\n'
+        detail = names = True
+        while True:
+            history = self._history(grades, years, detail, names)
+            tokens = estimate_tokens(prefix + history + ask)
+            if tokens <= self.budget:
+                return prefix, history, ask
+            if grades and detail:
+                detail = False
+            elif years and len(years) > 1:
+                years = years[:-1]  # the nearest years matter most for "what next"
+            elif years and len(years[0][1]) > 1:
+                years = [(years[0][0], years[0][1][:len(years[0][1]) // 2])]
+            elif grades and names:
+                names = False
+            else:
+                if not self.warned:
+                    self.warned = True
+                    print(f"[Warning] Prompt of {tokens} tokens exceeds the budget of {self.budget} "
+                          f"({estimate_tokens(prefix + ask)} of them for the plan, instructions and question)")
+                return prefix, history, ask
+
+    def _prefix(self, plan, instruction, suffix):
+        # Depends on nothing but the major's plan and the wording, so it is byte-identical between students
+        parts = []
+        if plan is not None:
+            parts.append("Here is the four-year plan for my major:\n" + "\n".join(_plan_lines(plan)))
+        parts.append(instruction + suffix)
+        return "\n\n".join(parts) + "\n\n"
+
+    def _history(self, grades, years, detail, names=True):
+        if grades is None:
+            return ""
+        parts = ["My course history:\n" + "\n".join(transcript_lines(grades, self.threshold, detail, names))]
+        if years is not None:
+            parts.append("Candidate courses (from my plan: not taken yet, or worth retaking):\n"
+                         + ("\n".join(_remaining_lines(years)) or "(none - the plan is complete)"))
+        return "\n\n".join(parts) + "\n\n"
+
+
+def build_advice_prompt(question, grades, plan_text, budget=TOKEN_BUDGET, progress=None):
+    # The prompt of the CLI and the GUI "Ask AI" (plan_text None when the major has no plan file)
+    has_plan = plan_text is not None or progress is not None
+    instruction = RANK_INSTRUCTION if grades is not None and has_plan else ADVICE_INSTRUCTION
+    return PromptBuilder(budget).build(question, grades, plan_text, instruction, progress=progress)
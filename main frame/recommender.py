@@ -0,0 +1,112 @@
+import os
+from semantic_cache import words
+from prompt_builder import parse_plan, remaining_plan, is_low_grade, LOW_GRADE_THRESHOLD
+from data_models import GRADES
+
+# Answers the common advising questions - what to take next, what is still missing, what to retake -
+# straight from the plan and the transcript, in milliseconds instead of a model call. classify() only
+# accepts a question when every content word in it belongs to one of these intents; anything else
+# (careers, topics, schedules, "why") goes to the model, which then ranks and explains the same
+# candidate courses instead of picking from the whole catalog.
+
+FAST_PATH_ENV_VAR = "SMARTCOURSE_FAST_PATH"   # "off" sends every question to the model
+MAX_RECOMMENDATIONS = 8                       # courses in a "what next" answer
+
+# Words that point to an intent (after semantic_cache.words: lower case, synonyms, plurals folded)
+INTENT_WORDS = {
+    "retake": {"retake", "redo", "repeat", "failed", "fail", "low", "poor", "poorly", "bad", "weak", "raise"},
+    "remaining": {"remaining", "still", "left", "missing", "need", "needed", "requirement", "required",
+                  "graduate", "graduation", "finish", "complete"},
+    "next": {"next", "now", "register", "enroll", "sign", "up", "after"},
+}
+# Words that don't change the answer; any other word makes the question one for the model
+NEUTRAL_WORDS = {"semester", "year", "plan", "transcript", "history", "based", "taken", "so", "far", "major",
+                 "degree", "program", "core", "gpa", "advice", "tell", "know", "want", "like", "list", "give",
+                 "show", "there", "right", "again", "yet", "all", "ones", "one", "get", "also", "go"}
+# When a question matches several intents, the more specific one wins
+INTENT_ORDER = ("retake", "remaining", "next")
+
+
+def classify(question):
+    # "retake", "remaining" or "next" when the question can be answered from the plan and transcript
+    # alone, else None. A question with no content words at all ("what should I take?") counts as "next"
+    ws = words(question)
+    found = set()
+    for word in ws:
+        for intent, intent_words in INTENT_WORDS.items():
+            if word in intent_words:
+                found.add(intent)
+                break
+        else:
+            if word not in NEUTRAL_WORDS:
+                return None
+    for intent in INTENT_ORDER:
+        if intent in found:
+            return intent
+    return "next"
+
+
+class Recommender:
+    """
+    candidates(grades, plan_text) -> [(course, reason), ...]: the plan courses taken with a low grade
+    (reason "retake (C)"), worst grade first (then in plan order), then the plan courses not taken yet
+    in plan order (reason the plan year). Courses in progress are left out.
+
+    answer(question, grades, plan_text) -> the reply text, or None when the question needs the model
+    (or the answer needs a plan and there is none).
+
+    With the student's PlanProgress as `progress` the candidates and retakes are read from it instead of
+    being worked out from plan_text and the transcript.
+    """
+    def __init__(self, threshold=LOW_GRADE_THRESHOLD, limit=MAX_RECOMMENDATIONS):
+        self.threshold = threshold
+        self.limit = limit
+
+    def candidates(self, grades, plan_text, progress=None):
+        if progress is not None:
+            return progress.candidates()
+        years = remaining_plan(parse_plan(plan_text), grades, self.threshold)
+        retakes = [(c, grades[c]) for _heading, courses in years for c in courses if c in grades]
+        retakes.sort(key=lambda item: -GRADES.index(item[1]))
+        return [(c, f"retake ({g})") for c, g in retakes] + \
+               [(c, heading) for heading, courses in years for c in courses if c not in grades]
+
+    def answer(self, question, grades, plan_text, progress=None):
+        intent = classify(question)
+        if intent is None or (plan_text is None and progress is None and intent != "retake"):
+            return None
+        return self.reply(intent, grades, plan_text, progress)
+
+    def reply(self, intent, grades, plan_text, progress=None):
+        if intent == "retake":
+            if progress is not None:
+                low = progress.retakes()
+            else:
+                low = sorted(((c, g) for c, g in grades.items() if g is not None and is_low_grade(g, self.threshold)),
+                             key=lambda item: (-GRADES.index(item[1]), item[0]))
+            if not low:
+                return f"You have no grades of {self.threshold} or below, so there is nothing you need to retake."
+            return (f"These courses have a grade of {self.threshold} or below and are worth retaking, "
+                    "lowest grade first:\n" + "\n".join(f"{c} - {g}" for c, g in low))
+        candidates = self.candidates(grades, plan_text, progress)
+        if not candidates:
+            return "You have taken every course of your four-year plan with a good grade - well done!"
+        if intent == "remaining":
+            lines, current = [], None
+            for course, reason in candidates:
+                group = "Worth retaking" if reason.startswith("retake") else reason
+                if group != current:
+                    lines.append(f"\n{group}:")
+                    current = group
+                lines.append(course + (f" {reason[len('retake '):]}" if group == "Worth retaking" else ""))
+            return f"You still need {len(candidates)} courses of your four-year plan:\n" + "\n".join(lines).lstrip("\n")
+        lines = [f"{course} - {reason}" for course, reason in candidates[:self.limit]]
+        return ("Based on your four-year plan and your transcript, take these next "
+                "(courses to retake first, then the plan in order):\n" + "\n".join(lines))
+
+
+def fast_answer(question, grades, plan_text, progress=None):
+    # The reply of the CLI and GUI when the question doesn't need the model, else None
+    if os.environ.get(FAST_PATH_ENV_VAR, "").lower() == "off":
+        return None
+    return Recommender().answer(question, grades, plan_text, progress)
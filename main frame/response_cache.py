@@ -0,0 +1,249 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import os
+import time
+from collections import OrderedDict
+from semantic_cache import QuestionMatcher, SIMILARITY_THRESHOLD
+
+CACHE_FILE = "ai_cache.sqlite3"
+MEMORY_ENTRIES = 256             # replies kept in memory, least recently used dropped first
+DISK_BYTES = 50 * 1024 * 1024    # total reply size kept on disk
+TTL = 7 * 24 * 3600              # seconds a reply stays valid
+# Cosine similarity at which the answer to an earlier, similar question of the same student is reused;
+# "off" turns the semantic lookup off
+SIMILARITY_ENV_VAR = "SMARTCOURSE_SIMILARITY"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS replies (
+    key     TEXT PRIMARY KEY,
+    scope   TEXT NOT NULL,
+    reply   TEXT NOT NULL,
+    size    INTEGER NOT NULL,
+    created REAL NOT NULL,
+    used    REAL NOT NULL,
+    question TEXT,
+    model   TEXT
+);
+CREATE INDEX IF NOT EXISTS replies_used ON replies(used);
+CREATE INDEX IF NOT EXISTS replies_scope ON replies(scope);
+CREATE TABLE IF NOT EXISTS contexts (
+    scope   TEXT PRIMARY KEY,
+    context TEXT NOT NULL
+);
+"""
+
+
+def cache_key(model, prompt, options=None):
+    # What identifies a reply: the model, the exact prompt and the generation options
+    data = json.dumps([model, prompt, options or {}], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+def context_key(*parts):
+    # A short token for the data a student's prompts are built from (transcript, plan text, ...)
+    return hashlib.sha256("\x00".join(parts).encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    Two-tier cache of AI replies: a small LRU in memory in front of an SQLite file that is
+    shared by every app process, bounded by total size and expiring entries after `ttl` seconds.
+
+    Entries belong to a scope (the student) together with a context token. When a lookup or store
+    for a scope comes with a different context than before - the student's enrollments or grades
+    or their major's plan changed - every entry of that scope is dropped from both tiers.
+
+    Replies stored with their question can also be found by get_similar, for a reworded question
+    of the same student in the same context.
+    """
+    def __init__(self, path=CACHE_FILE, memory_entries=MEMORY_ENTRIES, disk_bytes=DISK_BYTES, ttl=TTL,
+                 similarity_threshold=SIMILARITY_THRESHOLD):
+        self.path = path
+        self.memory_entries = memory_entries
+        self.disk_bytes = disk_bytes
+        self.ttl = ttl
+        self.matcher = QuestionMatcher(similarity_threshold) if similarity_threshold is not None else None
+        self._memory = OrderedDict()   # key -> (reply, created, scope, question, model)
+        self._contexts = {}            # scope -> context, as last seen by this process
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0             # the part of `hits` answered from the file
+        self.misses = 0
+        self.similar_hits = 0          # answered by get_similar (not part of `hits`)
+        self.memory_evictions = 0      # pushed out of memory by newer replies (still on disk)
+        self.disk_evictions = 0        # removed from the file to stay within disk_bytes
+        self.invalidations = 0
+        self._conn = None
+        if path:
+            self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(SCHEMA)
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(replies)")}
+            for column in ("question", "model"):
+                if column not in columns:  # a file written before replies kept their question
+                    self._conn.execute(f"ALTER TABLE replies ADD COLUMN {column} TEXT")
+
+    def get(self, key, scope="", context=None, count_miss=True):
+        # The cached reply, or None. A caller that goes on to try get_similar passes count_miss=False
+        # and calls record_miss() when that finds nothing either.
+        now = time.time()
+        with self._lock:
+            self._check_context(scope, context)
+            entry = self._memory.get(key)
+            if entry is not None and now - entry[1] <= self.ttl:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._memory[key]
+            if self._conn is not None:
+                row = self._conn.execute("SELECT reply, created, question, model FROM replies WHERE key = ?",
+                                         (key,)).fetchone()
+                if row is not None and now - row[1] <= self.ttl:
+                    self._conn.execute("UPDATE replies SET used = ? WHERE key = ?", (now, key))
+                    self._remember(key, row[0], row[1], scope, row[2], row[3])
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return row[0]
+                if row is not None:
+                    self._conn.execute("DELETE FROM replies WHERE key = ?", (key,))
+            if count_miss:
+                self.misses += 1
+            return None
+
+    def record_miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def get_similar(self, question, model, scope="", context=None):
+        # (reply, earlier question, similarity) for the most similar question this student asked the
+        # same model in the same context, or None below the similarity threshold
+        if self.matcher is None or not question:
+            return None
+        now = time.time()
+        with self._lock:
+            self._check_context(scope, context)
+            if self._conn is not None:
+                candidates = self._conn.execute(
+                    "SELECT question, key, reply FROM replies WHERE scope = ? AND model = ? AND question IS NOT NULL"
+                    " AND created >= ?", (scope, model, now - self.ttl)).fetchall()
+            else:
+                candidates = [(entry[3], key, entry[0]) for key, entry in self._memory.items()
+                              if entry[2] == scope and entry[4] == model and entry[3] is not None
+                              and now - entry[1] <= self.ttl]
+            match = self.matcher.best_match(question, candidates)
+            if match is None:
+                return None
+            score, (earlier, key, reply) = match
+            if self._conn is not None:
+                self._conn.execute("UPDATE replies SET used = ? WHERE key = ?", (now, key))
+            self.similar_hits += 1
+            return reply, earlier, score
+
+    def put(self, key, reply, scope="", context=None, question=None, model=None):
+        # `question` and `model` make the reply findable by get_similar
+        now = time.time()
+        with self._lock:
+            self._check_context(scope, context)
+            self._remember(key, reply, now, scope, question, model)
+            if self._conn is None:
+                return
+            size = len(reply.encode("utf-8"))
+            self._conn.execute("INSERT OR REPLACE INTO replies VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                               (key, scope, reply, size, now, now, question, model))
+            total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM replies").fetchone()[0]
+            if total > self.disk_bytes:
+                self._evict_disk(now)
+
+    def invalidate(self, scope):
+        # Drops every reply of one student
+        with self._lock:
+            self._drop_scope(scope)
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "disk_hits": self.disk_hits, "similar_hits": self.similar_hits,
+                    "misses": self.misses,
+                    "memory_evictions": self.memory_evictions, "disk_evictions": self.disk_evictions,
+                    "invalidations": self.invalidations, "memory_entries": len(self._memory)}
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _remember(self, key, reply, created, scope, question=None, model=None):
+        self._memory[key] = (reply, created, scope, question, model)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+            self.memory_evictions += 1
+
+    def _check_context(self, scope, context):
+        if context is None:
+            return
+        if self._contexts.get(scope) == context:
+            return
+        stale = scope in self._contexts
+        if self._conn is not None:
+            # The file keeps the context too: another process may have seen the new one first and
+            # already cleaned up (and stored fresh replies that must stay)
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute("SELECT context FROM contexts WHERE scope = ?", (scope,)).fetchone()
+                if row is not None and row[0] != context:
+                    self._conn.execute("DELETE FROM replies WHERE scope = ?", (scope,))
+                    stale = True
+                self._conn.execute("INSERT OR REPLACE INTO contexts VALUES (?, ?)", (scope, context))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        if stale:
+            self._drop_memory(scope)
+            self.invalidations += 1
+        self._contexts[scope] = context
+
+    def _drop_scope(self, scope):
+        self._drop_memory(scope)
+        if self._conn is not None:
+            self._conn.execute("DELETE FROM replies WHERE scope = ?", (scope,))
+        self.invalidations += 1
+
+    def _drop_memory(self, scope):
+        for key in [k for k, entry in self._memory.items() if entry[2] == scope]:
+            del self._memory[key]
+
+    def _evict_disk(self, now):
+        # Expired replies go first, then the least recently used until the file fits again
+        self._conn.execute("DELETE FROM replies WHERE created < ?", (now - self.ttl,))
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM replies").fetchone()[0]
+        doomed = []
+        for key, size in self._conn.execute("SELECT key, size FROM replies ORDER BY used"):
+            if total <= self.disk_bytes:
+                break
+            doomed.append((key,))
+            total -= size
+        self._conn.executemany("DELETE FROM replies WHERE key = ?", doomed)
+        self.disk_evictions += len(doomed)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    # The cache shared by the CLI and the GUI, created on first use
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                threshold = os.environ.get(SIMILARITY_ENV_VAR)
+                if threshold is None:
+                    _cache = ResponseCache()
+                else:
+                    _cache = ResponseCache(similarity_threshold=None if threshold == "off" else float(threshold))
+    return _cache
@@ -0,0 +1,195 @@
+import heapq
+import re
+import threading
+from array import array
+from bisect import bisect_left
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+# Minimum trigram similarity for a misspelt word to count as a match ("algoritms" -> "algorithms")
+FUZZY_THRESHOLD = 0.5
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower())
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def course_code(course_name):
+    # "CPS 2232: Data Structure" -> "cps2232"
+    return "".join(tokenize(course_name.split(":")[0]))
+
+
+class CourseSearchIndex:
+    # Inverted index over the course catalog. Built once when the catalog loads and updated with add().
+    #
+    # Results are ranked in tiers, catalog order within a tier:
+    #   1. the exact course code ("CPS 2232", "cps2232") or a code prefix ("CPS 22")
+    #   2. every query word appears as a whole word in the title
+    #   3. every query word is a prefix of a word in the title ("data struct")
+    #   4. the keyword appears anywhere in the title (what the old linear search matched); found through
+    #      the title trigrams, or by scanning the titles for keywords shorter than a trigram ("os", "(")
+    #   5. only if nothing above matched: every word matches, allowing for typos ("algoritms")
+    # Posting lists are kept in catalog order, so tiers are produced lazily and a search with a
+    # limit stops as soon as it has enough results instead of scoring every candidate.
+    def __init__(self, courses=()):
+        self.courses = []          # course id -> title, in catalog order
+        self._ids = {}             # title -> course id
+        self._lower = []           # course id -> lower-cased title
+        self._words = []           # course id -> set of words in the title
+        self._codes = {}           # normalised course code -> course id
+        self._sorted_codes = []    # for code-prefix lookups
+        self._postings = {}        # word -> course ids containing it
+        self._vocabulary = []      # sorted words, for prefix lookups
+        self._word_trigrams = {}   # trigram -> words containing it, for typo-tolerant lookups
+        self._title_trigrams = {}  # trigram -> course ids whose title contains it, for substring lookups
+        self._dirty = False
+        self._refresh_lock = threading.Lock()
+        for course in courses:
+            self.add(course)
+
+    def __getstate__(self):
+        # Saved in the startup snapshot (snapshot_cache.py); loading it is several times faster than add()
+        state = self.__dict__.copy()
+        del state["_refresh_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._refresh_lock = threading.Lock()
+
+    def __contains__(self, course_name):
+        return course_name in self._ids
+
+    def __len__(self):
+        return len(self.courses)
+
+    def add(self, course_name):
+        if course_name in self._ids:
+            return
+        cid = len(self.courses)
+        self.courses.append(course_name)
+        self._ids[course_name] = cid
+        lower = course_name.lower()
+        self._lower.append(lower)
+        self._codes.setdefault(course_code(course_name), cid)
+        words = set(tokenize(course_name))
+        self._words.append(words)
+        for word in words:
+            if word not in self._postings:
+                self._postings[word] = array("i")
+                for gram in trigrams(f"${word}$"):
+                    self._word_trigrams.setdefault(gram, []).append(word)
+            self._postings[word].append(cid)
+        for gram in trigrams(lower):
+            self._title_trigrams.setdefault(gram, array("i")).append(cid)
+        # The sorted lists are rebuilt lazily so loading a catalog stays O(n log n) overall
+        self._dirty = True
+
+    def _refresh(self):
+        # Concurrent searches wait for one rebuild; the new lists replace the old ones only once complete.
+        # _dirty is cleared before sorting, so a course added meanwhile triggers the next rebuild.
+        if self._dirty:
+            with self._refresh_lock:
+                if self._dirty:
+                    self._dirty = False
+                    vocabulary = sorted(self._postings)
+                    sorted_codes = sorted(self._codes)
+                    self._vocabulary, self._sorted_codes = vocabulary, sorted_codes
+
+    @staticmethod
+    def _prefixed(sorted_keys, prefix):
+        i = bisect_left(sorted_keys, prefix)
+        while i < len(sorted_keys) and sorted_keys[i].startswith(prefix):
+            yield sorted_keys[i]
+            i += 1
+
+    def _fuzzy_words(self, word):
+        grams = trigrams(f"${word}$")
+        counts = {}
+        for gram in grams:
+            for candidate in self._word_trigrams.get(gram, ()):
+                counts[candidate] = counts.get(candidate, 0) + 1
+        # Dice coefficient over trigrams; a padded word of length n has n trigrams
+        return {c for c, shared in counts.items() if 2 * shared / (len(grams) + len(c)) >= FUZZY_THRESHOLD}
+
+    def _matching_all(self, expansions):
+        # `expansions` holds, per query word, the set of title words it may match.
+        # Walk the postings of the rarest query word in catalog order and keep courses matching the rest.
+        sizes = [sum(len(self._postings[w]) for w in words) for words in expansions]
+        rarest = sizes.index(min(sizes))
+        rest = [words for i, words in enumerate(expansions) if i != rarest]
+        postings = [self._postings[w] for w in expansions[rarest]]
+        stream = postings[0] if len(postings) == 1 else heapq.merge(*postings)
+        previous = -1
+        for cid in stream:
+            if cid != previous and all(not words.isdisjoint(self._words[cid]) for words in rest):
+                yield cid
+            previous = cid
+
+    def _substring_matches(self, keyword):
+        if len(keyword) < 3:
+            # No trigram to look up: scan the titles, like the old search
+            return (cid for cid, lower in enumerate(self._lower) if keyword in lower)
+        return self._trigram_matches(keyword)
+
+    def _trigram_matches(self, keyword):
+        grams = [self._title_trigrams.get(g) for g in trigrams(keyword)]
+        if not all(grams):
+            return
+        for cid in min(grams, key=len):
+            if keyword in self._lower[cid]:
+                yield cid
+
+    def _tiers(self, keyword):
+        code = "".join(tokenize(keyword))
+        if code in self._codes:
+            yield [self._codes[code]]
+        elif len(code) >= 3 and any(ch.isdigit() for ch in code):
+            yield (self._codes[c] for c in self._prefixed(self._sorted_codes, code))
+
+        words = tokenize(keyword)
+        if words and all(w in self._postings for w in words):
+            yield self._matching_all([{w} for w in words])
+        prefixes = [set(self._prefixed(self._vocabulary, w)) for w in words]
+        if words and all(prefixes):
+            yield self._matching_all(prefixes)
+        yield self._substring_matches(keyword)
+
+    def search(self, keyword, limit=None):
+        """
+        Returns course titles matching `keyword`, best match first.
+        An empty keyword returns the whole catalog. `limit` caps the number of results.
+        """
+        keyword = keyword.strip().lower()
+        if not keyword:
+            return self.courses[:limit] if limit is not None else list(self.courses)
+        self._refresh()
+
+        found = []
+        seen = set()
+        for tier in self._tiers(keyword):
+            for cid in tier:
+                if cid not in seen:
+                    seen.add(cid)
+                    found.append(cid)
+                    if limit is not None and len(found) >= limit:
+                        return [self.courses[c] for c in found]
+
+        if not found:
+            # Typo tolerance: accept close spellings of alphabetic words that matched nothing as typed
+            expansions = []
+            for w in tokenize(keyword):
+                close = set(self._prefixed(self._vocabulary, w))
+                if w.isalpha() and len(w) >= 4:
+                    close |= self._fuzzy_words(w)
+                if not close:
+                    return []
+                expansions.append(close)
+            for cid in self._matching_all(expansions) if expansions else ():
+                found.append(cid)
+                if limit is not None and len(found) >= limit:
+                    break
+        return [self.courses[c] for c in found]
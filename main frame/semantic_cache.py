@@ -0,0 +1,173 @@
+import math
+import re
+import zlib
+from collections import OrderedDict
+
+# Paraphrases of one advising question rarely share their exact wording ("what should I take next
+# semester?" / "which courses next term?"), so questions are compared as sparse vectors of hashed
+# word, word-pair and character-trigram features with cosine similarity.
+
+SIMILARITY_THRESHOLD = 0.6  # cosine at which an earlier answer is reused, see experiment/semantic_cache_report.py
+DIMENSIONS = 1 << 20        # hashed feature space
+WORD_WEIGHT = 1.0
+PAIR_WEIGHT = 0.5
+TRIGRAM_WEIGHT = 0.3        # catches inflections and typos the word features miss
+VECTOR_CACHE_SIZE = 2048    # questions whose vectors are kept
+
+WORD_RE = re.compile(r"[a-z0-9]+")
+# What makes two similar-looking questions different ones: course codes ("CPS 4150", "cps4150"), other
+# numbers, letter grades ("C", "B+") and roman course levels ("Calculus II"). Grades and roman numerals
+# count only in capitals, so "a" and "I" are not taken for them.
+KEY_TERM_RE = re.compile(r"\b([A-Z]{2,4}) ?(\d{3,4})\b|\b([a-zA-Z]{2,4})(\d{3,4})\b|\b(\d+(?:\.\d+)?)\b")
+GRADE_RE = re.compile(r"(?<![A-Za-z0-9.])([ABCDF][+-]?|II|III|IV)(?![A-Za-z0-9+-])")   # not the D of "Ph.D."
+# What else a reused answer must agree on: what to do with the courses and in which department. Taking
+# courses is what almost every question is about, so only the other actions count ("Should I drop ...?" is
+# not "Should I take ...?", but "which courses fit ...?" is "which courses should I take for ...?").
+# "don't"/"shouldn't" come out of WORD_RE as "don"/"shouldn".
+ACTIONS = {
+    "drop": "drop", "dropping": "drop", "withdraw": "drop", "withdrawing": "drop", "quit": "drop",
+    "avoid": "avoid", "avoiding": "avoid", "skip": "avoid", "skipping": "avoid",
+    "not": "avoid", "don": "avoid", "dont": "avoid", "shouldn": "avoid", "never": "avoid",
+    "retake": "retake", "retaking": "retake", "repeat": "retake",
+}
+# Department names and codes of the catalog. Words that also appear in other phrases ("tech companies",
+# "product management") are left out.
+SUBJECTS = {
+    "cps": "cps", "cs": "cps", "math": "math", "mathematics": "math", "acct": "acct", "accounting": "acct",
+    "bio": "bio", "biology": "bio", "chem": "chem", "chemistry": "chem", "comm": "comm",
+    "communication": "comm", "econ": "econ", "economics": "econ", "eng": "eng", "english": "eng",
+    "esl": "esl", "fin": "fin", "finance": "fin", "hist": "hist", "history": "hist", "mkt": "mkt",
+    "marketing": "mkt", "phil": "phil", "philosophy": "phil", "phys": "phys", "physics": "phys",
+    "psy": "psy", "psychology": "psy", "soc": "soc", "sociology": "soc",
+}
+
+# Words that say nothing about what is being asked in an advising question
+STOPWORDS = {
+    "a", "an", "the", "and", "or", "of", "to", "in", "on", "for", "with", "at", "by", "from", "as", "so",
+    "i", "me", "my", "mine", "we", "our", "you", "your", "it", "its", "this", "that", "these", "those",
+    "is", "am", "are", "was", "were", "be", "been", "being", "do", "does", "did", "have", "has", "had",
+    "can", "could", "should", "would", "will", "shall", "may", "might", "must",
+    "what", "which", "who", "how", "when", "where", "why", "if", "any", "some", "please",
+    "course", "courses", "class", "classes", "subject", "subjects", "take", "taking", "recommend",
+    "suggest", "suggestion", "choose", "pick", "best", "good", "most",
+    "m", "s", "t", "d", "ve", "ll", "re",  # the rest of "I'm", "I've", ...
+}
+
+# Different words students use for the same thing (a value may stand for several words)
+SYNONYMS = {
+    "term": "semester", "terms": "semester", "quarter": "semester",
+    "following": "next", "upcoming": "next", "coming": "next",
+    "optional": "elective",
+    "ml": "machine learning", "quant": "quantitative",
+    "grade": "gpa", "grades": "gpa", "average": "gpa",
+    "job": "career", "profession": "career",
+    "completed": "taken", "finished": "taken", "done": "taken", "took": "taken",
+    "easier": "light", "lighter": "light", "easy": "light",
+    "boost": "raise", "improve": "raise",
+}
+
+
+def words(text):
+    out = []
+    for token in WORD_RE.findall(text.lower()):
+        for word in SYNONYMS.get(token, token).split():
+            if word in STOPWORDS:
+                continue
+            if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+                word = word[:-1]  # crude plural folding: "electives" -> "elective"
+            out.append(word)
+    return out
+
+
+def key_terms(text):
+    # The course codes, numbers and grades of a question, in order: a reused answer must have the same
+    terms = []
+    for m in KEY_TERM_RE.finditer(text):
+        letters, digits = (m.group(1), m.group(2)) if m.group(1) else (m.group(3), m.group(4))
+        terms.append((m.start(), letters.upper() + digits if letters else m.group(5)))
+    for m in GRADE_RE.finditer(text):
+        terms.append((m.start(), m.group(1)))
+    return tuple(term for _start, term in sorted(terms))
+
+
+def intent(text):
+    # (actions, departments) of a question, see ACTIONS and SUBJECTS
+    tokens = WORD_RE.findall(text.lower())
+    return (frozenset(ACTIONS[t] for t in tokens if t in ACTIONS),
+            frozenset(SUBJECTS[t] for t in tokens if t in SUBJECTS))
+
+
+def _feature(kind, text):
+    return zlib.crc32(f"{kind}:{text}".encode("utf-8")) & (DIMENSIONS - 1)
+
+
+def vectorize(text):
+    # Sparse, L2-normalised {feature: weight}; empty when the question has no content words
+    vector = {}
+
+    def add(feature, weight):
+        vector[feature] = vector.get(feature, 0.0) + weight
+
+    ws = words(text)
+    for word in ws:
+        add(_feature("w", word), WORD_WEIGHT)
+        padded = f"#{word}#"
+        for i in range(len(padded) - 2):
+            add(_feature("c", padded[i:i + 3]), TRIGRAM_WEIGHT)
+    for first, second in zip(ws, ws[1:]):
+        add(_feature("p", f"{first} {second}"), PAIR_WEIGHT)
+    norm = math.sqrt(sum(w * w for w in vector.values()))
+    if norm:
+        for feature in vector:
+            vector[feature] /= norm
+    return vector
+
+
+def cosine(a, b):
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(weight * b.get(feature, 0.0) for feature, weight in a.items())
+
+
+class QuestionMatcher:
+    # Finds the earlier question most similar to a new one. Only questions with the same key_terms() and
+    # intent() count: "Can I take CPS 4150 next semester?" is not "Can I take CPS 4951 next semester?",
+    # nor "Should I drop Data Structure?" "Should I take Data Structure?", however similar the words.
+    # Vectors, key terms and intents of recently seen questions are memoised, since the same candidates
+    # are compared against every new question of a student.
+    def __init__(self, threshold=SIMILARITY_THRESHOLD, cache_size=VECTOR_CACHE_SIZE):
+        self.threshold = threshold
+        self.cache_size = cache_size
+        self._vectors = OrderedDict()
+
+    def vector(self, question):
+        return self._features(question)[0]
+
+    def _features(self, question):
+        features = self._vectors.get(question)
+        if features is None:
+            features = (vectorize(question), (key_terms(question), intent(question)))
+            self._vectors[question] = features
+            if len(self._vectors) > self.cache_size:
+                self._vectors.popitem(last=False)
+        else:
+            self._vectors.move_to_end(question)
+        return features
+
+    def best_match(self, question, candidates, threshold=None):
+        # (score, candidate) of the most similar of `candidates` (question strings or (question, ...)
+        # tuples), or None when none reaches the threshold
+        threshold = self.threshold if threshold is None else threshold
+        query, terms = self._features(question)
+        if not query:
+            return None
+        best = None
+        for candidate in candidates:
+            text = candidate if isinstance(candidate, str) else candidate[0]
+            vector, candidate_terms = self._features(text)
+            if candidate_terms != terms:
+                continue
+            score = cosine(query, vector)
+            if score >= threshold and (best is None or score > best[0]):
+                best = (score, candidate)
+        return best
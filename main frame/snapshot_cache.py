@@ -0,0 +1,102 @@
+import hashlib
+import hmac
+import os
+import pickle
+import secrets
+import struct
+import sys
+
+# Bump whenever the layout of the saved state changes; older snapshots are then ignored and rebuilt
+SNAPSHOT_VERSION = 2
+MAGIC = b"SMARTCOURSE-SNAPSHOT\n"
+# Unpickling runs code, so a snapshot is only loaded when it is signed with this install's key: anyone who can
+# write to the data directory but not read the key can't make us load their file. The key is created on first
+# use, readable by its owner only, and is not used when anyone else could read or replace it.
+KEY_ENV_VAR = "SMARTCOURSE_SNAPSHOT_KEY"   # path of the key file, default KEY_PATH
+KEY_PATH = os.path.join(os.path.expanduser("~"), ".smartcourse", "snapshot.key")
+KEY_SIZE = 32
+# The header and the state are stored as blocks: length, HMAC-SHA256, pickled data. The state's HMAC also
+# covers the header's, so a header can't be paired with the state of another snapshot.
+BLOCK_HEADER = struct.Struct(">Q32s")
+
+
+def snapshot_key():
+    # This install's key, created if there is none yet; None when it can't be used safely
+    path = os.environ.get(KEY_ENV_VAR) or KEY_PATH
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except FileNotFoundError:
+        try:
+            os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        except FileExistsError:
+            return snapshot_key()  # another process created it first
+        except OSError:
+            return None
+        key = secrets.token_bytes(KEY_SIZE)
+        with os.fdopen(fd, "wb") as file:
+            file.write(key)
+        return key
+    except OSError:
+        return None
+    with os.fdopen(fd, "rb") as file:
+        st = os.fstat(file.fileno())
+        if hasattr(os, "getuid") and (st.st_uid != os.getuid() or st.st_mode & 0o077):
+            return None
+        key = file.read()
+    # Shorter while another process is still writing it
+    return key if len(key) == KEY_SIZE else None
+
+
+def _read_block(file, key, previous_mac=b""):
+    size, mac = BLOCK_HEADER.unpack(file.read(BLOCK_HEADER.size))
+    if size > os.fstat(file.fileno()).st_size - file.tell():
+        return None, mac
+    data = file.read(size)
+    if not hmac.compare_digest(mac, hmac.new(key, previous_mac + data, hashlib.sha256).digest()):
+        return None, mac
+    return data, mac
+
+
+def _write_block(file, key, data, previous_mac=b""):
+    mac = hmac.new(key, previous_mac + data, hashlib.sha256).digest()
+    file.write(BLOCK_HEADER.pack(len(data), mac))
+    file.write(data)
+    return mac
+
+
+def load_snapshot(path, fingerprint):
+    """
+    Returns the state saved by save_snapshot, or None when there is no snapshot, it was written
+    by another version or signed with another key, or the data files no longer match `fingerprint`.
+    Only the small header is checked and unpickled before deciding, so a stale snapshot costs almost nothing.
+    """
+    try:
+        with open(path, "rb") as file:
+            if file.read(len(MAGIC)) != MAGIC:
+                return None
+            key = snapshot_key()
+            if key is None:
+                return None
+            header, mac = _read_block(file, key)
+            if header is None or pickle.loads(header) != (SNAPSHOT_VERSION, sys.byteorder, fingerprint):
+                return None
+            state, _ = _read_block(file, key, mac)
+            return pickle.loads(state) if state is not None else None
+    except (OSError, EOFError, struct.error, pickle.UnpicklingError, ValueError):
+        return None
+
+
+def save_snapshot(path, fingerprint, state):
+    # Written to a temporary file first so readers never see a partial snapshot.
+    # Several processes may save at once; each uses its own temporary file and the last one wins.
+    key = snapshot_key()
+    if key is None:
+        return
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as file:
+        file.write(MAGIC)
+        mac = _write_block(file, key, pickle.dumps((SNAPSHOT_VERSION, sys.byteorder, fingerprint),
+                                                   pickle.HIGHEST_PROTOCOL))
+        _write_block(file, key, pickle.dumps(state, pickle.HIGHEST_PROTOCOL), mac)
+    os.replace(tmp, path)
@@ -0,0 +1,849 @@
+import os
+import queue
+import sqlite3
+import threading
+import time
+import weakref
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+ACCOUNT_FILE = "account.txt"
+COURSE_FILE = "course_list.txt"
+ENROLLMENT_FILE = "enrolled_courses.txt"
+# Optional class-size limits, one "course,capacity" per line; courses not listed are unlimited
+CAPACITY_FILE = "course_capacity.txt"
+# Enroll/drop/grade events since the last snapshot of ENROLLMENT_FILE, one per line:
+#   E,username,course   D,username,course   G,username,course,grade
+JOURNAL_FILE = "enrolled_courses.journal"
+# Rotate the journal and rewrite the snapshot in the background once the journal reaches this size
+JOURNAL_COMPACT_BYTES = 64 * 1024
+# "<rewrites> <rotations>": counts full rewrites of ENROLLMENT_FILE and journal rotations, so a process
+# can tell whether its read position in the journal still points at the same file
+SEQUENCE_FILE = "enrolled_courses.seq"
+# Every process using the data directory locks these (see FileLock)
+LOCK_FILE = "smartcourse.lock"
+COMPACT_LOCK_FILE = "smartcourse.compact.lock"
+# Binary cache of the parsed data files, written next to them
+SNAPSHOT_FILE = "smartcourse.snapshot"
+
+# Set this to a database path to run the apps on SQLite instead of the text files
+DB_ENV_VAR = "SMARTCOURSE_DB"
+
+
+def open_storage(directory="."):
+    """
+    Returns the storage backend the apps should use: SQLite when the SMARTCOURSE_DB
+    environment variable names a database, otherwise the text files in `directory`.
+    """
+    db_path = os.environ.get(DB_ENV_VAR)
+    if db_path:
+        return SQLiteStorage(db_path)
+    return TextFileStorage(directory)
+
+
+# Every backend provides the same methods:
+#   load_courses()                      -> list of course titles in catalog order
+#   load_users()                        -> (username, password, role, major) tuples
+#   load_enrollments()                  -> (op, username, course, grade) events, op in E/D/G
+#   load_capacities()                   -> {course: maximum number of students}
+#   add_user(username, password, role, major)
+#   add_course(course_name)
+#   record(op, username, course_name, grade=None)   one enroll/drop/grade event
+#   record_many(events)                             a batch of events, persisted together
+#   save_enrollments(rows)              replace all enrollments with (username, course, grade) rows
+#   save_capacity(course_name, capacity)            capacity None removes the limit
+#   close()
+# and a `snapshot_path` attribute (None to disable the startup cache) with a matching fingerprint() method.
+#
+# Several processes may share the same data. For that every backend also provides
+#   reading()                           context manager: no process writes while it is held
+#   writing()                           context manager: the same, for a write; other processes' changes
+#                                       are applied first and the backend's own writes may be nested in it
+#   mark_synced(fingerprint)            everything up to `fingerprint` (taken under reading()) is loaded
+#   refresh()                           pick up what other processes wrote since then
+# and an `on_changes` attribute: called with those changes, oldest first, as
+#   ("user", username, password, role, major)  ("course", course_name)  ("capacity", course_name, capacity)
+#   ("reset",)  (op, username, course, grade)
+# where "reset" means every enrollment is about to be replayed from scratch and a capacity of None removes
+# the limit. Writes catch up first.
+
+
+class StorageWriter:
+    # The single thread that persists changes. Callers queue writes and return immediately; the writer
+    # applies them in submission order, handing consecutive enroll/drop/grade events to the backend as
+    # one record_many batch (one journal append or one SQLite transaction).
+    def __init__(self, storage):
+        self.storage = storage
+        self._queue = queue.Queue()
+        # Events queued but not yet written, oldest first
+        self._pending = []
+        self._pending_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def record(self, op, username, course_name, grade=None):
+        event = (op, username, course_name, grade)
+        with self._pending_lock:
+            self._pending.append(event)
+            self._queue.put(("event", event))
+
+    def record_many(self, events):
+        # Written together in a single record_many call
+        events = list(events)
+        with self._pending_lock:
+            self._pending.extend(events)
+            self._queue.put(("events", events))
+
+    def pending_events(self):
+        with self._pending_lock:
+            return list(self._pending)
+
+    def _write_events(self, events):
+        self._write(self.storage.record_many, events)
+        with self._pending_lock:
+            del self._pending[:len(events)]
+
+    def call(self, fn, *args):
+        self._queue.put(("call", fn, args))
+
+    def run(self, fn, *args):
+        # Like call(), but waits for fn to run and returns its result or raises its exception. The caller
+        # must not hold a lock that on_changes takes, as the writer may be applying other processes' changes.
+        future = Future()
+
+        def run_fn():
+            try:
+                future.set_result(fn(*args))
+            except Exception as e:
+                future.set_exception(e)
+
+        self.call(run_fn)
+        return future.result()
+
+    def flush(self):
+        # Block until everything queued so far has been written
+        self._queue.join()
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    def _write(self, fn, *args):
+        try:
+            fn(*args)
+        except Exception as e:
+            print(f"[Warning] Failed to save changes: {e}")
+
+    def _run(self):
+        running = True
+        while running:
+            items = [self._queue.get()]
+            # Take everything else that is already waiting so it can be written together
+            while True:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            events = []
+            for item in items:
+                if item is None:
+                    running = False
+                elif item[0] == "event":
+                    events.append(item[1])
+                elif item[0] == "events":
+                    events.extend(item[1])
+                else:
+                    if events:
+                        self._write_events(events)
+                        events = []
+                    self._write(item[1], *item[2])
+            if events:
+                self._write_events(events)
+            for _ in items:
+                self._queue.task_done()
+
+
+class FileLock:
+    # Advisory lock on a file in the data directory, seen by every process that uses it: shared for
+    # reading, exclusive for writing. Windows has no shared file locks, so there readers lock exclusively.
+    # Not reentrant; TextFileStorage._locked() takes care of nesting within a process.
+    def __init__(self, path):
+        self.path = path
+
+    def acquire(self, shared=False, blocking=True):
+        # Returns the handle to pass to release(), or None if `blocking` is off and the lock is taken
+        file = open(self.path, "a+b")
+        try:
+            if self._lock(file, shared, blocking):
+                return file
+        except BaseException:
+            file.close()
+            raise
+        file.close()
+        return None
+
+    def release(self, file):
+        if fcntl is None:
+            file.seek(0)
+            msvcrt.locking(file.fileno(), msvcrt.LK_UNLCK, 1)
+        file.close()  # closing the file drops an flock
+
+    @staticmethod
+    def _lock(file, shared, blocking):
+        if fcntl is not None:
+            mode = fcntl.LOCK_SH if shared else fcntl.LOCK_EX
+            try:
+                fcntl.flock(file.fileno(), mode if blocking else mode | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return False
+            return True
+        while True:
+            file.seek(0)
+            try:
+                msvcrt.locking(file.fileno(), msvcrt.LK_NBLCK, 1)
+                return True
+            except OSError:
+                if not blocking:
+                    return False
+                time.sleep(0.005)
+
+
+class TextFileStorage:
+    # The original flat-file layout, with enrollment changes going to an append-only journal.
+    #
+    # Several processes can share one data directory. Writers hold LOCK_FILE exclusively, readers share it.
+    # account.txt, course_list.txt and the journal are only ever appended to, so each process remembers
+    # how far it has read them and refresh() reads just the lines other processes appended since.
+    # SEQUENCE_FILE tells it when a rotation or full rewrite has replaced the journal underneath it.
+    def __init__(self, directory="."):
+        self.directory = directory
+        # Parsed state is cached here and reused while the data files are unchanged (see snapshot_cache.py)
+        self.snapshot_path = self._path(SNAPSHOT_FILE)
+        self.on_changes = None
+        self._file_lock = FileLock(self._path(LOCK_FILE))
+        self._compact_lock = FileLock(self._path(COMPACT_LOCK_FILE))
+        # Only one thread of this process works on the files at a time; it also holds the file lock
+        self._journal_lock = threading.RLock()
+        self._lock_depth = 0
+        self._lock_handle = None
+        self._compaction = None  # background compaction thread, if one is running
+        # How far this process has read each append-only file, and the sequence it read them under
+        self._offsets = {ACCOUNT_FILE: 0, COURSE_FILE: 0, JOURNAL_FILE: 0}
+        self._sequence = (0, 0)
+        self._seen = None  # stat() of the files after the last read, so refresh() can skip unchanged files
+        # CAPACITY_FILE is rewritten rather than appended to, so changes are found by comparing with the last read
+        self._capacities = {}
+        self._capacity_version = None
+        # A leftover ".old" journal means a compaction was interrupted; loading reads it until it is folded in
+        with self._locked():
+            self._maybe_compact()
+
+    def _path(self, filename):
+        return os.path.join(self.directory, filename)
+
+    @contextmanager
+    def _locked(self, shared=False):
+        # Nested sections of the same thread keep the outer section's lock
+        with self._journal_lock:
+            if not self._lock_depth:
+                self._lock_handle = self._file_lock.acquire(shared)
+            self._lock_depth += 1
+            try:
+                yield
+            finally:
+                self._lock_depth -= 1
+                if not self._lock_depth:
+                    self._file_lock.release(self._lock_handle)
+                    self._lock_handle = None
+
+    def reading(self):
+        return self._locked(shared=True)
+
+    @contextmanager
+    def writing(self):
+        with self._locked():
+            self._catch_up()
+            yield
+
+    def load_courses(self):
+        try:
+            # Open the course list file in read-only mode and read its contents.
+            with open(self._path(COURSE_FILE), "r", encoding="utf-8") as file:
+                return [line.strip() for line in file if line.strip()]
+        except FileNotFoundError:
+            return []
+
+    def load_users(self):
+        try:
+            with open(self._path(ACCOUNT_FILE), "r", encoding="utf-8") as file:
+                for line in file:
+                    user = self._parse_user(line)
+                    if user:
+                        yield user
+        except FileNotFoundError:
+            pass
+
+    def load_capacities(self):
+        capacities = {}
+        try:
+            with open(self._path(CAPACITY_FILE), "r", encoding="utf-8") as file:
+                for line in file:
+                    course_name, _, capacity = line.strip().rpartition(",")
+                    if course_name and capacity.isdigit():
+                        capacities[course_name] = int(capacity)
+        except FileNotFoundError:
+            pass
+        return capacities
+
+    def save_capacity(self, course_name, capacity):
+        with self._locked():
+            self._catch_up()
+            capacities = self.load_capacities()
+            if capacity is None:
+                capacities.pop(course_name, None)
+            else:
+                capacities[course_name] = capacity
+            with open(self._path(CAPACITY_FILE + ".tmp"), "w", encoding="utf-8") as file:
+                for name, limit in capacities.items():
+                    file.write(f"{name},{limit}\n")
+            os.replace(self._path(CAPACITY_FILE + ".tmp"), self._path(CAPACITY_FILE))
+            self._capacities, self._capacity_version = capacities, self._stat_file(CAPACITY_FILE)
+            self._seen = self._stat()
+
+    def load_enrollments(self):
+        yield from self._snapshot_events()
+        yield from self._read_journal(JOURNAL_FILE + ".old")
+        yield from self._read_journal(JOURNAL_FILE)
+
+    def fingerprint(self):
+        # Changes whenever any data file is written: (name, mtime, size) of each, None if missing.
+        # It starts with the sequence so mark_synced() can take the sizes as read positions.
+        result = [self._read_sequence()]
+        for filename in (ACCOUNT_FILE, COURSE_FILE, ENROLLMENT_FILE, JOURNAL_FILE + ".old", JOURNAL_FILE):
+            try:
+                st = os.stat(self._path(filename))
+                result.append((filename, st.st_mtime_ns, st.st_size))
+            except FileNotFoundError:
+                result.append((filename, None))
+        return tuple(result)
+
+    def mark_synced(self, fingerprint):
+        sequence, *files = fingerprint
+        sizes = {entry[0]: entry[2] if entry[1] is not None else 0 for entry in files}
+        with self._journal_lock:
+            self._sequence = sequence
+            for filename in self._offsets:
+                self._offsets[filename] = sizes[filename]
+            self._capacity_version = self._stat_file(CAPACITY_FILE)
+            self._capacities = self.load_capacities()
+            self._seen = None
+
+    def refresh(self):
+        # Costs a few stat() calls when no other process has written anything
+        if self._stat() == self._seen:
+            return
+        with self._locked(shared=True):
+            self._catch_up()
+
+    def _stat(self):
+        return [self._stat_file(filename)
+                for filename in (SEQUENCE_FILE, ACCOUNT_FILE, COURSE_FILE, JOURNAL_FILE, CAPACITY_FILE)]
+
+    def _stat_file(self, filename):
+        try:
+            st = os.stat(self._path(filename))
+            return st.st_ino, st.st_mtime_ns, st.st_size
+        except FileNotFoundError:
+            return None
+
+    def _catch_up(self):
+        # With the file lock held: read what other processes wrote and hand it to on_changes
+        changes = self._read_changes()
+        self._seen = self._stat()
+        if changes and self.on_changes is not None:
+            self.on_changes(changes)
+
+    def _read_changes(self):
+        changes = []
+        lines, self._offsets[COURSE_FILE] = self._read_lines(COURSE_FILE, self._offsets[COURSE_FILE])
+        changes += [("course", line.strip()) for line in lines if line.strip()]
+        lines, self._offsets[ACCOUNT_FILE] = self._read_lines(ACCOUNT_FILE, self._offsets[ACCOUNT_FILE])
+        changes += [("user", *user) for user in map(self._parse_user, lines) if user]
+
+        rewrites, rotations = sequence = self._read_sequence()
+        if sequence == self._sequence:
+            lines, self._offsets[JOURNAL_FILE] = self._read_lines(JOURNAL_FILE, self._offsets[JOURNAL_FILE])
+        elif (rewrites, rotations - 1) == self._sequence and os.path.exists(self._path(JOURNAL_FILE + ".old")):
+            # Rotated once: finish the journal we were reading (now ".old"), then read the new one
+            lines, _ = self._read_lines(JOURNAL_FILE + ".old", self._offsets[JOURNAL_FILE])
+            new_lines, self._offsets[JOURNAL_FILE] = self._read_lines(JOURNAL_FILE)
+            lines += new_lines
+        else:
+            # Rewritten, or compacted past our position: replay every enrollment
+            changes.append(("reset",))
+            changes += self._snapshot_events()
+            lines, _ = self._read_lines(JOURNAL_FILE + ".old")
+            new_lines, self._offsets[JOURNAL_FILE] = self._read_lines(JOURNAL_FILE)
+            lines += new_lines
+        self._sequence = sequence
+        changes += [event for event in map(self._parse_event, lines) if event]
+        version = self._stat_file(CAPACITY_FILE)
+        if version != self._capacity_version:
+            capacities = self.load_capacities()
+            changes += [("capacity", course_name, capacities.get(course_name))
+                        for course_name in {**self._capacities, **capacities}
+                        if capacities.get(course_name) != self._capacities.get(course_name)]
+            self._capacities, self._capacity_version = capacities, version
+        return changes
+
+    def _read_lines(self, filename, offset=0):
+        # The complete lines after byte `offset`, and the offset just past them
+        try:
+            with open(self._path(filename), "rb") as file:
+                file.seek(offset)
+                data = file.read()
+        except FileNotFoundError:
+            return [], 0
+        end = data.rfind(b"\n") + 1
+        return data[:end].decode("utf-8").splitlines(), offset + end
+
+    def _read_sequence(self):
+        try:
+            with open(self._path(SEQUENCE_FILE), "r", encoding="utf-8") as file:
+                rewrites, rotations = file.read().split()
+                return int(rewrites), int(rotations)
+        except (FileNotFoundError, ValueError):
+            return 0, 0
+
+    def _write_sequence(self, sequence):
+        with open(self._path(SEQUENCE_FILE + ".tmp"), "w", encoding="utf-8") as file:
+            file.write(f"{sequence[0]} {sequence[1]}\n")
+        os.replace(self._path(SEQUENCE_FILE + ".tmp"), self._path(SEQUENCE_FILE))
+        self._sequence = sequence
+
+    @staticmethod
+    def _parse_user(line):
+        parts = line.strip().split(",")
+        # Check if a major is assigned to the student
+        if len(parts) >= 3:
+            return parts[0], parts[1], parts[2], parts[3] if len(parts) >= 4 else None
+        return None
+
+    @staticmethod
+    def _parse_event(line):
+        parts = line.rstrip("\r\n").split(",")
+        if len(parts) >= 3:
+            return parts[0], parts[1], parts[2], parts[3] if len(parts) >= 4 else None
+        return None
+
+    def _read_snapshot(self):
+        try:
+            with open(self._path(ENROLLMENT_FILE), "r", encoding="utf-8") as file:
+                for line in file:
+                    parts = line.strip().split(",")
+                    # Check if the line has enough parts to extract username, course name, and grade
+                    if len(parts) >= 2:
+                        yield parts[0], parts[1], parts[2] if len(parts) == 3 else None
+        except FileNotFoundError:
+            pass
+
+    def _snapshot_events(self):
+        for username, course_name, grade in self._read_snapshot():
+            yield "E", username, course_name, None
+            if grade:
+                yield "G", username, course_name, grade
+
+    def _read_journal(self, filename):
+        try:
+            with open(self._path(filename), "r", encoding="utf-8") as file:
+                for line in file:
+                    event = self._parse_event(line)
+                    if event:
+                        yield event
+        except FileNotFoundError:
+            pass
+
+    def _append(self, filename, lines):
+        # Other processes' lines are read first, so afterwards our position can skip past our own
+        with self._locked():
+            self._catch_up()
+            with open(self._path(filename), "ab") as file:
+                file.write("".join(lines).encode("utf-8"))
+                self._offsets[filename] = file.tell()
+            self._seen = self._stat()
+            return self._offsets[filename]
+
+    def add_user(self, username, password, role, major=None):
+        # If the user is a student, include their major in the account file
+        if role == "student":
+            line = f"{username},{password},{role},{major or ''}\n"
+        else:
+            # For instructors, just save username, password, and role
+            line = f"{username},{password},{role}\n"
+        self._append(ACCOUNT_FILE, [line])
+
+    def add_course(self, course_name):
+        self._append(COURSE_FILE, [course_name + "\n"])
+
+    def record(self, op, username, course_name, grade=None):
+        self.record_many([(op, username, course_name, grade)])
+
+    def record_many(self, events):
+        lines = [f"{op},{username},{course_name}" + (f",{grade}" if grade is not None else "") + "\n"
+                 for op, username, course_name, grade in events]
+        with self._locked():
+            size = self._append(JOURNAL_FILE, lines)
+            if size >= JOURNAL_COMPACT_BYTES and not os.path.exists(self._path(JOURNAL_FILE + ".old")):
+                # Rotate the journal so new events go to a fresh file while the snapshot is rebuilt
+                os.replace(self._path(JOURNAL_FILE), self._path(JOURNAL_FILE + ".old"))
+                self._write_sequence((self._sequence[0], self._sequence[1] + 1))
+                self._offsets[JOURNAL_FILE] = 0
+                self._seen = self._stat()
+            self._maybe_compact()
+
+    def _maybe_compact(self):
+        # With the file lock held: fold a ".old" journal into the snapshot unless some process already is
+        if self._compaction is not None or not os.path.exists(self._path(JOURNAL_FILE + ".old")):
+            return
+        handle = self._compact_lock.acquire(blocking=False)
+        if handle is None:
+            return
+        self._compaction = threading.Thread(target=self._background_compact, args=(handle, self._sequence[0]),
+                                            daemon=True)
+        self._compaction.start()
+
+    def _compacted_rows(self):
+        enrollments = {}  # username -> {course: grade}, both in first-seen order
+        for username, course_name, grade in self._read_snapshot():
+            enrollments.setdefault(username, {})[course_name] = grade
+        for op, username, course_name, grade in self._read_journal(JOURNAL_FILE + ".old"):
+            courses = enrollments.setdefault(username, {})
+            if op == "E":
+                courses.setdefault(course_name, None)
+            elif op == "D":
+                courses.pop(course_name, None)
+            elif op == "G" and course_name in courses:
+                courses[course_name] = grade
+        return ((u, c, g) for u, courses in enrollments.items() for c, g in courses.items())
+
+    def _background_compact(self, handle, rewrites):
+        # The merge runs without the file lock, so other processes keep writing to the new journal
+        tmp = ENROLLMENT_FILE + ".compact.tmp"
+        try:
+            self._write_rows(tmp, self._compacted_rows())
+            with self._locked():
+                # A full rewrite since we started has already folded in (and removed) the ".old" journal
+                if self._read_sequence()[0] == rewrites and os.path.exists(self._path(JOURNAL_FILE + ".old")):
+                    os.replace(self._path(tmp), self._path(ENROLLMENT_FILE))
+                    os.remove(self._path(JOURNAL_FILE + ".old"))
+                else:
+                    os.remove(self._path(tmp))
+        except Exception as e:
+            print(f"[Warning] Failed to compact the enrollment journal: {e}")
+        finally:
+            self._compact_lock.release(handle)
+            with self._journal_lock:
+                self._compaction = None
+
+    def _write_rows(self, filename, rows):
+        with open(self._path(filename), "w", encoding="utf-8") as file:
+            for username, course_name, grade in rows:
+                # If the student has a grade for the course, include it in the line
+                file.write(f"{username},{course_name}" + (f",{grade}" if grade is not None else "") + "\n")
+
+    def wait_for_compaction(self):
+        compaction = self._compaction
+        if compaction is not None:
+            compaction.join()
+
+    def save_enrollments(self, rows):
+        # Other processes' changes are applied first, so `rows` (usually read from memory) include them
+        with self._locked():
+            self._catch_up()
+            # Write to a temporary file first so a crash never leaves a half-written snapshot behind
+            self._write_rows(ENROLLMENT_FILE + ".tmp", rows)
+            os.replace(self._path(ENROLLMENT_FILE + ".tmp"), self._path(ENROLLMENT_FILE))
+            for filename in (JOURNAL_FILE, JOURNAL_FILE + ".old"):
+                if os.path.exists(self._path(filename)):
+                    os.remove(self._path(filename))
+            self._write_sequence((self._sequence[0] + 1, self._sequence[1]))
+            self._offsets[JOURNAL_FILE] = 0
+            self._seen = self._stat()
+
+    def close(self):
+        # Every change is already in the journal; just let a running compaction finish
+        self.wait_for_compaction()
+
+
+class _ThreadConnection:
+    # A thread's connection, held in its thread-local data. The thread-local data is dropped when the thread
+    # ends, and then the finalizer set up in SQLiteStorage._connection() closes the connection.
+    def __init__(self, conn):
+        self.conn = conn
+
+
+def _close_connection(connections, lock, key, conn):
+    with lock:
+        connections.pop(key, None)
+    conn.close()
+
+
+class SQLiteStorage:
+    # Users, courses and enrollments in one SQLite database in WAL mode, so readers never block the writer.
+    # Each thread gets its own connection, closed when the thread ends; sqlite3 caches the compiled form of
+    # the constant SQL below. CourseManager still loads every user and enrollment at start (users and
+    # enrollments are not looked up here on demand); what SQLite saves is the full rewrites of the text
+    # files, each change being one small transaction.
+    #
+    # Every write also appends to the `changes` table, which other processes read from the last seq
+    # they saw. Old rows are pruned; a process that falls further behind than that reloads everything.
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS users (
+            username TEXT PRIMARY KEY,
+            password TEXT NOT NULL,
+            role     TEXT NOT NULL,
+            major    TEXT
+        );
+        CREATE TABLE IF NOT EXISTS courses (
+            id   INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE
+        );
+        CREATE TABLE IF NOT EXISTS enrollments (
+            id       INTEGER PRIMARY KEY,
+            username TEXT NOT NULL,
+            course   TEXT NOT NULL,
+            grade    TEXT,
+            UNIQUE (username, course)
+        );
+        CREATE TABLE IF NOT EXISTS changes (
+            seq  INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            a TEXT, b TEXT, c TEXT, d TEXT
+        );
+        CREATE TABLE IF NOT EXISTS capacities (
+            course   TEXT PRIMARY KEY,
+            capacity INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS meta (
+            key   TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        );
+    """
+    ENROLL_SQL = "INSERT OR IGNORE INTO enrollments (username, course) VALUES (?, ?)"
+    DROP_SQL = "DELETE FROM enrollments WHERE username = ? AND course = ?"
+    GRADE_SQL = "UPDATE enrollments SET grade = ? WHERE username = ? AND course = ?"
+    CHANGE_SQL = "INSERT INTO changes (kind, a, b, c, d) VALUES (?, ?, ?, ?, ?)"
+    # (full rewrites, last change seq); sqlite_sequence keeps the last seq even after pruning
+    STATE_SQL = ("SELECT COALESCE((SELECT value FROM meta WHERE key = 'rewrites'), 0),"
+                 " COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'changes'), 0)")
+    # Change rows kept for processes that are behind
+    CHANGE_LOG_SIZE = 10000
+
+    def __init__(self, path):
+        self.path = path
+        self.snapshot_path = None  # loading from SQLite needs no parse cache
+        self.on_changes = None
+        self._local = threading.local()
+        self._connections = {}  # id of a _ThreadConnection -> its connection, for close()
+        self._connections_lock = threading.Lock()
+        self._lock = threading.RLock()  # one thread of this process reads or writes changes at a time
+        self._state = (0, 0)            # STATE_SQL as of the last read
+        self._capacities = {}           # the capacities table as of the last read, to tell what a reload changed
+        conn = self._connection()
+        conn.executescript(self.SCHEMA)
+
+    def _connection(self):
+        holder = getattr(self._local, "holder", None)
+        if holder is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # In WAL mode NORMAL is still crash-safe for the database, and avoids an fsync per commit
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            holder = self._local.holder = _ThreadConnection(conn)
+            with self._connections_lock:
+                self._connections[id(holder)] = conn
+            weakref.finalize(holder, _close_connection, self._connections, self._connections_lock, id(holder), conn)
+        return holder.conn
+
+    @contextmanager
+    def reading(self):
+        # One read transaction, so every load sees the same version of the database
+        with self._lock:
+            conn = self._connection()
+            if conn.in_transaction:
+                yield
+                return
+            conn.execute("BEGIN")
+            try:
+                yield
+            finally:
+                conn.commit()
+
+    def fingerprint(self):
+        return self._connection().execute(self.STATE_SQL).fetchone()
+
+    def mark_synced(self, fingerprint):
+        with self._lock:
+            self._state = tuple(fingerprint)
+            self._capacities = self.load_capacities()
+
+    def refresh(self):
+        # One indexed query when no other process has written anything
+        if self._connection().execute(self.STATE_SQL).fetchone() == self._state:
+            return
+        with self.reading():
+            self._catch_up(self._connection())
+
+    def _catch_up(self, conn):
+        changes = self._read_changes(conn)
+        if changes and self.on_changes is not None:
+            self.on_changes(changes)
+
+    def _read_changes(self, conn):
+        state = conn.execute(self.STATE_SQL).fetchone()
+        if state == self._state:
+            return []
+        rows = conn.execute("SELECT seq, kind, a, b, c, d FROM changes WHERE seq > ? ORDER BY seq",
+                            (self._state[1],)).fetchall()
+        if state[0] != self._state[0] or not rows or rows[0][0] != self._state[1] + 1:
+            # Rewritten, or the rows we need were pruned: replay everything
+            changes = [("reset",)]
+            changes += [("course", name) for name in self.load_courses()]
+            changes += [("user", *user) for user in self.load_users()]
+            changes += self.load_enrollments()
+            capacities = self.load_capacities()
+            changes += [("capacity", course_name, capacities.get(course_name))
+                        for course_name in {**self._capacities, **capacities}
+                        if capacities.get(course_name) != self._capacities.get(course_name)]
+            self._capacities = capacities
+        else:
+            changes = []
+            for seq, kind, a, b, c, d in rows:
+                if kind == "user":
+                    changes.append(("user", a, b, c, d))
+                elif kind == "course":
+                    changes.append(("course", a))
+                elif kind == "capacity":
+                    capacity = int(b) if b is not None else None
+                    changes.append(("capacity", a, capacity))
+                    if capacity is None:
+                        self._capacities.pop(a, None)
+                    else:
+                        self._capacities[a] = capacity
+                else:
+                    changes.append((kind, a, b, c))
+        self._state = state
+        return changes
+
+    def writing(self):
+        return self._writing()
+
+    @contextmanager
+    def _writing(self):
+        # One write transaction that starts by applying what other processes wrote before it.
+        # Writes made inside another write of the same thread are part of its transaction.
+        with self._lock:
+            conn = self._connection()
+            if getattr(self._local, "writing", False):
+                yield conn
+                return
+            conn.execute("BEGIN IMMEDIATE")
+            self._local.writing = True
+            try:
+                self._catch_up(conn)
+                yield conn
+                conn.execute("DELETE FROM changes WHERE seq <= (SELECT seq FROM sqlite_sequence"
+                             " WHERE name = 'changes') - ?", (self.CHANGE_LOG_SIZE,))
+                state = conn.execute(self.STATE_SQL).fetchone()
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+            finally:
+                self._local.writing = False
+            self._state = state
+
+    def load_courses(self):
+        return [name for (name,) in self._connection().execute("SELECT name FROM courses ORDER BY id")]
+
+    def load_users(self):
+        return self._connection().execute("SELECT username, password, role, major FROM users ORDER BY rowid")
+
+    def load_capacities(self):
+        return dict(self._connection().execute("SELECT course, capacity FROM capacities"))
+
+    def save_capacity(self, course_name, capacity):
+        with self._writing() as conn:
+            if capacity is None:
+                conn.execute("DELETE FROM capacities WHERE course = ?", (course_name,))
+                self._capacities.pop(course_name, None)
+            else:
+                conn.execute("INSERT OR REPLACE INTO capacities (course, capacity) VALUES (?, ?)",
+                             (course_name, capacity))
+                self._capacities[course_name] = capacity
+            conn.execute(self.CHANGE_SQL, ("capacity", course_name, capacity, None, None))
+
+    def load_enrollments(self):
+        for username, course_name, grade in self._connection().execute(
+                "SELECT username, course, grade FROM enrollments ORDER BY id"):
+            yield "E", username, course_name, None
+            if grade is not None:
+                yield "G", username, course_name, grade
+
+    def add_user(self, username, password, role, major=None):
+        self.add_users([(username, password, role, major)])
+
+    def add_users(self, users):
+        users = list(users)
+        with self._writing() as conn:
+            conn.executemany("INSERT OR IGNORE INTO users (username, password, role, major) VALUES (?, ?, ?, ?)",
+                             users)
+            conn.executemany(self.CHANGE_SQL, (("user", *user) for user in users))
+
+    def add_course(self, course_name):
+        self.add_courses([course_name])
+
+    def add_courses(self, course_names):
+        course_names = list(course_names)
+        with self._writing() as conn:
+            conn.executemany("INSERT OR IGNORE INTO courses (name) VALUES (?)", ((c,) for c in course_names))
+            conn.executemany(self.CHANGE_SQL, (("course", c, None, None, None) for c in course_names))
+
+    def record(self, op, username, course_name, grade=None):
+        self.record_many([(op, username, course_name, grade)])
+
+    def record_many(self, events):
+        # One transaction per batch
+        with self._writing() as conn:
+            for op, username, course_name, grade in events:
+                if op == "E":
+                    conn.execute(self.ENROLL_SQL, (username, course_name))
+                elif op == "D":
+                    conn.execute(self.DROP_SQL, (username, course_name))
+                elif op == "G":
+                    conn.execute(self.GRADE_SQL, (grade, username, course_name))
+            conn.executemany(self.CHANGE_SQL, ((*event, None) for event in events))
+
+    def save_enrollments(self, rows):
+        # Other processes' changes are applied first, so `rows` (usually read from memory) include them.
+        # Their change rows are dropped with the rewrite, which tells every other process to reload.
+        with self._writing() as conn:
+            conn.execute("DELETE FROM enrollments")
+            conn.executemany("INSERT OR IGNORE INTO enrollments (username, course, grade) VALUES (?, ?, ?)", rows)
+            conn.execute("DELETE FROM changes")
+            conn.execute("INSERT INTO meta (key, value) VALUES ('rewrites', 1)"
+                         " ON CONFLICT (key) DO UPDATE SET value = value + 1")
+
+    def close(self):
+        with self._connections_lock:
+            for conn in self._connections.values():
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
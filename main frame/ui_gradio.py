@@ -1,19 +1,29 @@
+import atexit
+import tempfile
 import gradio as gr
 from course_manager import CourseManager
-from data_models import Student, Instructor
-from utils import write_log, send_enrollment_email, send_grade_email, ask_ai_question
+from utils import (write_log, send_enrollment_email, send_grade_email, send_grade_emails, read_enrollment_csv,
+                   grade_email_messages, stream_ai_question, ai_cache_stats, ai_scheduler_stats, answer_from_plan)
+from response_cache import context_key
+from prompt_builder import build_advice_prompt
+from model_manager import get_model_manager
 
 # Security Password Constants (Consistent with those in CLI)
 SECURITY_PASSWORD = "smartcourse12345"
 
 # Initialize the course manager (load the course list, accounts, course selection records, etc.)
 manager = CourseManager()
+atexit.register(manager.close)  # save the writes still queued when the server stops
 
 
 # Predefined List (Used for Dropdown Options)
 ALLOWED_MAJORS = ["cps", "acct", "math"]
 ALLOWED_GRADES = ["A", "A-", "B+", "B", "B-", "C+", "C", "D", "F"]
 
+# The "Ask AI" buttons say when the model is still being loaded; checked this often (seconds) until it is ready
+MODEL_POLL_SECONDS = 3
+MODEL_STATE_NOTES = {"cold": " (⏳ warming up...)", "warming": " (⏳ warming up...)", "failed": " (⚠ AI model unavailable)"}
+
 # Gradio Interface Construction
 with gr.Blocks(css=""" 
 /* Custom styles to enhance readability */
@@ -26,6 +36,7 @@ with gr.Blocks(css="""
     # State Storage: Current Logged-In User and Role
     state_username = gr.State(value="")
     state_role = gr.State(value="")  # "student" or "instructor", will be empty when not logged in
+    model_timer = gr.Timer(MODEL_POLL_SECONDS)
 
     # Main Menu Interface
     with gr.Column(visible=True) as main_menu:
@@ -101,6 +112,8 @@ with gr.Blocks(css="""
         inst_menu_msg = gr.Markdown("", visible=False)
         inst_view = gr.Button("View Student Courses")
         inst_assign = gr.Button("Assign Grade")
+        inst_roster = gr.Button("Course Rosters")
+        inst_bulk = gr.Button("Import/Export CSV")
         inst_exit = gr.Button("Logout")
 
         # View Sub-Interface of Student Courses
@@ -124,6 +137,9 @@ with gr.Blocks(css="""
             lines = [f"- **{c}** Grade: {grade if grade else 'Not assigned'}"
                      for c, grade in courses.items()]
             content = f"**{student_name} the course：**\n\n" + "\n".join(lines)
+            progress = manager.plan_progress(student_name)
+            if progress:
+                content += f"\n\n*Plan progress: {progress.summary()}*"
             return gr.update(value=content, visible=True)
 
 
@@ -143,6 +159,27 @@ with gr.Blocks(css="""
             assign_grade_btn = gr.Button("submit grades", visible=False)
             assign_status = gr.Markdown("", visible=False)
 
+        # Course Roster Sub-interface
+        with gr.Column(visible=False) as inst_roster_section:
+            gr.Markdown("**Course roster:** who is enrolled in a course, and its class-size limit.")
+            roster_course_select = gr.Dropdown(label="Select course", choices=[], interactive=True)
+            roster_view_btn = gr.Button("View roster")
+            roster_text = gr.Markdown("", visible=False)
+            roster_capacity = gr.Number(label="Class-size limit (0 = no limit)", value=0, precision=0)
+            roster_capacity_btn = gr.Button("Set limit")
+
+        # Bulk Import/Export Sub-interface
+        with gr.Column(visible=False) as inst_bulk_section:
+            gr.Markdown("**Bulk import:** upload a CSV with one `username,course[,grade]` row per line. "
+                        "The whole file is checked first; if any row is invalid nothing is imported.")
+            bulk_action = gr.Radio(["enroll", "drop", "grade"], label="action", value="grade")
+            bulk_file = gr.File(label="CSV file", file_types=[".csv"])
+            bulk_import_btn = gr.Button("Import")
+            bulk_status = gr.Markdown("", visible=False)
+            gr.Markdown("**Export:** download every enrollment as CSV.")
+            bulk_export_btn = gr.Button("Export enrollments")
+            bulk_export_file = gr.File(label="enrollments.csv", visible=False)
+
 
     ### Definition of Event Handling Function ###
 
@@ -183,8 +220,8 @@ with gr.Blocks(css="""
 
     # Main Menu Button Event: Exit System
     def on_main_exit():
-        # Keep all the modification records (just in case)
-        manager.save_enrollments()
+        # The app keeps serving other sessions, so only wait for queued changes to be written
+        manager.flush()
         # Display "Goodbye" and disable other components (by hiding the buttons)
         return ("**Exit the System, Goodbye!**",  # Display "Goodbye" in the message area of the main menu.
                 gr.update(visible=True),  # Main menu message visible
@@ -221,9 +258,7 @@ with gr.Blocks(css="""
         elif role == "instructor" and security != SECURITY_PASSWORD:
             error_msg = "⚠ The security registration code is incorrect, so the teacher account cannot be created."
         else:
-            user_exists = (manager.get_student_by_username(username) is not None) or any(
-                inst.username == username for inst in manager.instructors)
-            if user_exists:
+            if manager.user_exists(username):
                 error_msg = "⚠ This username has already been registered. Please change your email address."
         if error_msg:
             # If there is an error, return the error message and keep the registration interface visible
@@ -236,12 +271,9 @@ with gr.Blocks(css="""
             # Check if the major is valid
             if (major or "").strip().lower() not in ALLOWED_MAJORS:
                 return (gr.update(value='⚠ The information for this major is incorrect. Only "cps", "acct" and "math" are supported.', visible=True))
-            # Create a new student account
-            manager.students.append(Student(username, password, major.strip().lower()))
-        else:
-            manager.instructors.append(Instructor(username, password))
-        # Write the new account to the data file
-        manager.create_account(username, password, is_student)
+            major = major.strip().lower()
+        # Create the account (indexed by username) and write it to the data file
+        manager.create_account(username, password, is_student, major if is_student else None)
         write_log(f"Created new account: {username}")
         # Send registration success email
         success_message = f"✅ Account {username} has been created. Please log in."
@@ -270,6 +302,8 @@ with gr.Blocks(css="""
             is_student = manager.is_student_account(username)
             if manager.authenticate_user(username, password, is_student):
                 write_log(f"{username} logged in")
+                if is_student:
+                    get_model_manager().user_active(username)  # keep the model loaded while logged in
                 welcome = f"Welcome, {username}!"
                 user_role = "student" if is_student else "instructor"
             else:
@@ -363,18 +397,29 @@ with gr.Blocks(css="""
                              stud_enroll_section, stud_view_section, stud_drop_section, stud_ask_section])
 
 
+    # Model state: "warming up" on the Ask AI buttons until the model is loaded
+    def on_model_state():
+        state = get_model_manager().state
+        note = MODEL_STATE_NOTES.get(state, "")
+        return (gr.update(value="Ask AI for Advice" + note), gr.update(value="Question AI" + note),
+                gr.Timer(active=state != "ready"))  # no more polling once it is ready
+
+
+    model_timer.tick(on_model_state, inputs=None, outputs=[stud_ask, ask_submit_btn, model_timer])
+
+
     # Student Menu Button Event: Ask AI
     def on_stud_ask():
         # Open the question area and clear the previous answer
         return (gr.update(visible=False), gr.update(visible=False), gr.update(visible=False), gr.update(visible=True),
                 "",  
-                gr.update(value="", visible=False))  
+                gr.update(value="", visible=False)) + on_model_state()
 
 
     stud_ask.click(on_stud_ask,
                    inputs=None,
                    outputs=[stud_enroll_section, stud_view_section, stud_drop_section, stud_ask_section,
-                            ask_question, ask_response])
+                            ask_question, ask_response, stud_ask, ask_submit_btn, model_timer])
 
 
     # Student Course Selection: Search for Courses Event
@@ -399,12 +444,13 @@ with gr.Blocks(css="""
     def on_enroll_course(username, course_name):
         if not course_name:
             return gr.update(value="⚠ Please select the courses before submitting.", visible=True)
-        if course_name not in manager.courses:
+        if not manager.has_course(course_name):
             return gr.update(value="⚠ The course is ineffective. Please choose another one.", visible=True)
         enrolled = manager.get_student_courses(username)
         if course_name in enrolled:
             return gr.update(value="⚠ You have already selected this course.", visible=True)
-        manager.enroll_student(username, course_name)
+        if not manager.enroll_student(username, course_name):
+            return gr.update(value="⚠ Sorry, this course is full.", visible=True)
         write_log(f"{username} enrolled in {course_name}")
         email_body = (f"Dear {username},\n\n"
                       f"Congratulations! You have successfully enrolled in the course: {course_name}. "
@@ -467,42 +513,77 @@ with gr.Blocks(css="""
 
 
     # Student's Question for AI: Submitting an Event
-    def on_ask_submit(username, question):
+    async def on_ask_submit(username, question):
+        # An async generator: the Markdown is updated while the question waits for the model and as the
+        # reply streams in, without holding a worker thread. The scheduler limits how many run at once.
         if not question or question.strip() == "":
-            return gr.update(value="⚠ Please enter a question first.", visible=True)
+            yield gr.update(value="⚠ Please enter a question first.", visible=True)
+            return
         # Building AI Prompt
         courses = manager.get_student_courses(username)
         course_info_lines = [f"{c} - {('Not assigned' if grade is None else grade)}" for c, grade in courses.items()]
         course_info = "\n".join(course_info_lines)
         student = manager.get_student_by_username(username)
-        plan_text = ""
-        if student and student.major:
-            plan_file = f"{student.major}_plan.txt"
-            try:
-                with open(plan_file, "r", encoding="utf-8") as f:
-                    plan_text = f.read()
-            except FileNotFoundError:
-                plan_text = ""
-                no_plan_note = f"*No major plan found for {student.major}.*\n\n"
-            else:
-                no_plan_note = ""
+        # Where the student stands in the plan is kept current by the manager; no file to read here
+        progress = manager.plan_progress(username)
+        plan_text = progress.plan.text if progress else None
+        if progress is None and student and student.major:
+            note = f"*No major plan found for {student.major}.*\n\n"
         else:
-            no_plan_note = ""
-        prompt = (f'I am a student asking the following academic question:\n"{question}"\n'
-                  f'My current course history:\n{course_info}\n'
-                  f'Here is the four-year plan for my major:\n{plan_text}\n'
-                  f'Based on my question, my course history, and the plan above, give me a suggestion.')
-
-        reply, latency = ask_ai_question(prompt)
-        advice_header = f"**AI ADVICE** (⏱ {latency:.1f}s)\n\n"
-
-        response_text = (no_plan_note if 'no_plan_note' in locals() else "") + reply.strip()
-        return gr.update(value=advice_header + response_text, visible=True)
+            note = ""
+        # Common questions (what next, what is left, what to retake) are answered from the plan right away
+        fast = answer_from_plan(question, courses, plan_text, progress)
+        if fast is not None:
+            reply, latency = fast
+            yield gr.update(value=f"**AI ADVICE** (⚡ answered from your plan and transcript in {latency * 1000:.1f} ms)"
+                                  "\n\n" + note + reply.replace("\n", "  \n"), visible=True)
+            return
+        # Only the part of the plan still to do and a summary of the transcript, within the token budget
+        prompt = build_advice_prompt(question, courses, plan_text, progress=progress)
+
+        model = get_model_manager()
+        model.user_active(username)
+        if model.ready:
+            yield gr.update(value="**AI ADVICE** (⏳ thinking...)\n\n" + note, visible=True)
+        else:
+            yield gr.update(value="**AI ADVICE** (⏳ the AI model is warming up, the first answer takes a little "
+                                  "longer...)\n\n" + note, visible=True)
+        stream = stream_ai_question(prompt, username, context_key(course_info, plan_text or ""), question)
+        reply = ""
+        async for event in stream.aevents():
+            if event[0] == "queued":
+                _, position, eta = event
+                yield gr.update(value=f"**AI ADVICE** (⏳ waiting for the model: number {position} in line, "
+                                      f"about {eta:.0f}s)\n\n" + note, visible=True)
+                continue
+            reply += event[1]
+            yield gr.update(value="**AI ADVICE** (⏳ writing...)\n\n" + note + reply, visible=True)
+        if stream.busy:
+            yield gr.update(value="**AI ADVICE**\n\n⚠ " + stream.reply, visible=True)
+            return
+        if stream.cached:
+            stats = ai_cache_stats()
+            advice_header = (f"**AI ADVICE** (⚡ cached answer · cache hits {stats['hits'] + stats['similar_hits']}, "
+                             f"misses {stats['misses']})\n\n")
+            if stream.similar_to:
+                advice_header += f"*Answer to your similar question: \"{stream.similar_to}\"*\n\n"
+        else:
+            advice_header = (f"**AI ADVICE** (⏱ first words {stream.ttft:.1f}s, total {stream.latency:.1f}s"
+                             + (", including loading the model)\n\n" if stream.cold else ")\n\n"))
+            if stream.shared:
+                advice_header += (f"*Answered together with the same question asked at the same time "
+                                  f"({ai_scheduler_stats()['coalesced']} model calls saved so far).*\n\n")
+        yield gr.update(value=advice_header + note + stream.reply, visible=True)
 
 
-    ask_submit_btn.click(on_ask_submit,
-                         inputs=[state_username, ask_question],
-                         outputs=[ask_response])
+    # No Gradio concurrency limit here: the scheduler queues the questions fairly per student and reports the position
+    ask_event = ask_submit_btn.click(on_ask_submit,
+                                     inputs=[state_username, ask_question],
+                                     outputs=[ask_response],
+                                     concurrency_limit=None)
+    # Leaving the question screen withdraws a question that is still waiting or being answered
+    for button in (stud_enroll, stud_view, stud_drop, stud_ask, stud_exit):
+        button.click(None, None, None, cancels=[ask_event])
 
 
     # Teacher Menu: "View Student Courses" Button Event
@@ -528,6 +609,8 @@ with gr.Blocks(css="""
             assign_status  
         ]
     )
+    inst_view.click(lambda: (gr.update(visible=False), gr.update(visible=False)),
+                    inputs=None, outputs=[inst_bulk_section, inst_roster_section])
 
 
     # Teacher Menu: Register Grades Button Event
@@ -547,6 +630,118 @@ with gr.Blocks(css="""
                       inputs=None,
                       outputs=[assign_student_select, assign_course_select, assign_grade_select, assign_grade_btn,
                                assign_status, inst_view_section, inst_assign_section])
+    inst_assign.click(lambda: (gr.update(visible=False), gr.update(visible=False)),
+                      inputs=None, outputs=[inst_bulk_section, inst_roster_section])
+
+
+    # Teacher Menu: Course Rosters Button Event
+    def on_inst_roster():
+        return (gr.update(choices=manager.search_courses(""), value=None),
+                gr.update(value="", visible=False),
+                gr.update(visible=False), gr.update(visible=False), gr.update(visible=False),
+                gr.update(visible=True))
+
+
+    inst_roster.click(on_inst_roster,
+                      inputs=None,
+                      outputs=[roster_course_select, roster_text, inst_view_section, inst_assign_section,
+                               inst_bulk_section, inst_roster_section])
+
+
+    # Teacher: View Roster Event
+    def on_view_roster(course_name):
+        if not course_name:
+            return gr.update(value="⚠ Please select a course.", visible=True), gr.update()
+        roster = manager.get_course_roster(course_name)
+        capacity = manager.course_capacity(course_name)
+        header = f"**{course_name}**: {len(roster)} enrolled" + (f" of {capacity}" if capacity is not None else "")
+        lines = [f"- {student_name} Grade: {grade if grade else 'Not assigned'}" for student_name, grade in roster]
+        content = header + "\n\n" + ("\n".join(lines) if lines else "*(No students enrolled yet.)*")
+        return gr.update(value=content, visible=True), gr.update(value=capacity or 0)
+
+
+    roster_view_btn.click(on_view_roster,
+                          inputs=roster_course_select,
+                          outputs=[roster_text, roster_capacity])
+    roster_course_select.change(on_view_roster,
+                                inputs=roster_course_select,
+                                outputs=[roster_text, roster_capacity])
+
+
+    # Teacher: Set Class-Size Limit Event
+    def on_set_capacity(course_name, capacity):
+        if not course_name:
+            return gr.update(value="⚠ Please select a course.", visible=True), gr.update()
+        capacity = int(capacity or 0)
+        if capacity < 0:
+            return gr.update(value="⚠ The limit cannot be negative.", visible=True), gr.update()
+        manager.set_course_capacity(course_name, capacity or None)
+        write_log(f"Set the class-size limit of {course_name} to {capacity or 'unlimited'}")
+        return on_view_roster(course_name)
+
+
+    roster_capacity_btn.click(on_set_capacity,
+                              inputs=[roster_course_select, roster_capacity],
+                              outputs=[roster_text, roster_capacity])
+
+
+    # Teacher Menu: Import/Export CSV Button Event
+    def on_inst_bulk():
+        return (gr.update(visible=False), gr.update(visible=False), gr.update(visible=False), gr.update(visible=True),
+                gr.update(value=None), gr.update(value="", visible=False), gr.update(value=None, visible=False))
+
+
+    inst_bulk.click(on_inst_bulk,
+                    inputs=None,
+                    outputs=[inst_view_section, inst_assign_section, inst_roster_section, inst_bulk_section,
+                             bulk_file, bulk_status, bulk_export_file])
+
+
+    # Teacher: Bulk Import Event
+    def on_bulk_import(action, file):
+        if file is None:
+            return gr.update(value="⚠ Please upload a CSV file first.", visible=True)
+        # Depending on the Gradio version the upload is a path or a temp-file object
+        path = getattr(file, "name", file)
+        try:
+            with open(path, "r", encoding="utf-8", newline="") as f:
+                rows = list(read_enrollment_csv(f))
+        except (OSError, UnicodeDecodeError) as e:
+            return gr.update(value=f"⚠ Could not read the file: {e}", visible=True)
+        bulk = {"enroll": manager.bulk_enroll, "drop": manager.bulk_drop, "grade": manager.bulk_grade}[action]
+        applied, errors = bulk(rows)
+        if errors:
+            shown = "\n".join(f"- {error}" for error in errors[:20])
+            more = f"\n- ... and {len(errors) - 20} more" if len(errors) > 20 else ""
+            return gr.update(value=f"⚠ Nothing was imported; {len(errors)} invalid row(s):\n\n{shown}{more}",
+                             visible=True)
+        write_log(f"Bulk {action} from upload: {len(applied)} change(s)")
+        if action == "grade" and applied:
+            # One email per student rather than one per grade, for the grades that actually changed
+            try:
+                send_grade_emails(grade_email_messages(applied))
+            except Exception as e:
+                print(f"[Warning] Failed to send grade emails: {e}")
+        return gr.update(value=f"✅ Imported {len(rows)} row(s): {len(applied)} change(s) applied.", visible=True)
+
+
+    bulk_import_btn.click(on_bulk_import,
+                          inputs=[bulk_action, bulk_file],
+                          outputs=[bulk_status])
+
+
+    # Teacher: Export Event
+    def on_bulk_export():
+        with tempfile.NamedTemporaryFile("w", encoding="utf-8", newline="", prefix="enrollments_",
+                                         suffix=".csv", delete=False) as f:
+            count = manager.export_enrollments(f)
+        write_log(f"Exported {count} enrollments")
+        return gr.update(value=f.name, visible=True)
+
+
+    bulk_export_btn.click(on_bulk_export,
+                          inputs=None,
+                          outputs=[bulk_export_file])
 
 
     # Teacher: Event to display course list after selecting students
@@ -608,10 +803,9 @@ with gr.Blocks(css="""
 
 
     # Student/Teacher Logout Event (Both buttons can use the same function)
-    def on_logout():
-        
-        manager.save_enrollments()
-        
+    def on_logout(username):
+        # Nothing to save here: enroll/drop/grade changes are journaled as they happen
+        get_model_manager().user_left(username)
         return ("", "",  
                 gr.update(visible=False), gr.update(visible=False),  
                 gr.update(visible=True), 
@@ -619,12 +813,13 @@ with gr.Blocks(css="""
 
 
     stud_exit.click(on_logout,
-                    inputs=None,
+                    inputs=state_username,
                     outputs=[state_username, state_role, student_frame, instructor_frame, main_menu, main_menu_msg])
     inst_exit.click(on_logout,
-                    inputs=None,
+                    inputs=state_username,
                     outputs=[state_username, state_role, student_frame, instructor_frame, main_menu, main_menu_msg])
 
 
 if __name__ == "__main__":
+    get_model_manager().start()  # load the model in the background while the page is opened
     demo.launch()
@@ -1,8 +1,12 @@
 from datetime import datetime
 import smtplib
 from email.message import EmailMessage
-import requests
-import time, csv, os               
+import time, csv, os
+from llm_client import get_client
+from response_cache import get_cache, cache_key
+from llm_scheduler import get_scheduler, SchedulerBusy
+from model_manager import get_model_manager
+from recommender import fast_answer
 
 def write_log(message):
     with open("log.txt", "a", encoding="utf-8") as file:
@@ -44,33 +48,294 @@ def send_grade_email(to_email, message_body):
     smtp.send_message(msg)
     smtp.quit()
 
+def send_grade_emails(messages):
+    # One SMTP session for a whole batch of (to_email, message_body) pairs, e.g. after a bulk grade import
+    smtp_server = "smtp.qq.com"
+    smtp_port   = 587
+    sender_email    = "your_email_address"
+    sender_password = "your_smtp_authorisation_code"
+
+    smtp = smtplib.SMTP(smtp_server, smtp_port)
+    smtp.starttls()
+    smtp.login(sender_email, sender_password)
+    try:
+        for to_email, message_body in messages:
+            msg = EmailMessage()
+            msg['Subject'] = 'SmartCourse Grading Notification'
+            msg['From']    = sender_email
+            msg['To']      = to_email
+            msg.set_content(message_body)
+            smtp.send_message(msg)
+    finally:
+        smtp.quit()
+
+
+def read_enrollment_csv(file):
+    """
+    Yields (username, course, grade) rows from a CSV file object, as written by
+    CourseManager.export_enrollments. The header row and blank lines are skipped;
+    grade is "" when the column is missing.
+    """
+    for row in csv.reader(file):
+        if not row or not "".join(row).strip():
+            continue
+        if row[0].strip().lower() == "username":
+            continue
+        yield row[0], row[1] if len(row) > 1 else "", row[2] if len(row) > 2 else ""
+
+
+def grade_email_messages(grades):
+    # One message per student listing every grade they received: (to_email, message_body) pairs
+    by_student = {}
+    for username, course_name, grade in grades:
+        by_student.setdefault(username.strip(), []).append(f"- {course_name.strip()}: {grade.strip().upper()}")
+    for username, lines in by_student.items():
+        yield username, (f"Dear {username},\n\nYou received the following grades:\n" + "\n".join(lines) +
+                         "\n\nPlease take some time to review and confirm your grades to ensure that they align with "
+                         "your academic goals. You can do this by logging into your Smart Course account.\n"
+                         "\nSincerely,\nSmart Course")
 
-def ask_ai_question(prompt):
+
+def ask_ai_question(prompt, scope="", context=None, question=None):
     """
     Calls the local Ollama model and returns the (reply, latency) binary: 
     reply —— natural language answer given by LLM (string) 
     latency —— end-to-end generation elapsed time ( float, seconds)
+    Same path as stream_ai_question (cache, scheduler, logging), just waiting for the whole reply.
     """
-    start = time.time()
-    try:
-        resp = requests.post(
-            "http://localhost:11434/api/generate",
-            json={"model": "llama3.1:8b",
-                  "prompt": prompt,
-                  "stream": False},
-            timeout=300
-        )
-        data = resp.json()
-        full_text = data.get("response", "")
-        reply = full_text.split("</think>")[-1].strip() if "</think>" in full_text else full_text.strip()
-    except Exception as e:
-        reply = f"AI model failed to respond: {e}"
-
-    latency = time.time() - start
-
-    # Record token/latency for subsequent analysis
+    stream = AIReplyStream(prompt, scope, context, question)
+    for _ in stream:
+        pass
+    return stream.reply, stream.latency
+
+
+def ai_cache_stats():
+    # Hit/miss counters of the response cache, see ResponseCache.stats
+    return get_cache().stats()
+
+
+def ai_scheduler_stats():
+    # Queue, model-call and coalescing counters and latency percentiles, see LLMScheduler.stats
+    return get_scheduler().stats()
+
+
+def ai_model_stats():
+    # Model state and the cold/warm answer latencies, see ModelManager.stats
+    return get_model_manager().stats()
+
+
+def log_latency(reply, latency, ttft, kind="warm"):
+    # kind: "cold" answers waited for the model to be loaded, "warm" ones didn't, "fast" ones didn't need it
     word_cnt = len(reply.split())
     with open("latency_log.csv", "a", newline="") as f:
-        csv.writer(f).writerow([word_cnt, latency])
+        csv.writer(f).writerow([word_cnt, latency, ttft, kind])
+
 
+def answer_from_plan(question, grades, plan_text, progress=None):
+    """
+    The fast path of the advice: (reply, latency) when the question is one of the common ones the
+    plan and the transcript answer without the model (see recommender.classify), else None.
+    Logged like the model's answers, as "fast". `progress` is the student's PlanProgress, if any.
+    """
+    started = time.perf_counter()
+    reply = fast_answer(question, grades, plan_text, progress)
+    if reply is None:
+        return None
+    latency = time.perf_counter() - started
+    log_latency(reply, latency, latency, "fast")
     return reply, latency
+
+
+class ThinkFilter:
+    # Removes the model's reasoning from streamed text like the whole-reply code did, which kept only
+    # what follows the last </think>, also when a tag is split across chunks. Text is held back until a
+    # </think> arrives (everything before it is dropped, also without an opening tag) or HOLD_CHARS have
+    # arrived without any "<", so none is coming; after each </think> it is held back again, since
+    # another block may follow. Once text is shown, a later <think>...</think> block is still hidden.
+    OPEN, CLOSE = "<think>", "</think>"
+    HOLD_CHARS = 64
+
+    def __init__(self):
+        self.pending = ""
+        self.holding = True
+        self.thinking = False
+
+    def feed(self, text):
+        self.pending += text
+        out = []
+        while True:
+            if self.holding:
+                i = self.pending.find(self.CLOSE)
+                if i >= 0:
+                    self.pending = self.pending[i + len(self.CLOSE):]
+                    continue
+                if len(self.pending) < self.HOLD_CHARS or "<" in self.pending:
+                    return "".join(out)
+                self.holding = False
+            if not self.thinking and self.CLOSE in self.pending:
+                i = self.pending.index(self.CLOSE)
+                if self.OPEN not in self.pending[:i]:
+                    out.append(self.pending[:i])
+                    self.pending = self.pending[i + len(self.CLOSE):]
+                    continue
+            tag = self.CLOSE if self.thinking else self.OPEN
+            i = self.pending.find(tag)
+            if i >= 0:
+                if not self.thinking:
+                    out.append(self.pending[:i])
+                self.pending = self.pending[i + len(tag):]
+                self.thinking = not self.thinking
+                continue
+            # Hold back a tail that could still become a tag
+            keep = 0
+            for n in range(1, len(self.CLOSE)):
+                if self.pending.endswith(self.CLOSE[:n]) or self.pending.endswith(self.OPEN[:n]):
+                    keep = n
+            if not self.thinking:
+                out.append(self.pending[:len(self.pending) - keep])
+            self.pending = self.pending[len(self.pending) - keep:]
+            return "".join(out)
+
+    def flush(self):
+        rest = "" if self.thinking else self.pending
+        self.pending = ""
+        return rest
+
+
+class AIReplyStream:
+    """
+    Streaming variant of ask_ai_question. Iterating yields the reply text piece by piece as
+    Ollama produces it, with <think> blocks already removed; afterwards `reply`, `latency`
+    (seconds until the reply was complete) and `ttft` (seconds until the first visible text)
+    are set, and the timings are logged like ask_ai_question's.
+    A cached reply is yielded in one piece and sets `cached`; it is not logged. When it was
+    the answer to a similar earlier question, `similar_to` is that question.
+
+    The request waits its turn in the scheduler (llm_scheduler); `scope` is the user it is queued
+    under. events() yields ("queued", position, eta) while it waits and ("text", piece) for the
+    reply, aevents() does the same for async code. When the queue is full, `busy` is set and the
+    reply says so. Stopping the iteration early withdraws the request. `shared` is set when the
+    same prompt was already on its way to the model and this stream attached to that generation.
+    `cold` is set when the model was not loaded (or still loading) when the request was made.
+    """
+    def __init__(self, prompt, scope="", context=None, question=None):
+        self.prompt = prompt
+        self.scope = scope
+        self.context = context
+        self.question = question
+        self.reply = ""
+        self.latency = None
+        self.ttft = None
+        self.cached = False
+        self.similar_to = None
+        self.busy = False
+        self.shared = False
+        self.cold = False
+
+    def __iter__(self):
+        for event in self.events():
+            if event[0] == "text":
+                yield event[1]
+
+    def events(self):
+        if self._start():
+            yield "text", self.reply
+            return
+        try:
+            for event in self._ticket.events():
+                if event[0] == "queued":
+                    yield event
+                elif event[0] == "text":
+                    text = self._add(event[1])
+                    if text:
+                        yield "text", text
+            text = self._add(None)
+        except Exception as e:
+            text = self._fail(e)
+        if text:
+            yield "text", text
+        self._finish()
+
+    async def aevents(self):
+        if self._start():
+            yield "text", self.reply
+            return
+        try:
+            async for event in self._ticket.aevents():
+                if event[0] == "queued":
+                    yield event
+                elif event[0] == "text":
+                    text = self._add(event[1])
+                    if text:
+                        yield "text", text
+            text = self._add(None)
+        except Exception as e:
+            text = self._fail(e)
+        if text:
+            yield "text", text
+        self._finish()
+
+    def _start(self):
+        # True when there is nothing to wait for: the reply came from the cache or the queue is full
+        self._started = time.time()
+        self._cache = get_cache()
+        self._model = get_client().model
+        self._key = cache_key(self._model, self.prompt)
+        reply = self._cache.get(self._key, self.scope, self.context, count_miss=False)
+        if reply is None:
+            similar = self._cache.get_similar(self.question, self._model, self.scope, self.context)
+            if similar:
+                reply, self.similar_to, _score = similar
+            else:
+                self._cache.record_miss()
+        if reply is not None:
+            self.reply = reply
+            self.cached = True
+            self.latency = self.ttft = time.time() - self._started
+            return True
+        self.cold = not get_model_manager().ready
+        try:
+            self._ticket = get_scheduler().submit(self.scope, self.prompt)
+            self.shared = self._ticket.shared
+        except SchedulerBusy as e:
+            self.busy = True
+            self.reply = f"{e} Please try again in a minute."
+            self.latency = self.ttft = time.time() - self._started
+            return True
+        self._parts = []
+        self._failed = False
+        self._think_filter = ThinkFilter()
+        return False
+
+    def _add(self, piece):
+        # The visible text of one piece of the reply; None marks the end
+        text = self._think_filter.feed(piece) if piece is not None else self._think_filter.flush()
+        if not self._parts:
+            text = text.lstrip()  # like the .strip() of the whole reply
+        if text:
+            if self.ttft is None:
+                self.ttft = time.time() - self._started
+            self._parts.append(text)
+        return text
+
+    def _fail(self, error):
+        self._failed = True
+        text = f"AI model failed to respond: {error}"
+        self._parts.append(text)
+        return text
+
+    def _finish(self):
+        self.reply = "".join(self._parts).strip()
+        self.latency = time.time() - self._started
+        if self.ttft is None:
+            self.ttft = self.latency
+        if not self._failed and self._ticket.state == "done" and self.reply:
+            self._cache.put(self._key, self.reply, self.scope, self.context, self.question, self._model)
+            manager = get_model_manager()
+            manager.used()
+            manager.record(self.cold, self.latency, self.ttft)
+        log_latency(self.reply, self.latency, self.ttft, "cold" if self.cold else "warm")
+
+
+def stream_ai_question(prompt, scope="", context=None, question=None):
+    return AIReplyStream(prompt, scope, context, question)